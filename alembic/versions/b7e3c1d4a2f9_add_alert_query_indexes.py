@@ -0,0 +1,53 @@
+"""add alert query indexes
+
+Revision ID: b7e3c1d4a2f9
+Revises: 9691cd621a39
+Create Date: 2026-10-18 09:12:44.183502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3c1d4a2f9'
+down_revision: Union[str, Sequence[str], None] = '9691cd621a39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BTREE_INDEXES = [
+    ('ix_alerts_user_id_timestamp', ['user_id', sa.text('timestamp DESC')]),
+    ('ix_alerts_device_id_timestamp', ['device_id', sa.text('timestamp DESC')]),
+    ('ix_alerts_alert_type_timestamp', ['alert_type', 'timestamp']),
+]
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _is_postgres():
+        for name, columns in BTREE_INDEXES:
+            op.create_index(name, 'alerts', columns, unique=False)
+        return
+
+    # Build concurrently so a live alerts table keeps accepting writes.
+    with op.get_context().autocommit_block():
+        for name, columns in BTREE_INDEXES:
+            op.create_index(name, 'alerts', columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_alerts_timestamp_brin', 'alerts', ['timestamp'], unique=False,
+                        postgresql_using='brin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _is_postgres():
+        op.drop_index('ix_alerts_timestamp_brin', table_name='alerts', if_exists=True)
+    for name, _ in reversed(BTREE_INDEXES):
+        op.drop_index(name, table_name='alerts', if_exists=True)
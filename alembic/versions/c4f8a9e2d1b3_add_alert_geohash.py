@@ -0,0 +1,39 @@
+"""add alert geohash
+
+Revision ID: c4f8a9e2d1b3
+Revises: b7e3c1d4a2f9
+Create Date: 2026-10-18 11:40:03.517926
+
+Existing rows are not backfilled here; run scripts/backfill_alert_geohash.py
+after upgrading so older alerts show up in location queries.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a9e2d1b3'
+down_revision: Union[str, Sequence[str], None] = 'b7e3c1d4a2f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('alerts', sa.Column('geohash', sa.String(length=12), nullable=True))
+
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_alerts_geohash', 'alerts', ['geohash'], unique=False)
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_alerts_geohash', 'alerts', ['geohash'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_alerts_geohash', table_name='alerts', if_exists=True)
+    op.drop_column('alerts', 'geohash')
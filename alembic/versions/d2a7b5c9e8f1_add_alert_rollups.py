@@ -0,0 +1,42 @@
+"""add alert rollups
+
+Revision ID: d2a7b5c9e8f1
+Revises: c4f8a9e2d1b3
+Create Date: 2026-10-18 14:05:27.904113
+
+Run scripts/backfill_alert_rollups.py after upgrading so the analytics
+counts and trends include alerts stored before this revision.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a7b5c9e8f1'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a9e2d1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('alert_rollups',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('alert_type', sa.String(), nullable=False),
+    sa.Column('device_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularity', 'bucket', 'alert_type', 'device_id', 'user_id', name='uq_alert_rollups_key')
+    )
+    op.create_index('ix_alert_rollups_granularity_bucket', 'alert_rollups', ['granularity', 'bucket'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_alert_rollups_granularity_bucket', table_name='alert_rollups')
+    op.drop_table('alert_rollups')
@@ -1,14 +1,28 @@
 """Common FastAPI dependencies (authentication)."""
-from fastapi import Depends, HTTPException
+import uuid
+from typing import Any, Dict
+
+from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.services.jwt_service import decode_token
-from app.db.session import AsyncSessionLocal
+from app.services import auth_service
+from app.services.jwt_service import (
+    USER_CLAIM_FIELDS,
+    RevocationCheckUnavailable,
+    decode_token,
+    is_token_revoked,
+)
 from app.models.user import User
-from sqlalchemy import select
 
 security = HTTPBearer()
 
+REVOCATION_RETRY_AFTER_SECONDS = "5"
+
+
+def _user_from_claims(user_id: str, claims: Dict[str, Any]) -> User:
+    # Detached and credential-free, like the users served by the identity cache.
+    return User(id=uuid.UUID(str(user_id)), **{field: claims.get(field) for field in USER_CLAIM_FIELDS})
+
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     token = credentials.credentials
@@ -18,11 +32,21 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.id == str(user_id))
+    try:
+        revoked = await is_token_revoked(payload)
+    except RevocationCheckUnavailable:
+        # Not the client's fault: keep the session and ask it to retry.
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is temporarily unavailable, please retry",
+            headers={"Retry-After": REVOCATION_RETRY_AFTER_SECONDS},
         )
-        user = result.scalar_one_or_none()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+    if revoked:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    claims = payload.get("usr")
+    if isinstance(claims, dict):
+        return _user_from_claims(user_id, claims)
+    user = await auth_service.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
@@ -1,20 +1,20 @@
 """Alert endpoint handlers."""
 
-from typing import List
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from dotenv import load_dotenv
 
-load_dotenv() 
-
 from app.api.deps import get_current_user
-from app.models import Alert
-from app.schemas.alerts import AlertCreate, Alert as AlertSchema
+from app.schemas.alerts import AlertCreate, AlertPage, Alert as AlertSchema
 from app.services.alert_processor import process_and_save_alert
+from app.services.alert_query import AlertQueryService
+from app.utils.cursor import decode_cursor, encode_cursor
 from app.db.session import get_db_session
 
+load_dotenv() 
+
 router = APIRouter(
     prefix="/api/alerts",
     tags=["Alerts"]
@@ -54,16 +54,34 @@ async def receive_alert(alert_data: AlertCreate):
 
 @router.get(
     "/",
-    response_model=List[AlertSchema],
-    summary="Get all alerts",
-    description="Retrieve all security alerts from the database, ordered by timestamp (newest first)."
+    response_model=AlertPage,
+    summary="Get alerts (paginated)",
+    description="Retrieve the current user's security alerts, newest first, one page at a time."
 )
-async def get_all_alerts(db: AsyncSession = Depends(get_db_session), current_user = Depends(get_current_user)):
+async def get_all_alerts(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of alerts to return"),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    db: AsyncSession = Depends(get_db_session),
+    current_user = Depends(get_current_user)
+):
     """
-    Retrieve a list of all alerts from the database.
+    Retrieve one page of the current user's alerts.
     
     The alerts are sorted by timestamp in descending order (newest first).
+    Follow `next_cursor` until it is null to walk the full history.
     For real-time notifications, connect to the WebSocket endpoint: `/ws/alerts`
     """
-    result = await db.execute(select(Alert).where(Alert.user_id == current_user.id).order_by(Alert.timestamp.desc()))
-    return result.scalars().all()
\ No newline at end of file
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await db.execute(AlertQueryService.user_alerts_query(current_user.id, limit + 1, after))
+    alerts = result.scalars().all()
+
+    next_cursor = None
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        next_cursor = encode_cursor(alerts[-1].timestamp, alerts[-1].id)
+
+    return {"items": alerts, "next_cursor": next_cursor, "limit": limit}
@@ -1,12 +1,23 @@
 """Alert analytics endpoints."""
 
-from datetime import datetime
-from typing import Optional
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Literal, Mapping, Optional
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 import app.services.cache as cache_module
-from app.services.alert_query import AlertQueryService
+from app.services import cache_tags
+from app.services.alert_query import EXPORT_COLUMNS, AlertQueryService
+
+EXPORT_CHUNK_ROWS = 500
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
 
 router = APIRouter(
     prefix="/api/analytics",
@@ -38,7 +49,80 @@ async def get_alerts_by_timeframe(
         cache_key,
         lambda: AlertQueryService.get_alerts_by_timeframe(
             start_time, end_time, alert_type, device_id
-        )
+        ),
+        tags=cache_tags.range_tags(start_time, end_time, alert_type, device_id)
+    )
+
+
+def _export_record(row: Mapping[str, Any]) -> Dict[str, Any]:
+    record = dict(row)
+    payload = record.get("payload")
+    if isinstance(payload, str):
+        record["payload"] = json.loads(payload)
+    timestamp = record.get("timestamp")
+    if timestamp is not None:
+        record["timestamp"] = timestamp.isoformat()
+    for key in ("id", "user_id"):
+        if record.get(key) is not None:
+            record[key] = str(record[key])
+    return record
+
+
+async def _ndjson_chunks(rows: AsyncIterator[Mapping[str, Any]]) -> AsyncIterator[bytes]:
+    lines = []
+    async for row in rows:
+        lines.append(json.dumps(_export_record(row), separators=(",", ":")))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def _csv_chunks(rows: AsyncIterator[Mapping[str, Any]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 0
+    async for row in rows:
+        record = _export_record(row)
+        if record["payload"] is not None:
+            record["payload"] = json.dumps(record["payload"], separators=(",", ":"))
+        writer.writerow([record[column] for column in EXPORT_COLUMNS])
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode()
+
+
+@router.get(
+    "/alerts/export",
+    summary="Export alerts within a timeframe",
+    description="""Stream alerts between the specified start and end times as NDJSON or CSV.
+    Takes the same filters as `/api/analytics/alerts/timeframe`, but rows are streamed
+    from the database in chunks, so arbitrarily large ranges can be exported."""
+)
+async def export_alerts(
+    start_time: datetime = Query(..., description="Start time (ISO format)"),
+    end_time: datetime = Query(..., description="End time (ISO format)"),
+    alert_type: Optional[str] = Query(None, description="Filter by alert type"),
+    device_id: Optional[str] = Query(None, description="Filter by device ID"),
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format")
+):
+    """Stream alerts within a specific timeframe, oldest first."""
+    if end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must be greater than or equal to start_time")
+
+    rows = AlertQueryService.stream_alerts_by_timeframe(start_time, end_time, alert_type, device_id)
+    chunks = _ndjson_chunks(rows) if format == "ndjson" else _csv_chunks(rows)
+    filename = f"alerts-{start_time:%Y%m%dT%H%M%S}-{end_time:%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
@@ -62,7 +146,8 @@ async def get_alerts_by_location(
     
     return await cache_module.cache.get_or_set(
         cache_key,
-        lambda: AlertQueryService.get_alerts_by_location(lat, lon, radius_km)
+        lambda: AlertQueryService.get_alerts_by_location(lat, lon, radius_km),
+        tags=cache_tags.location_tags(lat, lon, radius_km)
     )
 
 
@@ -84,7 +169,8 @@ async def get_alert_counts(
     
     return await cache_module.cache.get_or_set(
         cache_key,
-        lambda: AlertQueryService.get_alert_counts_by_type(start_time, end_time)
+        lambda: AlertQueryService.get_alert_counts_by_type(start_time, end_time),
+        tags=cache_tags.range_tags(start_time, end_time)
     )
 
 
@@ -99,10 +185,12 @@ async def get_alert_trends(
 ):
     """Get alert trends over time."""
     cache_key = cache_module.cache.get_key("trends", str(days), str(interval_hours))
+    now = datetime.utcnow()
     
     return await cache_module.cache.get_or_set(
         cache_key,
-        lambda: AlertQueryService.get_alert_trends(days, interval_hours)
+        lambda: AlertQueryService.get_alert_trends(days, interval_hours),
+        tags=cache_tags.range_tags(now - timedelta(days=days), now)
     )
 
 
@@ -118,5 +206,5 @@ async def get_device_statistics(device_id: str):
     return await cache_module.cache.get_or_set(
         cache_key,
         lambda: AlertQueryService.get_device_statistics(device_id),
-        expire=300  # Short cache time for device stats
+        tags=cache_tags.device_tags(device_id)
     )
\ No newline at end of file
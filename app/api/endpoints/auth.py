@@ -1,9 +1,22 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.security import HTTPAuthorizationCredentials
+from app.api.deps import security
 from app.schemas.auth import UserSignup, UserLogin, Token
 from app.services import auth_service, jwt_service
+from app.services.password_hasher import HasherBusyError
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
+BUSY_RETRY_AFTER_SECONDS = "1"
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": BUSY_RETRY_AFTER_SECONDS},
+    )
+
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
 async def signup(payload: UserSignup):
     try:
@@ -14,6 +27,8 @@ async def signup(payload: UserSignup):
             password=payload.password
         )
         return {"message": "User created successfully", "userId": user.id}
+    except HasherBusyError:
+        raise _busy()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -22,10 +37,13 @@ async def signup(payload: UserSignup):
 
 @router.post("/login", response_model=Token)
 async def login(payload: UserLogin):
-    user = await auth_service.authenticate(
-        email=payload.email, 
-        password=payload.password
-    )
+    try:
+        user = await auth_service.authenticate(
+            email=payload.email, 
+            password=payload.password
+        )
+    except HasherBusyError:
+        raise _busy()
     
     if not user:
         raise HTTPException(
@@ -33,5 +51,12 @@ async def login(payload: UserLogin):
             detail="Incorrect email or password",
         )
         
-    access_token = jwt_service.create_access_token(subject=str(user.id))
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    access_token = jwt_service.create_access_token(subject=str(user.id), user=user)
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = jwt_service.decode_token(credentials.credentials)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    await jwt_service.revoke_token(payload)
\ No newline at end of file
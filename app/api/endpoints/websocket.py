@@ -1,7 +1,9 @@
 """WebSocket endpoint handlers."""
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.websocket import manager
+from typing import Optional
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from app.services.websocket import MSGPACK_SUBPROTOCOL, manager
 
 router = APIRouter(
     tags=["WebSocket"]
@@ -9,28 +11,40 @@ router = APIRouter(
 
 
 @router.websocket("/ws/alerts/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: str,
+    last_seq: Optional[int] = Query(default=None, ge=0, description="Resume after this alert sequence number"),
+):
     """
     WebSocket endpoint for real-time alert notifications.
     Handles client connections, disconnections, and keep-alive messages.
+    Clients may request the ``obex.msgpack.v1`` subprotocol to receive
+    binary msgpack frames instead of JSON text.
+
+    Alert events carry a per-user ``seq``; reconnecting with ``?last_seq=``
+    replays only the alerts missed in between.
     """
-    await manager.connect(websocket, user_id)
-    print(f"New WebSocket connection established. Active connections: {len(manager.active_connections)}")
+    connection = await manager.connect(websocket, user_id, last_seq=last_seq)
+    print(f"New WebSocket connection established. Active connections: {manager.connection_count}")
     
     try:
-        await manager.send_connection_message(websocket)
+        manager.send_connection_message(connection)
         
         while True:
-            await websocket.receive_text()
-            await manager.send_pong(websocket)
+            # Text or binary keep-alives; msgpack clients may send either.
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            manager.send_pong(connection)
             
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
-        print(f"WebSocket disconnected. Remaining connections: {len(manager.active_connections)}")
+        manager.disconnect(connection)
+        print(f"WebSocket disconnected. Remaining connections: {manager.connection_count}")
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(user_id)
-        print(f"Connection terminated. Remaining connections: {len(manager.active_connections)}")
+        manager.disconnect(connection)
+        print(f"Connection terminated. Remaining connections: {manager.connection_count}")
 
 
 @router.get("/websocket-info", summary="WebSocket Connection Details")
@@ -46,9 +60,10 @@ async def get_websocket_info():
     """
     return {
         "websocket_endpoint": "/ws/alerts/{user_id}",
-        "active_connections": len(manager.active_connections),
+        "active_connections": manager.connection_count,
         "connection_url": "ws://localhost:8000/ws/alerts/jnjznjianajajk-aasss-wssssa",
         "status": "operational",
+        "subprotocols": [MSGPACK_SUBPROTOCOL],
         "supported_events": {
             "incoming": ["ping", "message"],
             "outgoing": ["pong", "alert_notification"]
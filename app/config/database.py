@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from sqlalchemy.orm import declarative_base
 
 from app.core.settings import settings
+from app.db.base import AppSession
 
 raw_url = os.getenv("DIRECT_DATABASE_URL") or settings.database_url or "sqlite+aiosqlite:///./obex.db"
 
@@ -58,6 +59,7 @@ engine = create_async_engine(
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=AppSession,
     expire_on_commit=False,
 )
 
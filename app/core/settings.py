@@ -30,10 +30,46 @@ class Settings(BaseSettings):
     )
     cache_prefix: str = Field(default="obex", alias="CACHE_PREFIX")
     cache_ttl: int = Field(default=3600, alias="CACHE_TTL")
+    cache_tag_ttl: int = Field(default=7 * 24 * 3600, alias="CACHE_TAG_TTL")
+    cache_max_day_tags: int = Field(default=31, alias="CACHE_MAX_DAY_TAGS")
+    cache_scan_batch: int = Field(default=500, alias="CACHE_SCAN_BATCH")
+    cache_lock_timeout_ms: int = Field(default=5000, alias="CACHE_LOCK_TIMEOUT_MS")
+    cache_lock_poll_ms: int = Field(default=50, alias="CACHE_LOCK_POLL_MS")
+    cache_early_refresh_beta: float = Field(default=1.0, alias="CACHE_EARLY_REFRESH_BETA")
+    cache_codec: str = Field(default="json", alias="CACHE_CODEC")
+    cache_compression: str = Field(default="zlib", alias="CACHE_COMPRESSION")
+    cache_compress_min_bytes: int = Field(default=1024, alias="CACHE_COMPRESS_MIN_BYTES")
+    cache_local_enabled: bool = Field(default=False, alias="CACHE_LOCAL_ENABLED")
+    cache_local_max_entries: int = Field(default=1024, alias="CACHE_LOCAL_MAX_ENTRIES")
+    cache_local_max_bytes: int = Field(default=32 * 1024 * 1024, alias="CACHE_LOCAL_MAX_BYTES")
+    cache_local_ttl: int = Field(default=30, alias="CACHE_LOCAL_TTL")
 
     jwt_secret: str = Field(default="change-me-in-prod", alias="JWT_SECRET")
     jwt_algorithm: str = Field(default="HS256", alias="JWT_ALGORITHM")
     jwt_exp_minutes: int = Field(default=60, alias="JWT_EXP_MINUTES")
+    user_cache_ttl: int = Field(default=60, alias="USER_CACHE_TTL")
+    password_hash_workers: int = Field(default=2, alias="PASSWORD_HASH_WORKERS")
+    password_hash_max_pending: int = Field(
+        default=32,
+        alias="PASSWORD_HASH_MAX_PENDING",
+        description="Hash/verify calls allowed in flight or queued before logins get 503",
+    )
+    argon2_time_cost: int = Field(default=3, alias="ARGON2_TIME_COST")
+    argon2_memory_cost: int = Field(default=65536, alias="ARGON2_MEMORY_COST", description="KiB")
+    argon2_parallelism: int = Field(default=4, alias="ARGON2_PARALLELISM")
+    jwt_cache_size: int = Field(default=4096, alias="JWT_CACHE_SIZE")
+    jwt_cache_ttl: int = Field(default=300, alias="JWT_CACHE_TTL")
+    jwt_embed_user_claims: bool = Field(default=False, alias="JWT_EMBED_USER_CLAIMS")
+    jwt_revocation_check_seconds: int = Field(
+        default=5,
+        alias="JWT_REVOCATION_CHECK_SECONDS",
+        description="How long a token's not-revoked status is trusted before Redis is asked again",
+    )
+    jwt_revocation_fail_open: bool = Field(
+        default=False,
+        alias="JWT_REVOCATION_FAIL_OPEN",
+        description="Accept tokens when the Redis revocation list cannot be reached instead of rejecting them",
+    )
 
     mqtt_broker_host: str = Field(
         default="test.mosquitto.org",
@@ -41,9 +77,79 @@ class Settings(BaseSettings):
     )
     mqtt_broker_port: int = Field(default=1883, alias="MQTT_BROKER_PORT")
     mqtt_alerts_topic: str = Field(default="obex/alerts", alias="MQTT_ALERTS_TOPIC")
+    mqtt_batch_topic: str = Field(
+        default="",
+        alias="MQTT_BATCH_TOPIC",
+        description="Topic for batched alert uploads; defaults to <alerts topic>/batch",
+    )
+    mqtt_dead_letter_topic: str = Field(
+        default="",
+        alias="MQTT_DEAD_LETTER_TOPIC",
+        description="Where alerts the database rejects are republished; defaults to <alerts topic>/dead-letter",
+    )
     mqtt_username: Optional[str] = Field(default=None, alias="MQTT_USERNAME")
     mqtt_password: Optional[str] = Field(default=None, alias="MQTT_PASSWORD")
     mqtt_use_tls: bool = Field(default=False, alias="MQTT_USE_TLS")
+    mqtt_keepalive: int = Field(default=60, alias="MQTT_KEEPALIVE")
+    mqtt_queue_size: int = Field(
+        default=1000,
+        alias="MQTT_QUEUE_SIZE",
+        description="Received messages buffered before the client stops reading from the broker",
+    )
+    mqtt_consumers: int = Field(default=4, alias="MQTT_CONSUMERS")
+    mqtt_qos: int = Field(default=1, ge=0, le=2, alias="MQTT_QOS")
+    mqtt_client_id: str = Field(
+        default="",
+        alias="MQTT_CLIENT_ID",
+        description="Stable client id for the persistent session; defaults to obex-backend-<hostname>",
+    )
+    mqtt_clean_session: bool = Field(default=False, alias="MQTT_CLEAN_SESSION")
+    mqtt_protocol: int = Field(
+        default=4,
+        alias="MQTT_PROTOCOL",
+        description="MQTT protocol level: 4 (3.1.1) or 5; shared subscriptions always use 5",
+    )
+    mqtt_session_expiry_seconds: int = Field(default=3600, alias="MQTT_SESSION_EXPIRY_SECONDS")
+    mqtt_share_group: str = Field(
+        default="",
+        alias="MQTT_SHARE_GROUP",
+        description="Consumer group name; replicas in one group split alerts via $share subscriptions",
+    )
+    mqtt_topic_shards: str = Field(
+        default="",
+        alias="MQTT_TOPIC_SHARDS",
+        description="Comma-separated device prefixes to consume from <alerts or batch topic>/<prefix>/<device_id>",
+    )
+
+    websocket_bus_enabled: bool = Field(
+        default=False,
+        alias="WEBSOCKET_BUS_ENABLED",
+        description="Fan WebSocket messages out through Redis so any worker can reach any connected user",
+    )
+    websocket_bus_shards: int = Field(default=64, alias="WEBSOCKET_BUS_SHARDS")
+    websocket_send_queue_size: int = Field(default=100, alias="WEBSOCKET_SEND_QUEUE_SIZE")
+    websocket_send_timeout_seconds: float = Field(default=5.0, alias="WEBSOCKET_SEND_TIMEOUT_SECONDS")
+    websocket_slow_client_policy: str = Field(
+        default="disconnect",
+        alias="WEBSOCKET_SLOW_CLIENT_POLICY",
+        description="What to do when a client's send queue is full: 'disconnect' or 'drop_oldest'",
+    )
+    websocket_replay_size: int = Field(
+        default=200,
+        alias="WEBSOCKET_REPLAY_SIZE",
+        description="Recent alert events kept per user for clients resuming with last_seq (0 disables)",
+    )
+    websocket_replay_backend: str = Field(
+        default="auto",
+        alias="WEBSOCKET_REPLAY_BACKEND",
+        description="'memory', 'redis', or 'auto' (redis when the WebSocket bus is enabled)",
+    )
+    websocket_replay_ttl_seconds: int = Field(default=3600, alias="WEBSOCKET_REPLAY_TTL_SECONDS")
+    websocket_replay_max_users: int = Field(default=10000, alias="WEBSOCKET_REPLAY_MAX_USERS")
+
+    alert_ingest_max_batch: int = Field(default=500, alias="ALERT_INGEST_MAX_BATCH")
+    alert_ingest_max_delay_ms: int = Field(default=20, alias="ALERT_INGEST_MAX_DELAY_MS")
+    alert_ingest_max_concurrency: int = Field(default=4, alias="ALERT_INGEST_MAX_CONCURRENCY")
 
     mail_username: str = Field(default="", alias="MAIL_USERNAME")
     mail_password: str = Field(default="", alias="MAIL_PASSWORD")
@@ -63,6 +169,17 @@ class Settings(BaseSettings):
     smtp_name: str = Field(default="Obex Edge", alias="SMTP_NAME")
     smtp_email: str = Field(default="", alias="SMTP_EMAIL")
     smtp_password: str = Field(default="", alias="SMTP_PASSWORD")
+    smtp_host: str = Field(default="smtp.gmail.com", alias="SMTP_HOST")
+    smtp_port: int = Field(default=465, alias="SMTP_PORT")
+
+    notification_queue_size: int = Field(default=1000, alias="NOTIFICATION_QUEUE_SIZE")
+    notification_workers: int = Field(default=4, alias="NOTIFICATION_WORKERS")
+    notification_timeout_seconds: float = Field(default=10.0, alias="NOTIFICATION_TIMEOUT_SECONDS")
+    notification_coalesce_window_seconds: float = Field(
+        default=60.0,
+        alias="NOTIFICATION_COALESCE_WINDOW_SECONDS",
+        description="Alerts of the same type from the same device within this window are sent as one digest (0 disables)",
+    )
     
     class Config:
         env_file = ".env"
@@ -84,9 +201,64 @@ MQTT_CONFIG = {
     "BROKER_HOST": settings.mqtt_broker_host,
     "BROKER_PORT": settings.mqtt_broker_port,
     "ALERTS_TOPIC": settings.mqtt_alerts_topic,
+    "BATCH_TOPIC": settings.mqtt_batch_topic,
+    "DEAD_LETTER_TOPIC": settings.mqtt_dead_letter_topic,
     "USERNAME": settings.mqtt_username or "",
     "PASSWORD": settings.mqtt_password or "",
     "USE_TLS": bool(settings.mqtt_use_tls),
+    "KEEPALIVE": settings.mqtt_keepalive,
+    "QUEUE_SIZE": settings.mqtt_queue_size,
+    "CONSUMERS": settings.mqtt_consumers,
+    "QOS": settings.mqtt_qos,
+    "CLIENT_ID": settings.mqtt_client_id,
+    "CLEAN_SESSION": settings.mqtt_clean_session,
+    "PROTOCOL": settings.mqtt_protocol,
+    "SESSION_EXPIRY_SECONDS": settings.mqtt_session_expiry_seconds,
+    "SHARE_GROUP": settings.mqtt_share_group,
+    "TOPIC_SHARDS": [shard.strip() for shard in settings.mqtt_topic_shards.split(",") if shard.strip()],
+}
+
+
+WEBSOCKET_CONFIG = {
+    "BUS_ENABLED": settings.websocket_bus_enabled,
+    "BUS_SHARDS": settings.websocket_bus_shards,
+    "SEND_QUEUE_SIZE": settings.websocket_send_queue_size,
+    "SEND_TIMEOUT_SECONDS": settings.websocket_send_timeout_seconds,
+    "SLOW_CLIENT_POLICY": settings.websocket_slow_client_policy,
+    "REPLAY_SIZE": settings.websocket_replay_size,
+    "REPLAY_BACKEND": settings.websocket_replay_backend,
+    "REPLAY_TTL_SECONDS": settings.websocket_replay_ttl_seconds,
+    "REPLAY_MAX_USERS": settings.websocket_replay_max_users,
+}
+
+
+AUTH_CONFIG = {
+    "USER_CACHE_TTL": settings.user_cache_ttl,
+    "PASSWORD_HASH_WORKERS": settings.password_hash_workers,
+    "PASSWORD_HASH_MAX_PENDING": settings.password_hash_max_pending,
+    "ARGON2_TIME_COST": settings.argon2_time_cost,
+    "ARGON2_MEMORY_COST": settings.argon2_memory_cost,
+    "ARGON2_PARALLELISM": settings.argon2_parallelism,
+    "TOKEN_CACHE_SIZE": settings.jwt_cache_size,
+    "TOKEN_CACHE_TTL": settings.jwt_cache_ttl,
+    "EMBED_USER_CLAIMS": settings.jwt_embed_user_claims,
+    "REVOCATION_CHECK_SECONDS": settings.jwt_revocation_check_seconds,
+    "REVOCATION_FAIL_OPEN": settings.jwt_revocation_fail_open,
+}
+
+
+ALERT_INGEST_CONFIG = {
+    "MAX_BATCH": settings.alert_ingest_max_batch,
+    "MAX_DELAY_MS": settings.alert_ingest_max_delay_ms,
+    "MAX_CONCURRENCY": settings.alert_ingest_max_concurrency,
+}
+
+
+NOTIFICATION_CONFIG = {
+    "QUEUE_SIZE": settings.notification_queue_size,
+    "WORKERS": settings.notification_workers,
+    "TIMEOUT_SECONDS": settings.notification_timeout_seconds,
+    "COALESCE_WINDOW_SECONDS": settings.notification_coalesce_window_seconds,
 }
 
 
@@ -97,6 +269,19 @@ REDIS_CONFIG = {
     "PASSWORD": settings.redis_password,
     "PREFIX": settings.cache_prefix,
     "DEFAULT_TIMEOUT": settings.cache_ttl,
+    "TAG_TIMEOUT": settings.cache_tag_ttl,
+    "MAX_DAY_TAGS": settings.cache_max_day_tags,
+    "SCAN_BATCH": settings.cache_scan_batch,
+    "LOCK_TIMEOUT_MS": settings.cache_lock_timeout_ms,
+    "LOCK_POLL_MS": settings.cache_lock_poll_ms,
+    "EARLY_REFRESH_BETA": settings.cache_early_refresh_beta,
+    "CODEC": settings.cache_codec,
+    "COMPRESSION": settings.cache_compression,
+    "COMPRESS_MIN_BYTES": settings.cache_compress_min_bytes,
+    "LOCAL_CACHE": settings.cache_local_enabled,
+    "LOCAL_MAX_ENTRIES": settings.cache_local_max_entries,
+    "LOCAL_MAX_BYTES": settings.cache_local_max_bytes,
+    "LOCAL_TIMEOUT": settings.cache_local_ttl,
 }
 
 
@@ -125,7 +310,7 @@ API_CONFIG = {
     * **IDs are auto-generated** - Do NOT include `id` field when creating devices or alerts
     * All timestamps use ISO 8601 format (e.g., "2025-11-04T00:00:00Z")
     * WebSocket endpoint: `ws://localhost:8000/ws/alerts`
-    * MQTT topic: `obex/alerts`
+    * MQTT topic: `obex/alerts` (batched uploads: `obex/alerts/batch`, `{"device_id", "user_id", "alerts": [...]}`)
     
     ### Alert Types:
     - weapon_detection
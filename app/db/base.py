@@ -1,2 +1,7 @@
 """SQLAlchemy base model configuration."""
 
+from sqlalchemy.orm import Session
+
+
+class AppSession(Session):
+    """Sync session behind AsyncSessionLocal; ORM session events for the app are registered on it."""
@@ -1,6 +1,5 @@
 """Main application factory and initialization."""
 
-import threading
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -9,6 +8,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.core.settings import API_CONFIG
 from app.config.database import connect_db, close_db
 from app.services.mqtt_client import mqtt_service
+from app.services.alert_ingest import alert_ingest
+from app.services.notifications import notification_dispatcher
+from app.services.password_hasher import password_hasher
+from app.services.websocket import manager
 
 from app.api.endpoints import alerts, analytics, devices, websocket, home, cameras, otp, auth, model_logs
 
@@ -19,15 +22,19 @@ async def lifespan(app: FastAPI):
     """
     print("--- App Startup ---")
     await connect_db()
+    notification_dispatcher.start()
+    await manager.start_bus()
     
-    print("Starting MQTT client thread...")
-    mqtt_thread = threading.Thread(target=mqtt_service.start, daemon=True)
-    mqtt_thread.start()
+    await mqtt_service.start()
     
     yield
     
     print("--- App Shutdown ---")
-    mqtt_service.stop()
+    await mqtt_service.stop()
+    await alert_ingest.stop()
+    await notification_dispatcher.stop()
+    await manager.stop_bus()
+    password_hasher.shutdown()
     
     await close_db()
     print("--- Shutdown complete ---")
@@ -1,9 +1,10 @@
 """Initialize database models."""
 
 from app.models.alert import Alert
+from app.models.alert_rollup import AlertRollup
 from app.models.device import Device
 from app.models.model_log import ModelLog
 from app.models.user import User
 
-__all__ = ["Alert", "Device", "User"]
+__all__ = ["Alert", "AlertRollup", "Device", "User"]
 __all__.append("ModelLog")
\ No newline at end of file
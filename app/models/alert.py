@@ -1,12 +1,13 @@
 """Alert models for the database."""
 
-from sqlalchemy import Column, Integer, String, Float, TIMESTAMP
+from sqlalchemy import Column, Index, Integer, String, Float, TIMESTAMP
 import os
 from sqlalchemy.dialects.postgresql import JSON
 import json
 import uuid
 
 from app.config.database import Base
+from app.utils.geo import geohash_encode
 
 
 class Alert(Base):
@@ -32,13 +33,44 @@ class Alert(Base):
     location_lon = Column(Float)
     payload = Column(JSON)
     user_id = Column(PG_UUID(as_uuid=True))
+    # Derived from location_lat/location_lon at insert; see prepare_values.
+    geohash = Column(String(12))
+
+    # Mirrors alembic revisions b7e3c1d4a2f9 and c4f8a9e2d1b3; keep them in sync.
+    __table_args__ = (
+        # GET /api/alerts/ : WHERE user_id = ? ORDER BY timestamp DESC
+        Index("ix_alerts_user_id_timestamp", user_id, timestamp.desc()),
+        # device statistics / timeframe filtered by device
+        Index("ix_alerts_device_id_timestamp", device_id, timestamp.desc()),
+        # timeframe filtered by alert type
+        Index("ix_alerts_alert_type_timestamp", alert_type, timestamp),
+        # Unfiltered time-range scans; BRIN stays tiny on append-mostly tables.
+        Index("ix_alerts_timestamp_brin", timestamp, postgresql_using="brin").ddl_if(dialect="postgresql"),
+        # get_alerts_by_location : geohash prefix ranges
+        Index("ix_alerts_geohash", geohash),
+    )
     
     def __init__(self, **kwargs):
+        super().__init__(**self.prepare_values(kwargs))
+
+    @staticmethod
+    def prepare_values(values: dict) -> dict:
+        """
+        Normalise column values the same way for ORM instances and bulk inserts.
+        Returns a new dict; the input mapping is left untouched.
+        """
+        values = dict(values)
         # Ensure payload is a string if it's a dict
-        if 'payload' in kwargs and isinstance(kwargs['payload'], dict):
-            kwargs['payload'] = json.dumps(kwargs['payload'])
+        if 'payload' in values and isinstance(values['payload'], dict):
+            values['payload'] = json.dumps(values['payload'])
         # Ensure id is a string for SQLite
         db_dialect = os.environ.get("TEST_DB_DIALECT", "sqlite")
-        if db_dialect == "sqlite" and 'id' in kwargs and not isinstance(kwargs['id'], str):
-            kwargs['id'] = str(kwargs['id'])
-        super().__init__(**kwargs)
\ No newline at end of file
+        if db_dialect == "sqlite" and 'id' in values and not isinstance(values['id'], str):
+            values['id'] = str(values['id'])
+        # Index the location for radius queries. The key is always set so every
+        # row of a multi-row INSERT has the same columns.
+        lat, lon = values.get('location_lat'), values.get('location_lon')
+        values['geohash'] = values.get('geohash') or (
+            geohash_encode(lat, lon) if lat is not None and lon is not None else None
+        )
+        return values
\ No newline at end of file
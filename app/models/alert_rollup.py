@@ -0,0 +1,30 @@
+"""Pre-aggregated alert counters used by the analytics endpoints."""
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, UniqueConstraint
+
+from app.config.database import Base
+
+
+class AlertRollup(Base):
+    """
+    Number of alerts per (alert_type, device_id, user_id) in one time bucket.
+    Maintained incrementally as alerts are ingested; see app.services.alert_rollups.
+    """
+    __tablename__ = "alert_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    granularity = Column(String(8), nullable=False)  # "hour" or "day"
+    bucket = Column(DateTime, nullable=False)  # bucket start, naive UTC
+    alert_type = Column(String, nullable=False)
+    device_id = Column(String, nullable=False)
+    # Empty string rather than NULL so alerts without a user still hit the unique key
+    user_id = Column(String(36), nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket", "alert_type", "device_id", "user_id",
+            name="uq_alert_rollups_key",
+        ),
+        Index("ix_alert_rollups_granularity_bucket", "granularity", "bucket"),
+    )
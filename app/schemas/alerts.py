@@ -1,7 +1,7 @@
 """Alert-related Pydantic schemas."""
 
 from pydantic import BaseModel, field_validator, Field
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 import uuid
 
@@ -47,6 +47,26 @@ class AlertCreate(AlertBase):
     pass
 
 
+class AlertBatch(BaseModel):
+    """
+    Many alerts from one device in a single message.
+
+    ``device_id`` and ``user_id`` are given once in the header and apply to
+    every entry in ``alerts`` that does not set its own. Entries carry the
+    remaining AlertCreate fields and are validated as AlertCreate.
+    """
+    device_id: str = Field(description="ID of the device that detected the alerts")
+    user_id: Optional[uuid.UUID] = Field(default=None, description="ID of the user associated with the device")
+    alerts: List[Dict[str, Any]] = Field(min_length=1, description="Alerts without the header fields")
+
+    def alert_dicts(self) -> List[Dict[str, Any]]:
+        """The entries with the header fields filled in, ready for AlertCreate validation."""
+        header: Dict[str, Any] = {"device_id": self.device_id}
+        if self.user_id is not None:
+            header["user_id"] = self.user_id
+        return [{**header, **alert} for alert in self.alerts]
+
+
 class Alert(AlertBase):
     """Schema for alert response with auto-generated ID."""
     id: uuid.UUID = Field(..., description="Auto-generated alert ID")
@@ -75,4 +95,11 @@ class Alert(AlertBase):
         if isinstance(v, str):
             import json
             return json.loads(v)
-        return v
\ No newline at end of file
+        return v
+
+
+class AlertPage(BaseModel):
+    """One page of alerts, newest first."""
+    items: List[Alert] = Field(description="Alerts on this page, ordered by timestamp (newest first)")
+    next_cursor: Optional[str] = Field(default=None, description="Pass as `cursor` to fetch the next page; null on the last page")
+    limit: int = Field(description="Maximum number of alerts per page")
@@ -0,0 +1,86 @@
+"""Decoding and validation of raw alert payloads from edge devices.
+
+JSON is validated straight from the received bytes by pydantic-core, without
+building an intermediate dict, and a JSON array of alerts is validated in one
+call. Devices may instead send the same structures as msgpack, either
+declared with an MQTT v5 content type or recognised by its first byte.
+
+Batched uploads use the AlertBatch envelope, whose header fields are applied
+to every entry before the entries are validated together.
+"""
+
+from typing import List, Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.schemas.alerts import AlertBatch, AlertCreate
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_CONTENT_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+JSON_WHITESPACE = b" \t\r\n"
+
+_alert_list = TypeAdapter(List[AlertCreate])
+
+
+class AlertDecodeError(ValueError):
+    """Raised for payloads that are not a valid alert or list of alerts."""
+
+
+def _is_msgpack(payload: bytes, content_type: Optional[str]) -> bool:
+    if content_type:
+        return content_type.split(";", 1)[0].strip().lower() in MSGPACK_CONTENT_TYPES
+    return bool(payload) and payload.lstrip(JSON_WHITESPACE)[:1] not in (b"{", b"[")
+
+
+def decode_alerts(payload: bytes, content_type: Optional[str] = None) -> List[AlertCreate]:
+    """
+    Validate a payload holding one alert or an array of alerts.
+
+    Raises:
+        AlertDecodeError: If the payload cannot be decoded or fails validation.
+    """
+    try:
+        if _is_msgpack(payload, content_type):
+            if msgpack is None:
+                raise AlertDecodeError("msgpack payloads need the msgpack package installed")
+            data = msgpack.unpackb(payload, raw=False)
+            if isinstance(data, list):
+                return _alert_list.validate_python(data)
+            return [AlertCreate.model_validate(data)]
+
+        if payload.lstrip(JSON_WHITESPACE)[:1] == b"[":
+            return _alert_list.validate_json(payload)
+        return [AlertCreate.model_validate_json(payload)]
+    except AlertDecodeError:
+        raise
+    except ValidationError as exc:
+        raise AlertDecodeError(f"Invalid alert: {exc.error_count()} validation error(s): {exc}") from exc
+    except Exception as exc:
+        raise AlertDecodeError(f"Undecodable alert payload: {exc}") from exc
+
+
+def decode_alert_batch(payload: bytes, content_type: Optional[str] = None) -> List[AlertCreate]:
+    """
+    Validate an AlertBatch envelope and return its alerts with the header applied.
+
+    Raises:
+        AlertDecodeError: If the envelope or any of its alerts is invalid.
+    """
+    try:
+        if _is_msgpack(payload, content_type):
+            if msgpack is None:
+                raise AlertDecodeError("msgpack payloads need the msgpack package installed")
+            batch = AlertBatch.model_validate(msgpack.unpackb(payload, raw=False))
+        else:
+            batch = AlertBatch.model_validate_json(payload)
+        return _alert_list.validate_python(batch.alert_dicts())
+    except AlertDecodeError:
+        raise
+    except ValidationError as exc:
+        raise AlertDecodeError(f"Invalid alert batch: {exc.error_count()} validation error(s): {exc}") from exc
+    except Exception as exc:
+        raise AlertDecodeError(f"Undecodable alert batch: {exc}") from exc
@@ -0,0 +1,185 @@
+"""Batched alert persistence shared by the MQTT and HTTP ingestion paths."""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from sqlalchemy import insert
+
+import app.services.cache as cache_module
+from app.core.settings import ALERT_INGEST_CONFIG
+from app.db.session import AsyncSessionLocal
+from app.models import Alert
+from app.schemas.alerts import AlertCreate
+from app.services.alert_rollups import record_alerts
+from app.services.cache_tags import batch_tags
+
+LOG = logging.getLogger(__name__)
+
+PendingAlert = Tuple[Dict[str, Any], "asyncio.Future[Dict[str, Any]]"]
+
+# Rows per INSERT statement; keeps bulk writes under asyncpg's 32767 bind parameter limit
+INSERT_CHUNK_ROWS = 1000
+
+
+class AlertIngestQueue:
+    """
+    Coalesces concurrently submitted alerts into multi-row INSERTs.
+
+    A batch is flushed as soon as it reaches ``max_batch`` alerts or when the
+    oldest pending alert has waited ``max_delay_ms``, whichever comes first.
+    Every submitter awaits its own future, which resolves with the stored row
+    once the batch has been committed.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_batch: Optional[int] = None,
+        max_delay_ms: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        self.max_batch = max(1, max_batch or ALERT_INGEST_CONFIG["MAX_BATCH"])
+        delay_ms = ALERT_INGEST_CONFIG["MAX_DELAY_MS"] if max_delay_ms is None else max_delay_ms
+        self.max_delay = max(0, delay_ms) / 1000.0
+        self.max_concurrency = max(1, max_concurrency or ALERT_INGEST_CONFIG["MAX_CONCURRENCY"])
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[PendingAlert] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_slots: Optional[asyncio.Semaphore] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def _bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Batches, timers and semaphores belong to a single event loop. The app
+        # only ever runs one, but test clients spin up their own per session.
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._pending = []
+        self._timer = None
+        self._flush_slots = asyncio.Semaphore(self.max_concurrency)
+        self._flush_tasks = set()
+
+    async def submit(self, alert_data: AlertCreate) -> Dict[str, Any]:
+        """
+        Queue an alert for the next batch and wait until it is committed.
+
+        Returns:
+            Dict[str, Any]: The column values that were stored for the alert.
+        """
+        loop = asyncio.get_running_loop()
+        self._bind(loop)
+
+        row = Alert.prepare_values({**alert_data.model_dump(), "id": uuid4()})
+        future: "asyncio.Future[Dict[str, Any]]" = loop.create_future()
+        self._pending.append((row, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._schedule_flush)
+
+        return await future
+
+    async def submit_batch(self, alerts: List[AlertCreate]) -> List[Dict[str, Any]]:
+        """
+        Store a batch of alerts in one transaction, bypassing the coalescing queue.
+
+        Either every alert is committed or none is, so a failed batch can be
+        retried as a whole.
+
+        Returns:
+            List[Dict[str, Any]]: The column values that were stored, in order.
+        """
+        self._bind(asyncio.get_running_loop())
+        rows = [Alert.prepare_values({**alert_data.model_dump(), "id": uuid4()}) for alert_data in alerts]
+        async with self._flush_slots:
+            await self._insert(rows)
+            await self._invalidate_cache(rows)
+        return rows
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, batch: List[PendingAlert]) -> None:
+        async with self._flush_slots:
+            try:
+                await self._insert([row for row, _ in batch])
+            except Exception as exc:
+                if len(batch) == 1:
+                    _resolve(batch[0][1], exc=exc)
+                    return
+                # One bad row must not fail every alert that shared its batch.
+                LOG.warning("Batch insert of %d alerts failed (%s); retrying individually", len(batch), exc)
+                stored = []
+                for row, future in batch:
+                    try:
+                        await self._insert([row])
+                    except Exception as row_exc:
+                        _resolve(future, exc=row_exc)
+                    else:
+                        stored.append((row, future))
+                batch = stored
+
+            await self._invalidate_cache([row for row, _ in batch])
+
+        for row, future in batch:
+            _resolve(future, result=row)
+
+    @staticmethod
+    async def _insert(rows: List[Dict[str, Any]]) -> None:
+        async with AsyncSessionLocal() as session:
+            for offset in range(0, len(rows), INSERT_CHUNK_ROWS):
+                await session.execute(insert(Alert).values(rows[offset:offset + INSERT_CHUNK_ROWS]))
+            await record_alerts(session, rows)
+            await session.commit()
+
+    @staticmethod
+    async def _invalidate_cache(rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        try:
+            await cache_module.cache.bump_tags(batch_tags(rows))
+        except Exception as exc:
+            # The alerts are committed; a cache outage must not fail them.
+            LOG.warning("Could not invalidate analytics cache for %d alerts: %s", len(rows), exc)
+
+    async def flush(self) -> None:
+        """Flush pending alerts immediately and wait for in-flight batches."""
+        self._schedule_flush()
+        if self._flush_tasks:
+            await asyncio.gather(*list(self._flush_tasks), return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Drain the queue before shutdown."""
+        if self._loop is asyncio.get_running_loop():
+            await self.flush()
+
+
+def _resolve(
+    future: "asyncio.Future[Dict[str, Any]]",
+    *,
+    result: Optional[Dict[str, Any]] = None,
+    exc: Optional[BaseException] = None,
+) -> None:
+    # The submitter may have been cancelled while its batch was in flight.
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
+
+
+alert_ingest = AlertIngestQueue()
@@ -1,22 +1,21 @@
 """Core alert processing and storage functionality."""
 
-import json
-from uuid import uuid4
+from typing import Any, Dict, List
+
 from fastapi import HTTPException
 
-from app.db.session import AsyncSessionLocal
-from app.models import Alert
 from app.schemas.alerts import AlertCreate, Alert as AlertSchema
-from app.services import auth_service
-from app.services.websocket import manager
-from app.utils.termii import send_sms
-from app.utils.email import send_email
+from app.services.alert_ingest import alert_ingest
+from app.services.notifications import AlertNotification, notification_dispatcher
+from app.services.websocket import BroadcastMessage, manager
 
 
 async def process_and_save_alert(alert_data: AlertCreate, source: str):
     """
     Saves a validated alert to the DB and broadcasts it.
-    This is the single source of truth for creating alerts.
+    This is the single source of truth for creating alerts. Persistence goes
+    through the shared ingest queue, so concurrent alerts share one INSERT;
+    SMS/email notifications are handed to the notification workers.
     
     Args:
         alert_data: Validated alert data
@@ -28,100 +27,71 @@ async def process_and_save_alert(alert_data: AlertCreate, source: str):
     Raises:
         HTTPException: If there's an error processing the alert
     """
-    async with AsyncSessionLocal() as session:
-        try:
-            print(alert_data)
-            alert_dict = alert_data.model_dump()
-            print(f"Processing alert data from {source}: {alert_dict}")
-            
-            alert_id = uuid4()
-            
-            new_alert = Alert(
-                **alert_dict,
-                id=alert_id
-            )
-            
-            session.add(new_alert)
-            try:
-                await session.commit()
-                await session.refresh(new_alert)
-            except Exception as db_error:
-                print(f"Database error: {db_error}")
-                await session.rollback()
-                raise db_error
-            
-            print(f"Alert from {source} saved successfully: {new_alert.alert_type}")
-
-            try:
-                alert_response = AlertSchema.from_orm(new_alert)
-            except Exception as schema_error:
-                print(f"Schema conversion error: {schema_error}")
-                raise schema_error
-            
-            try:
-                alert_dict = alert_response.model_dump(mode="json")
-                broadcast_message = json.dumps({
-                    "type": "new_alert",
-                    "alert": {
-                        "id": alert_dict["id"],
-                        "user_id": alert_dict["user_id"],
-                        "device_id": alert_dict["device_id"],
-                        "timestamp": alert_dict["timestamp"],
-                        "alert_type": alert_dict["alert_type"],
-                        "location_lat": alert_dict["location_lat"],
-                        "location_lon": alert_dict["location_lon"],
-                        "payload": alert_dict["payload"]
-                    }
-                })
-                print("Broadcasting alert to connected clients")
-                
-                await manager.send_to_user(broadcast_message, user_id=alert_response.user_id)
-            except Exception as broadcast_error:
-                print(f"WebSocket broadcast error: {broadcast_error}")
-
-            try:
-                notification_message = (
-                    f"Alert Type: {alert_response.alert_type}\n"
-                    f"User ID: {alert_response.user_id}\n"
-                    f"Device ID: {alert_response.device_id}\n"
-                    f"Timestamp: {alert_response.timestamp}\n"
-                    f"Location: ({alert_response.location_lat}, {alert_response.location_lon})\n"
-                    f"Payload: {alert_response.payload}\n"
-                )
-                
-                user = await auth_service.get_user_by_id(alert_response.user_id)
-                
-                sent_sms = await send_sms(
-                    phone_number=user.phone_number if user else None,
-                    message=notification_message
-                )
-
-                if sent_sms:
-                    print(f"Notification SMS sent to {user.phone_number if user else 'unknown user'}")
-                else:
-                    print("Failed to send notification SMS")
-
-                sent_email = send_email(
-                    to=user.email if user else None,
-                    subject="New Obex Security Alert Received",
-                    body=notification_message
-                )
-                if sent_email:
-                    print(f"Notification email sent to {user.email if user else 'unknown user'}")
-                else:
-                    print("Failed to send notification email")
-            except Exception as notification_error:
-                print(f"Notification error: {notification_error}")
-            
-            return alert_response
-
-        except Exception as e:
-            await session.rollback()
-            print(f"Error saving alert from {source}: {str(e)}")
-            import traceback
-            print("Stack trace:")
-            print(traceback.format_exc())
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Error processing alert: {str(e)}"
-            )
\ No newline at end of file
+    try:
+        stored_row = await alert_ingest.submit(alert_data)
+        print(f"Alert from {source} saved successfully: {stored_row['alert_type']}")
+
+        return await _publish(stored_row)
+
+    except Exception as e:
+        print(f"Error saving alert from {source}: {str(e)}")
+        import traceback
+        print("Stack trace:")
+        print(traceback.format_exc())
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Error processing alert: {str(e)}"
+        ) from e
+
+
+async def process_and_save_alerts(alerts: List[AlertCreate], source: str) -> List[AlertSchema]:
+    """
+    Saves a batch of validated alerts in one transaction, then broadcasts each.
+    Used for batched device uploads: either the whole batch is stored or
+    none of it is, so the sender can safely retry.
+
+    Args:
+        alerts: Validated alerts, in the order they should be stored
+        source: Origin of the alerts ("MQTT" or "HTTP")
+
+    Returns:
+        List[AlertSchema]: The processed and saved alerts
+
+    Raises:
+        HTTPException: If the batch could not be stored
+    """
+    try:
+        stored_rows = await alert_ingest.submit_batch(alerts)
+    except Exception as e:
+        print(f"Error saving {len(alerts)} alerts from {source}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing alerts: {str(e)}"
+        ) from e
+    print(f"{len(stored_rows)} alerts from {source} saved successfully")
+    return [await _publish(stored_row) for stored_row in stored_rows]
+
+
+async def _publish(stored_row: Dict[str, Any]) -> AlertSchema:
+    """Broadcast a committed alert and queue its notifications."""
+    try:
+        alert_response = AlertSchema.model_validate(stored_row)
+    except Exception as schema_error:
+        print(f"Schema conversion error: {schema_error}")
+        raise schema_error
+
+    try:
+        # Encoded once here; every socket (and the cross-worker bus) reuses it.
+        broadcast_message = BroadcastMessage.for_alert(alert_response)
+        print("Broadcasting alert to connected clients")
+        
+        await manager.send_to_user(broadcast_message, user_id=alert_response.user_id, replay=True)
+    except Exception as broadcast_error:
+        print(f"WebSocket broadcast error: {broadcast_error}")
+
+    try:
+        notification_dispatcher.enqueue(AlertNotification.from_alert(alert_response))
+    except Exception as notification_error:
+        print(f"Notification error: {notification_error}")
+    
+    return alert_response
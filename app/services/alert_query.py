@@ -1,19 +1,87 @@
 """Enhanced alert queries and utilities."""
 
-from datetime import datetime, timedelta
-import math
-from typing import Any, Dict, List, Optional
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from sqlalchemy import func, select
-from sqlalchemy.sql import and_
+from sqlalchemy import Select, func, select
+from sqlalchemy.sql import and_, or_
 
 from app.models import Alert
 from app.db.session import AsyncSessionLocal
+from app.services.alert_rollups import AlertRollupService
+from app.services.cache_codec import register_row_type
+from app.utils.geo import covering_cells, haversine_km
+
+
+EXPORT_COLUMNS = (
+    "id",
+    "user_id",
+    "device_id",
+    "timestamp",
+    "alert_type",
+    "location_lat",
+    "location_lon",
+    "payload",
+)
+
+
+def _alert_cache_row(alert: Alert) -> List[Any]:
+    # Payloads are stored JSON-encoded; cache them decoded, as the API returns them.
+    row = [getattr(alert, column) for column in EXPORT_COLUMNS]
+    payload_index = EXPORT_COLUMNS.index("payload")
+    if isinstance(row[payload_index], str):
+        row[payload_index] = json.loads(row[payload_index])
+    return row
+
+
+register_row_type(Alert, EXPORT_COLUMNS, _alert_cache_row)
 
 
 class AlertQueryService:
     """Service for complex alert queries and aggregations."""
 
+    @staticmethod
+    def user_alerts_query(
+        user_id: Any,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None
+    ) -> Select:
+        """
+        Build one keyset page of a user's alerts, newest first.
+
+        ``after`` is the (timestamp, id) of the last row of the previous page;
+        ``id`` breaks ties between alerts sharing a timestamp.
+        """
+        query = select(Alert).where(Alert.user_id == user_id)
+        if after is not None:
+            after_timestamp, after_id = after
+            query = query.where(
+                or_(
+                    Alert.timestamp < after_timestamp,
+                    and_(Alert.timestamp == after_timestamp, Alert.id < after_id),
+                )
+            )
+        return query.order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(limit)
+
+    @staticmethod
+    def timeframe_query(
+        start_time: datetime,
+        end_time: datetime,
+        alert_type: Optional[str] = None,
+        device_id: Optional[str] = None
+    ) -> Select:
+        """Build the SELECT behind ``get_alerts_by_timeframe``."""
+        query = select(Alert).where(
+            and_(Alert.timestamp >= start_time, Alert.timestamp <= end_time)
+        )
+
+        if alert_type:
+            query = query.where(Alert.alert_type == alert_type)
+        if device_id:
+            query = query.where(Alert.device_id == device_id)
+        return query
+
     @staticmethod
     async def get_alerts_by_timeframe(
         start_time: datetime,
@@ -26,18 +94,60 @@ class AlertQueryService:
             raise ValueError("end_time must be greater than or equal to start_time")
 
         async with AsyncSessionLocal() as session:
-            query = select(Alert).where(
-                and_(Alert.timestamp >= start_time, Alert.timestamp <= end_time)
-            )
-            
-            if alert_type:
-                query = query.where(Alert.alert_type == alert_type)
-            if device_id:
-                query = query.where(Alert.device_id == device_id)
-                
+            query = AlertQueryService.timeframe_query(start_time, end_time, alert_type, device_id)
             result = await session.execute(query)
             return list(result.scalars())
 
+    @staticmethod
+    async def stream_alerts_by_timeframe(
+        start_time: datetime,
+        end_time: datetime,
+        alert_type: Optional[str] = None,
+        device_id: Optional[str] = None,
+        *,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream alerts within a timeframe as plain row mappings, oldest first.
+
+        Rows are fetched ``batch_size`` at a time through a server-side cursor
+        (where the driver supports one), so memory use does not grow with the
+        size of the range.
+        """
+        if end_time < start_time:
+            raise ValueError("end_time must be greater than or equal to start_time")
+
+        columns = [Alert.__table__.c[name] for name in EXPORT_COLUMNS]
+        query = (
+            AlertQueryService.timeframe_query(start_time, end_time, alert_type, device_id)
+            .with_only_columns(*columns)
+            .order_by(Alert.timestamp)
+            .execution_options(yield_per=batch_size)
+        )
+
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(query)
+            async for partition in result.mappings().partitions():
+                for row in partition:
+                    yield row
+
+    @staticmethod
+    def location_query(lat: float, lon: float, radius_km: float = 1.0) -> Select:
+        """
+        Build the candidate SELECT behind ``get_alerts_by_location``.
+
+        Matches alerts whose geohash falls in one of the few cells covering
+        the circle's bounding box. Callers still need a distance post-filter.
+        """
+        cells = covering_cells(lat, lon, radius_km)
+        return select(Alert).where(
+            or_(*(
+                # Prefix match as a range so a plain b-tree index applies.
+                and_(Alert.geohash >= cell, Alert.geohash < cell + "~")
+                for cell in cells
+            ))
+        )
+
     @staticmethod
     async def get_alerts_by_location(
         lat: float,
@@ -51,113 +161,58 @@ class AlertQueryService:
             raise ValueError("radius_km must be positive")
 
         async with AsyncSessionLocal() as session:
-            lat_range = radius_km / 111.0  # Rough conversion: 1° latitude ≈ 111 km
-            cos_lat = math.cos(math.radians(lat)) or 1e-6
-            lon_range = radius_km / (111.0 * abs(cos_lat))
-
-            query = select(Alert).where(
-                and_(
-                    Alert.location_lat.between(lat - lat_range, lat + lat_range),
-                    Alert.location_lon.between(lon - lon_range, lon + lon_range),
-                )
-            )
-
+            query = AlertQueryService.location_query(lat, lon, radius_km)
             result = await session.execute(query)
-            return list(result.scalars())
+            return [
+                alert for alert in result.scalars()
+                if haversine_km(lat, lon, alert.location_lat, alert.location_lon) <= radius_km
+            ]
 
     @staticmethod
     async def get_alert_counts_by_type(
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None
     ) -> Dict[str, int]:
-        """Get aggregated counts of alerts by type."""
-        async with AsyncSessionLocal() as session:
-            query = select(
-                Alert.alert_type,
-                func.count(Alert.id).label('count')
-            )
-            
-            if start_time and end_time:
-                query = query.where(
-                    and_(
-                        Alert.timestamp >= start_time,
-                        Alert.timestamp <= end_time
-                    )
-                )
-                
-            query = query.group_by(Alert.alert_type)
-            result = await session.execute(query)
-            return {r[0]: r[1] for r in result}
+        """Get aggregated counts of alerts by type (served from the rollups)."""
+        return await AlertRollupService.get_counts_by_type(start_time, end_time)
 
     @staticmethod
     async def get_alert_trends(
         days: int = 7,
         interval_hours: int = 24
     ) -> Dict[str, List[Dict[str, Any]]]:
-        """Get alert trends over time."""
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=days)
-        
-        async with AsyncSessionLocal() as session:
-            bucket_size = "hour" if interval_hours < 24 else "day"
-            bind = session.get_bind()
-            dialect_name = getattr(getattr(bind, "dialect", None), "name", "")
-            is_sqlite = dialect_name == "sqlite"
-
-            if is_sqlite:
-                date_format = "%Y-%m-%d %H:00:00" if bucket_size == "hour" else "%Y-%m-%d"
-                bucket_expression = func.strftime(date_format, Alert.timestamp).label("bucket")
-            else:
-                bucket_expression = func.date_trunc(bucket_size, Alert.timestamp).label("bucket")
-
-            query = (
-                select(
-                    Alert.alert_type,
-                    bucket_expression,
-                    func.count(Alert.id).label("count"),
-                )
-                .where(
-                    and_(Alert.timestamp >= start_time, Alert.timestamp <= end_time)
-                )
-                .group_by(Alert.alert_type, bucket_expression)
-                .order_by(bucket_expression)
-            )
+        """Get alert trends over time (served from the rollups)."""
+        return await AlertRollupService.get_trends(days, interval_hours)
 
-            result = await session.execute(query)
-
-            trends: Dict[str, List[Dict[str, Any]]] = {}
-            for alert_type, bucket_value, count in result:
-                bucket_str = (
-                    bucket_value.isoformat()
-                    if hasattr(bucket_value, "isoformat")
-                    else str(bucket_value)
-                )
-                trends.setdefault(alert_type, []).append({"date": bucket_str, "count": count})
-
-            return trends
+    @staticmethod
+    def device_statistics_queries(device_id: str) -> Dict[str, Select]:
+        """Build the SELECTs behind ``get_device_statistics``."""
+        return {
+            'total': select(func.count(Alert.id)).where(Alert.device_id == device_id),
+            'by_type': select(
+                Alert.alert_type,
+                func.count(Alert.id).label('count')
+            ).where(
+                Alert.device_id == device_id
+            ).group_by(Alert.alert_type),
+            'latest': select(Alert).where(
+                Alert.device_id == device_id
+            ).order_by(Alert.timestamp.desc()).limit(1),
+        }
 
     @staticmethod
     async def get_device_statistics(device_id: str) -> Dict[str, Any]:
         """Get comprehensive statistics for a specific device."""
+        queries = AlertQueryService.device_statistics_queries(device_id)
         async with AsyncSessionLocal() as session:
             # Get total alerts
-            total_query = select(func.count(Alert.id)).where(Alert.device_id == device_id)
-            total_result = await session.execute(total_query)
+            total_result = await session.execute(queries['total'])
             total_alerts = total_result.scalar()
             
-            type_query = select(
-                Alert.alert_type,
-                func.count(Alert.id).label('count')
-            ).where(
-                Alert.device_id == device_id
-            ).group_by(Alert.alert_type)
-            type_result = await session.execute(type_query)
+            type_result = await session.execute(queries['by_type'])
             alerts_by_type = {r[0]: r[1] for r in type_result}
             
-            latest_query = select(Alert).where(
-                Alert.device_id == device_id
-            ).order_by(Alert.timestamp.desc()).limit(1)
-            latest_result = await session.execute(latest_query)
+            latest_result = await session.execute(queries['latest'])
             latest_alert = latest_result.scalar()
             
             return {
@@ -0,0 +1,258 @@
+"""Incrementally maintained hourly/daily alert counters for analytics."""
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Select, delete, event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import and_
+
+from app.db.base import AppSession
+from app.db.session import AsyncSessionLocal
+from app.models import Alert, AlertRollup
+
+LOG = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Six bind parameters per row keeps each upsert well under asyncpg's 32767 limit
+UPSERT_CHUNK_ROWS = 1000
+
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """Rollup buckets are stored as naive UTC datetimes."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    value = to_utc_naive(value)
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket_ceil(value: datetime, granularity: str) -> datetime:
+    start = bucket_start(value, granularity)
+    return start if start == value else start + GRANULARITIES[granularity]
+
+
+def rollup_counts(rows: Iterable[Mapping[str, Any]], sign: int = 1) -> Counter:
+    """Count alert rows per rollup key at every granularity."""
+    counts: Counter = Counter()
+    for row in rows:
+        user_id = row.get("user_id")
+        for granularity in GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(row["timestamp"], granularity),
+                row["alert_type"],
+                row["device_id"],
+                str(user_id) if user_id is not None else "",
+            )
+            counts[key] += sign
+    return counts
+
+
+def upsert_statements(counts: Counter, dialect_name: str) -> List[Any]:
+    """
+    Build INSERT .. ON CONFLICT DO UPDATE statements adding ``counts`` to the
+    rollups, chunked to stay under driver bind-parameter limits.
+    """
+    rows = [
+        {
+            "granularity": granularity,
+            "bucket": bucket,
+            "alert_type": alert_type,
+            "device_id": device_id,
+            "user_id": user_id,
+            "count": delta,
+        }
+        # Sorted so concurrent upserts lock rollup rows in the same order
+        for (granularity, bucket, alert_type, device_id, user_id), delta in sorted(counts.items())
+        if delta
+    ]
+    if not rows:
+        return []
+    dialect_insert = _UPSERT_INSERTS.get(dialect_name)
+    if dialect_insert is None:
+        LOG.warning("Alert rollups are not maintained on %s; run the backfill instead", dialect_name)
+        return []
+
+    table = AlertRollup.__table__
+    statements = []
+    for offset in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        stmt = dialect_insert(table).values(rows[offset:offset + UPSERT_CHUNK_ROWS])
+        statements.append(stmt.on_conflict_do_update(
+            index_elements=["granularity", "bucket", "alert_type", "device_id", "user_id"],
+            set_={"count": table.c["count"] + stmt.excluded["count"]},
+        ))
+    return statements
+
+
+async def record_alerts(session, rows: List[Mapping[str, Any]]) -> None:
+    """Add freshly inserted alert rows to the rollups inside the caller's transaction."""
+    for stmt in upsert_statements(rollup_counts(rows), session.get_bind().dialect.name):
+        await session.execute(stmt)
+
+
+def _alert_row(alert: Alert) -> Dict[str, Any]:
+    return {
+        "timestamp": alert.timestamp,
+        "alert_type": alert.alert_type,
+        "device_id": alert.device_id,
+        "user_id": alert.user_id,
+    }
+
+
+@event.listens_for(AppSession, "after_flush")
+def _record_flushed_alerts(session: Session, flush_context) -> None:
+    # Alerts added or deleted through the ORM (rather than the batched Core
+    # insert in alert_ingest) are counted here, in the same transaction.
+    counts: Counter = Counter()
+    counts.update(rollup_counts(_alert_row(obj) for obj in session.new if isinstance(obj, Alert)))
+    counts.update(rollup_counts((_alert_row(obj) for obj in session.deleted if isinstance(obj, Alert)), sign=-1))
+    for stmt in upsert_statements(counts, session.get_bind().dialect.name):
+        session.connection().execute(stmt)
+
+
+def _plan_segments(start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Split [start, end] into whole days, whole hours and raw leftovers.
+
+    Returns (source, lower, upper) triples where source is "day", "hour" or
+    "raw". Ranges are half-open except the final raw one, which keeps the
+    inclusive upper bound of the original query.
+    """
+    hour_lo, hour_hi = _bucket_ceil(start, "hour"), bucket_start(end, "hour")
+    if hour_lo >= hour_hi:
+        return [("raw", start, end)]
+
+    segments = []
+    if start < hour_lo:
+        segments.append(("raw", start, hour_lo))
+
+    day_lo, day_hi = _bucket_ceil(hour_lo, "day"), bucket_start(hour_hi, "day")
+    if day_lo < day_hi:
+        if hour_lo < day_lo:
+            segments.append(("hour", hour_lo, day_lo))
+        segments.append(("day", day_lo, day_hi))
+        if day_hi < hour_hi:
+            segments.append(("hour", day_hi, hour_hi))
+    else:
+        segments.append(("hour", hour_lo, hour_hi))
+
+    segments.append(("raw", hour_hi, end))
+    return segments
+
+
+class AlertRollupService:
+    """Answers analytics count queries from the rollup table."""
+
+    @staticmethod
+    def counts_query(granularity: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Select:
+        query = select(AlertRollup.alert_type, func.sum(AlertRollup.count)).where(
+            AlertRollup.granularity == granularity
+        )
+        if start is not None:
+            query = query.where(AlertRollup.bucket >= start)
+        if end is not None:
+            query = query.where(AlertRollup.bucket < end)
+        return query.group_by(AlertRollup.alert_type)
+
+    @staticmethod
+    def trends_query(granularity: str, start: datetime) -> Select:
+        return (
+            select(AlertRollup.alert_type, AlertRollup.bucket, func.sum(AlertRollup.count))
+            .where(and_(AlertRollup.granularity == granularity, AlertRollup.bucket >= start))
+            .group_by(AlertRollup.alert_type, AlertRollup.bucket)
+            .order_by(AlertRollup.bucket)
+        )
+
+    @staticmethod
+    def raw_counts_query(start: datetime, end: datetime, inclusive: bool) -> Select:
+        upper = Alert.timestamp <= end if inclusive else Alert.timestamp < end
+        return (
+            select(Alert.alert_type, func.count(Alert.id))
+            .where(and_(Alert.timestamp >= start, upper))
+            .group_by(Alert.alert_type)
+        )
+
+    @staticmethod
+    async def get_counts_by_type(
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """Alert counts by type, reading whole hours/days from rollups and only the edges raw."""
+        if not (start_time and end_time):
+            queries = [AlertRollupService.counts_query("day")]
+        else:
+            start, end = to_utc_naive(start_time), to_utc_naive(end_time)
+            segments = _plan_segments(start, end)
+            queries = [
+                AlertRollupService.raw_counts_query(lower, upper, inclusive=index == len(segments) - 1)
+                if source == "raw"
+                else AlertRollupService.counts_query(source, lower, upper)
+                for index, (source, lower, upper) in enumerate(segments)
+            ]
+
+        totals: Counter = Counter()
+        async with AsyncSessionLocal() as session:
+            for query in queries:
+                for alert_type, count in await session.execute(query):
+                    totals[alert_type] += int(count or 0)
+        return {alert_type: count for alert_type, count in totals.items() if count > 0}
+
+    @staticmethod
+    async def get_trends(days: int = 7, interval_hours: int = 24) -> Dict[str, List[Dict[str, Any]]]:
+        """Per-type counts per hour or day bucket over the last ``days`` days."""
+        granularity = "hour" if interval_hours < 24 else "day"
+        start = bucket_start(datetime.utcnow() - timedelta(days=days), granularity)
+
+        trends: Dict[str, List[Dict[str, Any]]] = {}
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(AlertRollupService.trends_query(granularity, start))
+            for alert_type, bucket, count in result:
+                if count:
+                    trends.setdefault(alert_type, []).append({"date": bucket.isoformat(), "count": int(count)})
+        return trends
+
+    @staticmethod
+    async def rebuild(batch_size: int = 5000) -> int:
+        """
+        Recompute every rollup from the raw alerts table.
+
+        Runs as one transaction; pause ingestion while it runs, or alerts
+        written meanwhile may be counted twice or not at all.
+
+        Returns:
+            int: Number of alerts counted.
+        """
+        total = 0
+        async with AsyncSessionLocal() as session:
+            dialect_name = session.get_bind().dialect.name
+            await session.execute(delete(AlertRollup))
+
+            query = select(
+                Alert.timestamp, Alert.alert_type, Alert.device_id, Alert.user_id
+            ).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for partition in result.mappings().partitions():
+                for stmt in upsert_statements(rollup_counts(partition), dialect_name):
+                    await session.execute(stmt)
+                total += len(partition)
+
+            await session.commit()
+        return total
@@ -1,13 +1,16 @@
 """Authentication service (Refactored for Email Login)."""
 import logging
 import secrets
-from typing import Optional
+import uuid
+from typing import Any, Mapping, Optional, Union
 from datetime import datetime, timedelta
 
-from passlib.hash import argon2
 from sqlalchemy import select, update
 
+import app.services.cache as cache_module
+from app.core.settings import AUTH_CONFIG
 from app.models.user import User
+from app.services.password_hasher import HasherBusyError, password_hasher
 from app.config.database import AsyncSessionLocal
 
 LOG = logging.getLogger(__name__)
@@ -15,14 +18,30 @@ LOG = logging.getLogger(__name__)
 MAX_FAILED_ATTEMPTS = 5
 LOCK_MINUTES = 15
 
+# Identity fields kept in the user cache; credentials are never cached.
+USER_CACHE_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "phone_number",
+    "failed_attempts",
+    "locked_until",
+    "last_login_at",
+    "created_at",
+)
+_USER_CACHE_DATETIMES = ("locked_until", "last_login_at", "created_at")
+
 async def create_user(
     username: str, 
     email: str,
     phone_number: str,
     password: str
 ) -> User:
-    """Create a new user. Raises ValueError if email exists."""
-    password_hash = argon2.hash(password)
+    """
+    Create a new user. Raises ValueError if email exists, or
+    HasherBusyError if the password hasher is saturated.
+    """
+    password_hash = await password_hasher.hash(password)
     password_salt = secrets.token_hex(16)
 
     async with AsyncSessionLocal() as session:
@@ -47,7 +66,7 @@ async def create_user(
         return user
 
 async def authenticate(email: str, password: str) -> Optional[User]:
-    """Authenticate by EMAIL."""
+    """Authenticate by EMAIL. Raises HasherBusyError if the password hasher is saturated."""
     async with AsyncSessionLocal() as session:
         q = select(User).where(User.email == email)
         result = await session.execute(q)
@@ -62,7 +81,9 @@ async def authenticate(email: str, password: str) -> Optional[User]:
             return None
 
         try:
-            verified = argon2.verify(password, user.password_hash)
+            verified = await password_hasher.verify(password, user.password_hash)
+        except HasherBusyError:
+            raise
         except Exception:
             verified = False
 
@@ -73,6 +94,7 @@ async def authenticate(email: str, password: str) -> Optional[User]:
                 .values(failed_attempts=0, locked_until=None, last_login_at=now)
             )
             await session.commit()
+            await invalidate_user(user.id)
             return user
 
         failed_val = getattr(user, "failed_attempts", None)
@@ -91,12 +113,65 @@ async def authenticate(email: str, password: str) -> Optional[User]:
             .values(failed_attempts=new_failed, locked_until=locked_until)
         )
         await session.commit()
+        await invalidate_user(user.id)
+        return None
+
+
+def _user_cache_key(user_id: uuid.UUID) -> str:
+    return cache_module.cache.get_key("user", str(user_id))
+
+
+def _user_from_cache(data: Mapping[str, Any]) -> User:
+    values = dict(data)
+    values["id"] = uuid.UUID(str(values["id"]))
+    for field in _USER_CACHE_DATETIMES:
+        if isinstance(values.get(field), str):
+            values[field] = datetime.fromisoformat(values[field])
+    return User(**values)
+
+
+async def invalidate_user(user_id: Union[str, uuid.UUID]) -> None:
+    """Drop a user from the identity cache after their row changes."""
+    try:
+        await cache_module.cache.delete(_user_cache_key(user_id))
+    except Exception as exc:
+        LOG.warning("Could not invalidate cached user %s: %s", user_id, exc)
+
+
+async def get_user_by_id(user_id: Union[str, uuid.UUID]) -> Optional[User]:
+    """
+    Retrieve a user by their ID.
+
+    Served from the identity cache for up to USER_CACHE_TTL seconds. Cached
+    users are detached and have no password fields; load the row directly
+    for anything that needs credentials or writes.
+    """
+    try:
+        user_id = user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))
+    except ValueError:
         return None
-    
-async def get_user_by_id(user_id: int) -> Optional[User]:
-    """Retrieve a user by their ID."""
+
+    key = _user_cache_key(user_id)
+    try:
+        cached = await cache_module.cache.get(key)
+    except Exception as exc:
+        LOG.warning("User cache unavailable, reading user %s from the database: %s", user_id, exc)
+        cached = None
+    if cached is not None:
+        return _user_from_cache(cached)
+
     async with AsyncSessionLocal() as session:
         q = select(User).where(User.id == user_id)
         result = await session.execute(q)
         user = result.scalar_one_or_none()
-        return user
\ No newline at end of file
+
+    if user is not None:
+        try:
+            await cache_module.cache.set(
+                key,
+                {field: getattr(user, field) for field in USER_CACHE_FIELDS},
+                expire=AUTH_CONFIG["USER_CACHE_TTL"],
+            )
+        except Exception as exc:
+            LOG.warning("Could not cache user %s: %s", user_id, exc)
+    return user
\ No newline at end of file
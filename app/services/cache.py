@@ -2,11 +2,38 @@
 
 import asyncio
 import json
-from typing import Any, Callable, Optional
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import uuid4
 
 from redis import asyncio as redis_asyncio
 
 from app.core.settings import REDIS_CONFIG
+from app.services.cache_codec import CacheCodec, CodecError
+from app.services.local_cache import MISSING, LocalCache
+
+LOG = logging.getLogger(__name__)
+
+# Delete a lock only if we still hold it; it may have expired and been
+# taken by another worker while we were computing.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class InvalidationResult:
+    """Outcome of a bulk cache invalidation."""
+
+    deleted: int = 0
+    elapsed_ms: float = 0.0
 
 
 class RedisCache:
@@ -18,17 +45,30 @@ class RedisCache:
         url: Optional[str] = None,
         prefix: Optional[str] = None,
         redis_client: Optional[redis_asyncio.Redis] = None,
+        local_cache: Optional[bool] = None,
+        codec: Optional[CacheCodec] = None,
     ) -> None:
         self._prefix = prefix or REDIS_CONFIG["PREFIX"]
+        self.codec = codec or CacheCodec()
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._inflight_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        use_local = REDIS_CONFIG["LOCAL_CACHE"] if local_cache is None else local_cache
+        self._local: Optional[LocalCache] = LocalCache(
+            REDIS_CONFIG["LOCAL_MAX_ENTRIES"],
+            REDIS_CONFIG["LOCAL_MAX_BYTES"],
+            REDIS_CONFIG["LOCAL_TIMEOUT"],
+        ) if use_local else None
+        # Identifies this process's own invalidation messages on the channel.
+        self._instance_id = uuid4().hex
+        self._listener: Optional["asyncio.Task[None]"] = None
+        self._listener_loop: Optional[asyncio.AbstractEventLoop] = None
         if redis_client is not None:
             self.redis = redis_client
         else:
             redis_url = url or self._build_url()
-            self.redis = redis_asyncio.from_url(
-                redis_url,
-                encoding="utf-8",
-                decode_responses=True,
-            )
+            # Values are binary (see cache_codec), so responses stay as bytes.
+            self.redis = redis_asyncio.from_url(redis_url, decode_responses=False)
 
     @staticmethod
     def _build_url() -> str:
@@ -41,29 +81,213 @@ class RedisCache:
         sanitized = [str(part) for part in parts if part is not None]
         return ":".join([self._prefix, *sanitized])
 
+    def _local_cache(self) -> Optional[LocalCache]:
+        """Return the in-process tier, making sure this loop listens for invalidations."""
+        if self._local is None:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._listener_loop is not loop or self._listener is None or self._listener.done():
+            # Anything cached while nobody was listening may have been missed.
+            self._local.clear()
+            self._listener_loop = loop
+            self._listener = loop.create_task(self._listen_for_invalidations())
+        return self._local
+
+    async def _listen_for_invalidations(self) -> None:
+        channel = self.get_key("invalidate")
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_invalidation(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                LOG.warning("Cache invalidation channel failed (%s); dropping local cache and resubscribing", exc)
+                self._local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _apply_invalidation(self, message: Dict[str, Any]) -> None:
+        if message.get("src") == self._instance_id:
+            return
+        if message.get("all"):
+            self._local.clear()
+        for key in message.get("keys", ()):
+            self._local.discard(key)
+        if message.get("tags"):
+            self._local.discard_tags(message["tags"])
+        if message.get("pattern"):
+            self._local.discard_pattern(message["pattern"])
+
+    async def _publish_invalidation(self, **message: Any) -> None:
+        if self._local is None:
+            return
+        try:
+            await self.redis.publish(self.get_key("invalidate"), json.dumps({"src": self._instance_id, **message}))
+        except Exception as exc:
+            # Other workers' local copies expire within LOCAL_TIMEOUT regardless.
+            LOG.warning("Could not publish cache invalidation: %s", exc)
+
+    def _decode(self, key: str, raw: Optional[bytes]) -> Optional[Any]:
+        if raw is None:
+            return None
+        try:
+            return self.codec.decode(raw)
+        except CodecError as exc:
+            # Written by an older or newer release; recompute it.
+            LOG.debug("Ignoring undecodable cache entry %s: %s", key, exc)
+            return None
+
     async def get(self, key: str) -> Optional[Any]:
-        """Return a value from cache (decoded from JSON)."""
-        value = await self.redis.get(key)
-        return json.loads(value) if value is not None else None
+        """Return a decoded value from cache."""
+        local = self._local_cache()
+        if local is None:
+            return self._decode(key, await self.redis.get(key))
+
+        cached = local.get(key)
+        if cached is not MISSING:
+            return cached
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, ttl_ms = await pipe.execute()
+        value = self._decode(key, raw)
+        if value is not None:
+            local.put(key, value, len(raw), ttl=ttl_ms / 1000 if ttl_ms > 0 else None)
+        return value
+
+    async def _store(self, key: str, value: Any, ttl: int, tags: Sequence[str] = ()) -> Any:
+        """Write ``value`` and return it as readers will decode it."""
+        encoded = self.codec.encode(value)
+        await self.redis.set(key, encoded, ex=ttl)
+        stored = self.codec.decode(encoded)
+        local = self._local_cache()
+        if local is not None:
+            local.put(key, stored, len(encoded), ttl=ttl, tags=tags)
+            await self._publish_invalidation(keys=[key])
+        return stored
 
     async def set(self, key: str, value: Any, *, expire: Optional[int] = None) -> None:
-        """Store a value (encoded as JSON) with optional expiration."""
+        """Store a value (see cache_codec for supported types) with optional expiration."""
         ttl = expire if expire is not None else REDIS_CONFIG["DEFAULT_TIMEOUT"]
-        await self.redis.set(key, json.dumps(value), ex=ttl)
+        await self._store(key, value, ttl)
 
     async def delete(self, key: str) -> None:
         """Remove a single cache entry."""
         await self.redis.delete(key)
+        local = self._local_cache()
+        if local is not None:
+            local.discard(key)
+            await self._publish_invalidation(keys=[key])
+
+    async def invalidate_pattern(self, pattern: str, *, batch_size: Optional[int] = None) -> InvalidationResult:
+        """
+        Remove keys matching the provided glob pattern.
 
-    async def invalidate_pattern(self, pattern: str) -> None:
-        """Remove keys matching the provided glob pattern."""
-        keys = await self.redis.keys(pattern)
-        if keys:
-            await self.redis.delete(*keys)
+        Walks the keyspace with SCAN instead of KEYS so Redis keeps serving
+        other clients, and frees each batch with a single UNLINK so values
+        are reclaimed off the main thread.
+        """
+        batch_size = batch_size or REDIS_CONFIG["SCAN_BATCH"]
+        started = time.perf_counter()
+        deleted = 0
+        batch: List[str] = []
+
+        async for key in self.redis.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += await self.redis.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await self.redis.unlink(*batch)
+
+        local = self._local_cache()
+        if local is not None:
+            local.discard_pattern(pattern)
+            await self._publish_invalidation(pattern=pattern)
+
+        result = InvalidationResult(deleted=deleted, elapsed_ms=(time.perf_counter() - started) * 1000)
+        LOG.info("Invalidated %d cache keys matching %r in %.1fms", result.deleted, pattern, result.elapsed_ms)
+        return result
 
     async def clear_all(self) -> None:
         """Clear the entire Redis database used by the cache."""
         await self.redis.flushdb()
+        local = self._local_cache()
+        if local is not None:
+            local.clear()
+            await self._publish_invalidation(all=True)
+
+    def _tag_key(self, tag: str) -> str:
+        return self.get_key("tag", tag)
+
+    async def bump_tags(self, tags: Iterable[str]) -> None:
+        """
+        Invalidate every entry cached with any of ``tags``.
+
+        Each tag is a generation counter; entries record the generations they
+        were computed under and are treated as misses once one has moved on.
+        """
+        tags = sorted(set(tags))
+        if not tags:
+            return
+        ttl = REDIS_CONFIG["TAG_TIMEOUT"]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                pipe.incr(tag_key)
+                # Counters must outlive every entry that recorded them.
+                pipe.expire(tag_key, ttl)
+            await pipe.execute()
+
+        local = self._local_cache()
+        if local is not None:
+            local.discard_tags(tags)
+            await self._publish_invalidation(tags=tags)
+
+    async def _read_entry(self, key: str, tags: Sequence[str]) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+        """
+        Return (entry or None, current tag generations) in one round trip.
+
+        Entries written under tag generations that have since been bumped are
+        reported as missing.
+        """
+        raw_values = await self.redis.mget([key, *(self._tag_key(tag) for tag in tags)])
+        generations = {tag: int(raw or 0) for tag, raw in zip(tags, raw_values[1:])}
+        if raw_values[0] is None:
+            return None, generations
+
+        entry = self._decode(key, raw_values[0])
+        if not isinstance(entry, dict) or "value" not in entry or entry.get("tags", {}) != generations:
+            return None, generations
+
+        local = self._local_cache()
+        if local is not None:
+            local.put(key, entry, len(raw_values[0]), ttl=entry.get("expiry", 0) - time.time(), tags=tags)
+        return entry, generations
+
+    @staticmethod
+    def _should_refresh(entry: Dict[str, Any]) -> bool:
+        # Probabilistic early expiration ("XFetch"): the closer an entry is to
+        # expiry, and the longer it took to compute, the likelier a reader is
+        # to rebuild it early, so hot keys rarely expire under load.
+        delta = entry.get("delta", 0.0)
+        expiry = entry.get("expiry")
+        if expiry is None or delta <= 0:
+            return False
+        jitter = -delta * REDIS_CONFIG["EARLY_REFRESH_BETA"] * math.log(1.0 - random.random())
+        return time.time() + jitter >= expiry
+
+    def _inflight_for_loop(self) -> Dict[str, "asyncio.Task[Any]"]:
+        loop = asyncio.get_running_loop()
+        if self._inflight_loop is not loop:
+            self._inflight_loop = loop
+            self._inflight = {}
+        return self._inflight
 
     async def get_or_set(
         self,
@@ -71,23 +295,91 @@ class RedisCache:
         getter_func: Callable[[], Any],
         *,
         expire: Optional[int] = None,
+        tags: Optional[List[str]] = None,
     ) -> Any:
-        """Read-through cache helper."""
-        value = await self.get(key)
-        if value is not None:
-            return value
+        """
+        Read-through cache helper.
 
-        maybe_coroutine = getter_func()
-        if asyncio.iscoroutine(maybe_coroutine):
-            value = await maybe_coroutine
-        else:
-            value = maybe_coroutine
+        When ``tags`` are given the entry is only served until one of them is
+        bumped with ``bump_tags``. Concurrent misses for the same key run
+        ``getter_func`` once per process, and a short Redis lock keeps other
+        workers from recomputing it at the same time.
+        """
+        tags = tags or []
+        local = self._local_cache()
+        if local is not None:
+            entry = local.get(key, tags)
+            if entry is not MISSING:
+                return entry["value"]
 
-        await self.set(key, value, expire=expire)
-        return value
+        entry, generations = await self._read_entry(key, tags)
+        if entry is not None and not self._should_refresh(entry):
+            return entry["value"]
+
+        inflight = self._inflight_for_loop()
+        task = inflight.get(key)
+        if task is None:
+            stale = entry["value"] if entry is not None else None
+            task = asyncio.ensure_future(self._recompute(key, getter_func, expire, tags, generations, stale))
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        # Shielded so one cancelled request does not cancel the shared rebuild.
+        return await asyncio.shield(task)
+
+    async def _recompute(
+        self,
+        key: str,
+        getter_func: Callable[[], Any],
+        expire: Optional[int],
+        tags: Sequence[str],
+        generations: Dict[str, int],
+        stale: Optional[Any],
+    ) -> Any:
+        lock_key = f"{key}:lock"
+        token = uuid4().hex
+        locked = await self.redis.set(lock_key, token, nx=True, px=REDIS_CONFIG["LOCK_TIMEOUT_MS"])
+        if not locked:
+            # Another worker is rebuilding this key: serve what we have, or
+            # wait for its result before falling back to computing it here.
+            if stale is not None:
+                return stale
+            value = await self._wait_for_fill(key, tags)
+            if value is not None:
+                return value
+
+        try:
+            started = time.monotonic()
+            maybe_coroutine = getter_func()
+            if asyncio.iscoroutine(maybe_coroutine):
+                value = await maybe_coroutine
+            else:
+                value = maybe_coroutine
+            delta = time.monotonic() - started
+
+            ttl = expire if expire is not None else REDIS_CONFIG["DEFAULT_TIMEOUT"]
+            # Generations were read before computing, so an alert committed
+            # meanwhile leaves this entry stale rather than wrongly fresh.
+            entry = {"value": value, "tags": generations, "delta": round(delta, 4), "expiry": time.time() + ttl}
+            # Return the decoded form so misses and hits look the same to callers.
+            return (await self._store(key, entry, ttl, tags))["value"]
+        finally:
+            if locked:
+                await self.redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    async def _wait_for_fill(self, key: str, tags: Sequence[str]) -> Optional[Any]:
+        deadline = time.monotonic() + REDIS_CONFIG["LOCK_TIMEOUT_MS"] / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(REDIS_CONFIG["LOCK_POLL_MS"] / 1000)
+            entry, _ = await self._read_entry(key, tags)
+            if entry is not None:
+                return entry["value"]
+        return None
 
     async def close(self) -> None:
         """Close the underlying Redis connection pool."""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
         await self.redis.close()
 
 cache = RedisCache()
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""Binary codecs for values stored by RedisCache.
+
+Every stored value starts with a three byte header: the codec version, the
+serializer and the compression used. Readers decode whatever a peer wrote,
+so the serializer or compression can be changed without flushing Redis.
+
+Values are first reduced to plain data by ``to_cacheable``. Lists of ORM
+rows or Pydantic models become ``{"__rows__": columns, "rows": [...]}`` so
+column names are stored once per list rather than once per row, and
+``from_cacheable`` expands them back into dicts.
+"""
+
+import json
+import logging
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from uuid import UUID
+
+from pydantic import BaseModel
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.exc import NoInspectionAvailable
+
+from app.core.settings import REDIS_CONFIG
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - optional dependency
+    lz4_frame = None
+
+LOG = logging.getLogger(__name__)
+
+CODEC_VERSION = 1
+ROWS_MARKER = "__rows__"
+
+SERIALIZERS = {"json": 1, "msgpack": 2}
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+
+class CodecError(ValueError):
+    """Raised for bytes this codec cannot decode."""
+
+
+RowEncoder = Callable[[Any], Sequence[Any]]
+_ROW_TYPES: Dict[type, Tuple[Tuple[str, ...], RowEncoder]] = {}
+
+
+def register_row_type(cls: type, columns: Sequence[str], to_row: Optional[RowEncoder] = None) -> None:
+    """
+    Cache instances of ``cls`` as rows of ``columns``.
+
+    ``to_row`` returns the column values for one instance; by default they
+    are read as attributes. ORM classes and Pydantic models that are not
+    registered are cached with all their mapped columns or fields.
+    """
+    columns = tuple(columns)
+    _ROW_TYPES[cls] = (columns, to_row or (lambda obj: [getattr(obj, column) for column in columns]))
+
+
+def _row_type(cls: type) -> Optional[Tuple[Tuple[str, ...], RowEncoder]]:
+    if cls in _ROW_TYPES:
+        return _ROW_TYPES[cls]
+    if issubclass(cls, BaseModel):
+        columns = tuple(cls.model_fields)
+        return columns, lambda obj: [getattr(obj, column) for column in columns]
+    try:
+        mapper = sa_inspect(cls)
+    except NoInspectionAvailable:
+        return None
+    register_row_type(cls, [attr.key for attr in mapper.column_attrs])
+    return _ROW_TYPES[cls]
+
+
+def to_cacheable(value: Any) -> Any:
+    """Reduce ``value`` to dicts, lists, strings and numbers."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): to_cacheable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        row_type = _row_type(type(value[0])) if value else None
+        if row_type is not None and all(type(item) is type(value[0]) for item in value):
+            columns, to_row = row_type
+            return {
+                ROWS_MARKER: list(columns),
+                "rows": [[to_cacheable(cell) for cell in to_row(item)] for item in value],
+            }
+        return [to_cacheable(item) for item in value]
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return to_cacheable(value.value)
+
+    row_type = _row_type(type(value))
+    if row_type is None:
+        raise TypeError(f"Cannot cache values of type {type(value).__name__}")
+    columns, to_row = row_type
+    return {column: to_cacheable(cell) for column, cell in zip(columns, to_row(value))}
+
+
+def from_cacheable(value: Any) -> Any:
+    """Expand the compact row lists produced by ``to_cacheable``."""
+    if isinstance(value, dict):
+        if ROWS_MARKER in value:
+            columns = value[ROWS_MARKER]
+            return [dict(zip(columns, row)) for row in value["rows"]]
+        return {key: from_cacheable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_cacheable(item) for item in value]
+    return value
+
+
+def _serialize(value: Any, serializer: str) -> bytes:
+    if serializer == "msgpack":
+        return msgpack.packb(value, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _deserialize(data: bytes, serializer_id: int) -> Any:
+    if serializer_id == SERIALIZERS["json"]:
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    if serializer_id == SERIALIZERS["msgpack"] and msgpack is not None:
+        return msgpack.unpackb(data, raw=False)
+    raise CodecError(f"Unsupported serializer {serializer_id}")
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zlib":
+        return zlib.compress(data, 1)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression == "lz4":
+        return lz4_frame.compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression_id: int) -> bytes:
+    if compression_id == COMPRESSIONS["none"]:
+        return data
+    if compression_id == COMPRESSIONS["zlib"]:
+        return zlib.decompress(data)
+    if compression_id == COMPRESSIONS["zstd"] and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression_id == COMPRESSIONS["lz4"] and lz4_frame is not None:
+        return lz4_frame.decompress(data)
+    raise CodecError(f"Unsupported compression {compression_id}")
+
+
+def _available(name: str, fallback: str, module: Any) -> str:
+    if module is not None:
+        return name
+    LOG.warning("Cache codec %r is not installed; falling back to %r", name, fallback)
+    return fallback
+
+
+class CacheCodec:
+    """Encodes cache values with a configurable serializer and compression."""
+
+    def __init__(
+        self,
+        serializer: Optional[str] = None,
+        compression: Optional[str] = None,
+        compress_min_bytes: Optional[int] = None,
+    ) -> None:
+        serializer = serializer or REDIS_CONFIG["CODEC"]
+        compression = compression or REDIS_CONFIG["COMPRESSION"]
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown cache serializer {serializer!r}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown cache compression {compression!r}")
+
+        # Fall back to what is always installed rather than failing at import.
+        self.serializer = _available(serializer, "json", msgpack) if serializer == "msgpack" else serializer
+        if compression == "zstd":
+            compression = _available(compression, "zlib", zstandard)
+        elif compression == "lz4":
+            compression = _available(compression, "zlib", lz4_frame)
+        self.compression = compression
+        self.compress_min_bytes = (
+            REDIS_CONFIG["COMPRESS_MIN_BYTES"] if compress_min_bytes is None else compress_min_bytes
+        )
+
+    def encode(self, value: Any) -> bytes:
+        data = _serialize(to_cacheable(value), self.serializer)
+        compression = self.compression if len(data) >= self.compress_min_bytes else "none"
+        header = bytes((CODEC_VERSION, SERIALIZERS[self.serializer], COMPRESSIONS[compression]))
+        return header + _compress(data, compression)
+
+    @staticmethod
+    def decode(data: bytes) -> Any:
+        if len(data) < 3 or data[0] != CODEC_VERSION:
+            raise CodecError("Unknown cache codec version")
+        try:
+            return from_cacheable(_deserialize(_decompress(data[3:], data[2]), data[1]))
+        except CodecError:
+            raise
+        except Exception as exc:
+            raise CodecError(f"Corrupt cache value: {exc}") from exc
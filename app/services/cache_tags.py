@@ -0,0 +1,96 @@
+"""Invalidation tags linking cached analytics results to the alerts they cover.
+
+Every cached analytics response is stored with the tags it depends on, and
+every committed alert bumps the tags it touches (see ``alert_tags``). A cached
+entry is only served while none of its tags have been bumped since it was
+written, so a new alert for device A today leaves device B's statistics and
+last week's counts untouched.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, List, Mapping, Optional, Set
+
+from app.core.settings import REDIS_CONFIG
+from app.services.alert_rollups import to_utc_naive
+from app.utils.geo import covering_cells
+
+ALL_ALERTS = "all"
+
+# Geo tags stop at ~4.9km x 4.9km cells; finer location queries share them.
+GEO_TAG_PRECISION = 5
+
+
+def _day(value: date) -> str:
+    return value.strftime("%Y%m%d")
+
+
+def alert_tags(row: Mapping[str, Any]) -> Set[str]:
+    """Tags bumped when ``row`` (a stored alert's column values) is committed."""
+    day = _day(to_utc_naive(row["timestamp"]))
+    alert_type, device_id = row["alert_type"], row["device_id"]
+    tags = {
+        ALL_ALERTS,
+        f"day:{day}",
+        f"day:{day}:type:{alert_type}",
+        f"day:{day}:device:{device_id}",
+        f"day:{day}:type:{alert_type}:device:{device_id}",
+        f"type:{alert_type}",
+        f"device:{device_id}",
+    }
+    geohash = row.get("geohash")
+    if geohash:
+        tags.update(f"geo:{geohash[:precision]}" for precision in range(1, GEO_TAG_PRECISION + 1))
+    return tags
+
+
+def batch_tags(rows: Iterable[Mapping[str, Any]]) -> Set[str]:
+    tags: Set[str] = set()
+    for row in rows:
+        tags |= alert_tags(row)
+    return tags
+
+
+def _filter_suffix(alert_type: Optional[str], device_id: Optional[str]) -> str:
+    suffix = ""
+    if alert_type is not None:
+        suffix += f":type:{alert_type}"
+    if device_id is not None:
+        suffix += f":device:{device_id}"
+    return suffix
+
+
+def range_tags(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    alert_type: Optional[str] = None,
+    device_id: Optional[str] = None,
+) -> List[str]:
+    """
+    Tags for a query over alerts in [start, end], optionally filtered.
+
+    One tag per UTC day in the range; ranges that are unbounded or longer than
+    ``MAX_DAY_TAGS`` days fall back to a single type/device/all tag.
+    """
+    suffix = _filter_suffix(alert_type, device_id)
+    if start is not None and end is not None:
+        first, last = to_utc_naive(start).date(), to_utc_naive(end).date()
+        if first <= last and (last - first).days < REDIS_CONFIG["MAX_DAY_TAGS"]:
+            return [f"day:{_day(first + timedelta(days=offset))}{suffix}" for offset in range((last - first).days + 1)]
+
+    if device_id is not None:
+        return [f"device:{device_id}"]
+    if alert_type is not None:
+        return [f"type:{alert_type}"]
+    return [ALL_ALERTS]
+
+
+def location_tags(lat: float, lon: float, radius_km: float) -> List[str]:
+    """Tags for a radius query: the geohash cells covering the circle."""
+    cells = {cell[:GEO_TAG_PRECISION] for cell in covering_cells(lat, lon, radius_km)}
+    if "" in cells:
+        return [ALL_ALERTS]
+    return sorted(f"geo:{cell}" for cell in cells)
+
+
+def device_tags(device_id: str) -> List[str]:
+    return [f"device:{device_id}"]
@@ -1,22 +1,63 @@
 """JWT helper service for creating and verifying access tokens."""
+import copy
+import hashlib
+import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 import jwt
 
-from app.core.settings import settings
+from app.core.settings import AUTH_CONFIG, settings
+from app.services.local_cache import MISSING, LocalCache
+from app.services.redis_client import get_redis
 from uuid import uuid4
 
+LOG = logging.getLogger(__name__)
+
+
+class RevocationCheckUnavailable(RuntimeError):
+    """Raised when the revocation list cannot be consulted and JWT_REVOCATION_FAIL_OPEN is off."""
+
+
+# User fields embedded in access tokens when JWT_EMBED_USER_CLAIMS is set.
+USER_CLAIM_FIELDS = ("username", "email", "phone_number")
+
+# Payloads of recently verified tokens, keyed by the token's SHA-256.
+_verified_tokens = LocalCache(
+    max_entries=AUTH_CONFIG["TOKEN_CACHE_SIZE"],
+    max_bytes=AUTH_CONFIG["TOKEN_CACHE_SIZE"] * 4096,
+    ttl=AUTH_CONFIG["TOKEN_CACHE_TTL"],
+)
+# jti -> True while a recent Redis check found the token not revoked.
+_revocation_checks = LocalCache(
+    max_entries=AUTH_CONFIG["TOKEN_CACHE_SIZE"],
+    max_bytes=AUTH_CONFIG["TOKEN_CACHE_SIZE"] * 64,
+    ttl=AUTH_CONFIG["REVOCATION_CHECK_SECONDS"],
+)
+
 
 def _now_ts() -> int:
     return int(datetime.utcnow().timestamp())
 
 
-def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(
+    subject: str,
+    expires_delta: Optional[timedelta] = None,
+    user: Optional[Any] = None,
+) -> str:
+    """
+    Create an access token for ``subject``.
+
+    With JWT_EMBED_USER_CLAIMS, the identity fields of ``user`` are embedded
+    under ``usr`` so requests can be authorized without loading the user.
+    """
     secret = settings.jwt_secret
     algorithm = settings.jwt_algorithm
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.jwt_exp_minutes))
     jti = str(uuid4())
     payload: Dict[str, Any] = {"sub": subject, "exp": expire, "iat": datetime.utcnow(), "jti": jti}
+    if user is not None and AUTH_CONFIG["EMBED_USER_CLAIMS"]:
+        payload["usr"] = {field: getattr(user, field) for field in USER_CLAIM_FIELDS}
     token = jwt.encode(payload, secret, algorithm=algorithm)
     return token
 
@@ -29,9 +70,79 @@ def create_refresh_token(subject: str, expires_delta: Optional[timedelta] = None
     return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify ``token`` and return its claims, or None if it is invalid.
+
+    Verified payloads are kept in a bounded LRU until the token expires (or
+    JWT_CACHE_TTL passes), so repeated requests skip signature checks.
+    Callers get their own copy, so the cached claims cannot be changed.
+    """
+    key = _token_key(token)
+    payload = _verified_tokens.get(key)
+    if payload is not MISSING:
+        return copy.deepcopy(payload)
+
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        return payload
     except Exception:
         return None
+
+    exp = payload.get("exp")
+    if exp is not None:
+        _verified_tokens.put(key, copy.deepcopy(payload), len(token), ttl=exp - time.time())
+    return payload
+
+
+def _revocation_key(jti: str) -> str:
+    return f"revoked:{jti}"
+
+
+async def revoke_token(payload: Dict[str, Any]) -> None:
+    """Revoke a decoded token until it would have expired anyway."""
+    jti = payload.get("jti")
+    if not jti:
+        return
+    ttl = max(1, int(payload.get("exp", _now_ts() + 1) - time.time()))
+    redis = await get_redis()
+    await redis.set(_revocation_key(jti), "1", ex=ttl)
+    _revocation_checks.discard(jti)
+
+
+async def is_token_revoked(payload: Dict[str, Any]) -> bool:
+    """
+    Check the Redis revocation list for a decoded token.
+
+    A negative answer is trusted for JWT_REVOCATION_CHECK_SECONDS, so another
+    worker's revocation takes effect within that window.
+
+    Raises:
+        RevocationCheckUnavailable: If Redis cannot be reached, unless
+            JWT_REVOCATION_FAIL_OPEN is set, in which case the token is
+            accepted. Either way a warning is logged.
+    """
+    jti = payload.get("jti")
+    if not jti:
+        return False
+    if _revocation_checks.get(jti) is not MISSING:
+        return False
+
+    try:
+        redis = await get_redis()
+        revoked = bool(await redis.exists(_revocation_key(jti)))
+    except Exception as exc:
+        fail_open = AUTH_CONFIG["REVOCATION_FAIL_OPEN"]
+        LOG.warning(
+            "Token revocation check unavailable, %s token: %s", "accepting" if fail_open else "rejecting", exc
+        )
+        if fail_open:
+            return False
+        raise RevocationCheckUnavailable("Token revocation list unavailable") from exc
+
+    if not revoked:
+        _revocation_checks.put(jti, True, 1)
+    return revoked
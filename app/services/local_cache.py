@@ -0,0 +1,80 @@
+"""In-process LRU used as the first tier in front of Redis."""
+
+import time
+from collections import OrderedDict
+from fnmatch import fnmatch
+from typing import Any, Iterable, NamedTuple, Optional, Tuple
+
+MISSING = object()
+
+
+class _LocalEntry(NamedTuple):
+    value: Any
+    expires_at: float
+    size: int
+    tags: Tuple[str, ...]
+
+
+class LocalCache:
+    """
+    LRU bounded by entry count and approximate payload bytes.
+
+    Values are shared with callers rather than copied, so they must be
+    treated as read-only. ``size`` is the length of the value's serialized
+    form, which is what Redis returned or was sent anyway.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _LocalEntry]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str, tags: Iterable[str] = ()) -> Any:
+        """Return the cached value, or ``MISSING`` if absent, expired or cached under other tags."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        if entry.expires_at <= time.monotonic() or entry.tags != tuple(tags):
+            self.discard(key)
+            return MISSING
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: str, value: Any, size: int, *, ttl: Optional[float] = None, tags: Iterable[str] = ()) -> None:
+        """Store ``value`` for at most ``ttl`` seconds, capped by the local TTL."""
+        self.discard(key)
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        self._entries[key] = _LocalEntry(value, time.monotonic() + ttl, size, tuple(tags))
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def discard_tags(self, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        for key in [key for key, entry in self._entries.items() if tags.intersection(entry.tags)]:
+            self.discard(key)
+
+    def discard_pattern(self, pattern: str) -> None:
+        for key in [key for key in self._entries if fnmatch(key, pattern)]:
+            self.discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
@@ -1,70 +1,416 @@
 """MQTT client and message handling functionality."""
 
-import json
 import asyncio
+import select
+import socket
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional, Set
+
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from app.core.settings import MQTT_CONFIG
-from app.schemas.alerts import AlertCreate
-from concurrent.futures import ThreadPoolExecutor
-from app.services.alert_processor import process_and_save_alert
+from app.services.alert_decoding import AlertDecodeError, decode_alert_batch, decode_alerts
+from app.services.alert_processor import process_and_save_alert, process_and_save_alerts
+
+# How often paho's keepalive/retry bookkeeping runs while connected.
+MISC_INTERVAL_SECONDS = 1.0
+RECONNECT_MAX_DELAY_SECONDS = 30.0
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 10.0
+# Failures worth retrying: the database (or the way to it) is down, not the alert at fault.
+TRANSIENT_ERRORS = (
+    OperationalError,
+    InterfaceError,
+    DisconnectionError,
+    PoolTimeoutError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def batch_topic() -> str:
+    return MQTT_CONFIG["BATCH_TOPIC"] or f"{MQTT_CONFIG['ALERTS_TOPIC']}/batch"
+
+
+def is_batch_topic(topic: str) -> bool:
+    batch = batch_topic()
+    return topic == batch or topic.startswith(f"{batch}/")
+
+
+def dead_letter_topic() -> str:
+    return MQTT_CONFIG["DEAD_LETTER_TOPIC"] or f"{MQTT_CONFIG['ALERTS_TOPIC']}/dead-letter"
+
+
+def is_transient(exc: Optional[BaseException]) -> bool:
+    """Whether ``exc``, or an error it was raised from, is worth retrying."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, TRANSIENT_ERRORS):
+            return True
+        if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def subscription_topics() -> List[str]:
+    """
+    Topic filters this replica subscribes to.
+
+    Without ``TOPIC_SHARDS`` that is the alerts topic and ``BATCH_TOPIC``
+    (batched uploads, see ``AlertBatch``) themselves. With shards, devices
+    publish to ``{ALERTS_TOPIC}/{shard}/{device_id}`` and batches to
+    ``{BATCH_TOPIC}/{shard}/{device_id}`` (the shard being a device id
+    prefix), and each replica subscribes to its own shards only. With
+    ``SHARE_GROUP`` every filter becomes an MQTT v5 shared subscription,
+    so the broker hands each message to one member of the group instead
+    of to every replica.
+    """
+    shards = MQTT_CONFIG["TOPIC_SHARDS"]
+    topics = [MQTT_CONFIG["ALERTS_TOPIC"], batch_topic()]
+    if shards:
+        topics = [f"{topic}/{shard}/+" for topic in topics for shard in shards]
+    group = MQTT_CONFIG["SHARE_GROUP"]
+    return [f"$share/{group}/{topic}" for topic in topics] if group else topics
 
 
 class MQTTService:
-    """MQTT client service for handling alert messages."""
-    
+    """
+    MQTT client service for handling alert messages.
+
+    Paho's socket is driven by the application's event loop (add_reader /
+    add_writer) instead of a ``loop_forever`` thread. Received messages go
+    into a queue drained by a fixed number of consumer tasks; once the queue
+    holds ``QUEUE_SIZE`` messages the socket stops being read until the
+    consumers catch up, so the broker (and TCP) absorb the back-pressure.
+    While paused the socket is still read every half keepalive, so PINGRESPs
+    keep the connection alive through a long stall; with MQTT v5 the broker
+    is also asked (Receive Maximum) to keep no more than ``QUEUE_SIZE``
+    unacknowledged messages in flight to us.
+
+    Alerts are subscribed at ``QOS`` (1 by default) with manual acks: a
+    message is acknowledged only once its alert is committed, and with a
+    persistent session (``CLEAN_SESSION`` off) the broker keeps queuing
+    for us while the app restarts.
+    """
+
     def __init__(self):
-        self.client = mqtt.Client()
+        # Shared subscriptions are an MQTT v5 feature.
+        self.protocol = (
+            mqtt.MQTTv5 if MQTT_CONFIG["PROTOCOL"] == 5 or MQTT_CONFIG["SHARE_GROUP"] else mqtt.MQTTv311
+        )
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            # Persistent sessions are keyed by client id, so it must be stable across restarts.
+            client_id=MQTT_CONFIG["CLIENT_ID"] or f"obex-backend-{socket.gethostname()}",
+            clean_session=MQTT_CONFIG["CLEAN_SESSION"] if self.protocol == mqtt.MQTTv311 else None,
+            protocol=self.protocol,
+            manual_ack=True,
+        )
         if MQTT_CONFIG["USERNAME"] and MQTT_CONFIG["PASSWORD"]:
             self.client.username_pw_set(MQTT_CONFIG["USERNAME"], MQTT_CONFIG["PASSWORD"])
             # Check if host is HiveMQ to enable TLS
             if "hivemq.cloud" in MQTT_CONFIG["BROKER_HOST"]:
                 print("Enabling TLS for HiveMQ MQTT.")
                 self.client.tls_set()
-                
+
         self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
-        self.loop = asyncio.get_event_loop()
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self.queue_size = MQTT_CONFIG["QUEUE_SIZE"]
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.consumers: List[asyncio.Task] = []
         self.running = False
-    
-    def _on_connect(self, client, userdata, flags, rc):
+        self.paused = False
+        self._loop_thread: Optional[int] = None
+        self._sock = None
+        self._misc_task: Optional[asyncio.Task] = None
+        self._connect_task: Optional[asyncio.Task] = None
+        self._keepalive_read_at = 0.0
+        # Queue entries are tagged with the connection they arrived on; packet
+        # ids from connections before _session_start belong to a dead session.
+        self._connection = 0
+        self._session_start = 0
+        self._unacked: Set[int] = set()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
         """Callback for MQTT broker connection."""
-        if rc == 0:
+        if not reason_code.is_failure:
             print(f"Successfully connected to MQTT Broker at {MQTT_CONFIG['BROKER_HOST']}")
-            client.subscribe(MQTT_CONFIG["ALERTS_TOPIC"])
+            self._begin_connection(flags.session_present)
+            client.subscribe([(topic, MQTT_CONFIG["QOS"]) for topic in subscription_topics()])
         else:
-            print(f"Failed to connect to MQTT Broker, return code {rc}")
-    
+            print(f"Failed to connect to MQTT Broker, reason: {reason_code}")
+
+    def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        if self.running:
+            print(f"Disconnected from MQTT Broker ({reason_code}); reconnecting")
+            self._call_in_loop(self._schedule_connect)
+
+    def _begin_connection(self, session_present: bool):
+        """
+        Reconcile the queue with the broker's session after (re)connecting.
+
+        A resumed session redelivers everything we have not acknowledged, so
+        copies still queued from the previous connection are dropped in favour
+        of the redeliveries; messages already being processed keep their
+        packet ids, and their redeliveries are skipped in ``_on_message``. A
+        new session forgets the old packet ids: leftover messages are still
+        processed but never acknowledged.
+        """
+        self._connection += 1
+        if not session_present:
+            self._session_start = self._connection
+            self._unacked.clear()
+            return
+        dropped = 0
+        while not self.queue.empty():
+            _, msg = self.queue.get_nowait()
+            self._unacked.discard(msg.mid)
+            self.queue.task_done()
+            dropped += 1
+        if dropped:
+            print(f"Dropped {dropped} queued MQTT messages; the broker redelivers them")
+        if self.paused and self.running and self._below_resume_threshold():
+            self._resume_reading()
+
     def _on_message(self, client, userdata, msg):
-        """Callback for MQTT message reception."""
-        print(f"Received message on topic {msg.topic}")
-        
+        """Callback for MQTT message reception; runs on the event loop."""
+        if msg.qos > 0:
+            if msg.mid in self._unacked:
+                # Redelivery of a message still in hand; acknowledging that one covers both.
+                return
+            self._unacked.add(msg.mid)
+        self.queue.put_nowait((self._connection, msg))
+        if self.queue.qsize() >= self.queue_size:
+            self._pause_reading()
+
+    async def _consume(self):
+        while True:
+            connection, msg = await self.queue.get()
+            try:
+                if await self._process(msg) and connection >= self._session_start:
+                    self.client.ack(msg.mid, msg.qos)
+                    self._unacked.discard(msg.mid)
+            finally:
+                self.queue.task_done()
+                if self.paused and self.running and self._below_resume_threshold():
+                    self._resume_reading()
+
+    def _below_resume_threshold(self) -> bool:
+        return self.queue.qsize() <= self.queue_size // 2
+
+    async def _process(self, msg) -> bool:
+        """
+        Handle a message, retrying transient failures with capped backoff.
+
+        Returns True once the message may be acknowledged: its alert was
+        committed, or it never can be. Malformed payloads are dropped, and
+        alerts the database rejects outright (an ``IntegrityError`` or
+        ``DataError``, say) are republished to ``DEAD_LETTER_TOPIC`` rather
+        than retried, so they cannot tie up a consumer. Connection and
+        operational errors are retried for as long as the service runs,
+        since an unacknowledged message is only redelivered after a
+        reconnect and holds one of the broker's in-flight slots until then.
+        While a save keeps failing the queue fills and reading pauses, so a
+        database outage stalls ingestion and it resumes when the database
+        recovers. Returns False only when stopping; the broker then
+        redelivers the message in the next session.
+        """
+        attempt = 0
+        while True:
+            try:
+                await self._handle_message(msg)
+                return True
+            except Exception as e:
+                attempt += 1
+                if not is_transient(e):
+                    self._dead_letter(msg, e)
+                    return True
+                print(f"Error processing MQTT message (attempt {attempt}): {e}")
+                if not self.running:
+                    print(f"Leaving MQTT message {msg.mid} unacknowledged for redelivery")
+                    return False
+                await asyncio.sleep(min(RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1), RETRY_MAX_DELAY_SECONDS))
+
+    def _dead_letter(self, msg, error: Exception):
+        cause = error.__cause__ or error
+        print(f"Error: Dead-lettering MQTT message {msg.mid} on {msg.topic}: {cause!r}")
         try:
-            payload = json.loads(msg.payload.decode())
-            print(payload)
-            alert_data = AlertCreate(**payload)
-            
-            asyncio.run_coroutine_threadsafe(process_and_save_alert(alert_data, source="MQTT"), self.loop)
-            
-        except json.JSONDecodeError:
-            print("Error: Received MQTT message is not valid JSON")
+            self.client.publish(dead_letter_topic(), msg.payload, qos=1)
         except Exception as e:
-            print(f"Error processing MQTT message: {e}")
-    
-    def start(self):
-        """Initialize and start the MQTT client loop."""
-        self.running = True
+            print(f"Error: Could not publish MQTT message {msg.mid} to {dead_letter_topic()}: {e}")
+
+    async def _handle_message(self, msg):
+        properties = getattr(msg, "properties", None)
+        decode = decode_alert_batch if is_batch_topic(msg.topic) else decode_alerts
         try:
-            print("Initializing MQTT connection...")
-            self.client.connect(MQTT_CONFIG["BROKER_HOST"], MQTT_CONFIG["BROKER_PORT"], 60)
-            self.client.loop_forever()
-        except Exception as e:
-            print(f"Critical MQTT connection failure: {e}")
-    
-    def stop(self):
-        """Disconnect the MQTT client."""
+            alerts = decode(msg.payload, getattr(properties, "ContentType", None))
+        except AlertDecodeError as e:
+            # Redelivery cannot fix a malformed alert, so it is dropped (and acknowledged).
+            print(f"Error: Dropping MQTT message on {msg.topic}: {e}")
+            return
+
+        if len(alerts) == 1:
+            await process_and_save_alert(alerts[0], source="MQTT")
+        else:
+            # One transaction, so a retried message never stores part of it twice.
+            await process_and_save_alerts(alerts, source="MQTT")
+
+    # Socket callbacks. Paho may call these from the connect executor thread,
+    # so anything touching the event loop is marshalled onto it.
+
+    def _call_in_loop(self, callback, *args):
+        if threading.get_ident() == self._loop_thread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self._watch_socket, sock)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._unwatch_socket, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.add_writer, sock, self._on_writable)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.remove_writer, sock)
+
+    def _watch_socket(self, sock):
+        self._sock = sock
+        if self.queue is None or self._below_resume_threshold():
+            self.paused = False
+            self.loop.add_reader(sock, self._on_readable)
+        else:
+            # Still backed up from the last connection; the CONNACK is picked
+            # up by the next keepalive read.
+            self.paused = True
+            self._keepalive_read_at = 0.0
+
+    def _unwatch_socket(self, sock):
+        if self._sock is sock:
+            self._sock = None
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def _on_readable(self):
+        self.client.loop_read()
+
+    def _on_writable(self):
+        self.client.loop_write()
+
+    def _pause_reading(self):
+        if not self.paused and self._sock is not None:
+            self.paused = True
+            self._keepalive_read_at = time.monotonic() + MQTT_CONFIG["KEEPALIVE"] / 2
+            self.loop.remove_reader(self._sock)
+
+    def _resume_reading(self):
+        self.paused = False
+        if self._sock is not None:
+            self.loop.add_reader(self._sock, self._on_readable)
+
+    def _keepalive_read(self):
+        """
+        Read what is waiting on a paused socket.
+
+        paho only counts reads as broker activity, so without this a stall
+        longer than the keepalive ends in a PINGREQ nobody reads the answer
+        to and a keepalive timeout. Nothing is acknowledged while paused, so
+        the broker's in-flight window bounds what these reads can queue.
+        """
+        self._keepalive_read_at = time.monotonic() + MQTT_CONFIG["KEEPALIVE"] / 2
+        for _ in range(self.queue_size):
+            if self._sock is None or not self.paused or not select.select([self._sock], [], [], 0)[0]:
+                return
+            self.client.loop_read()
+
+    async def _misc_loop(self):
+        while True:
+            await asyncio.sleep(MISC_INTERVAL_SECONDS)
+            if self.paused and time.monotonic() >= self._keepalive_read_at:
+                self._keepalive_read()
+            self.client.loop_misc()
+
+    def _connect_options(self) -> Dict[str, Any]:
+        if self.protocol != mqtt.MQTTv5:
+            return {}
+        properties = Properties(PacketTypes.CONNECT)
+        # Unacknowledged messages the broker may have in flight to us, i.e. queued or being saved.
+        properties.ReceiveMaximum = min(self.queue_size, 65535)
+        if not MQTT_CONFIG["CLEAN_SESSION"]:
+            # v5 sessions end with the connection unless given an expiry.
+            properties.SessionExpiryInterval = MQTT_CONFIG["SESSION_EXPIRY_SECONDS"]
+        return {"clean_start": MQTT_CONFIG["CLEAN_SESSION"], "properties": properties}
+
+    def _schedule_connect(self):
+        if self.running and (self._connect_task is None or self._connect_task.done()):
+            self._connect_task = asyncio.create_task(self._connect())
+
+    async def _connect(self):
+        delay = 1.0
+        while self.running:
+            try:
+                # DNS, TCP and TLS setup block, so they run off the event loop.
+                await self.loop.run_in_executor(None, partial(
+                    self.client.connect,
+                    MQTT_CONFIG["BROKER_HOST"],
+                    MQTT_CONFIG["BROKER_PORT"],
+                    MQTT_CONFIG["KEEPALIVE"],
+                    **self._connect_options(),
+                ))
+                return
+            except Exception as e:
+                print(f"Critical MQTT connection failure: {e}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+
+    async def start(self):
+        """Connect to the broker on the running event loop and start the consumers."""
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.queue = asyncio.Queue()
         self.running = True
+        print("Initializing MQTT connection...")
+        self.consumers = [asyncio.create_task(self._consume()) for _ in range(MQTT_CONFIG["CONSUMERS"])]
+        self._misc_task = asyncio.create_task(self._misc_loop())
+        self._schedule_connect()
+
+    async def stop(self, timeout: float = 5.0):
+        """Disconnect the MQTT client, giving queued messages ``timeout`` seconds to finish."""
+        if not self.running:
+            return
+        self.running = False
+        # Finish what was received while still connected, so those acks reach the broker.
+        self._pause_reading()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Leaving {self.queue.qsize()} unprocessed MQTT messages for redelivery")
         print("Disconnecting from MQTT broker...")
         self.client.disconnect()
 
-mqtt_service = MQTTService()
\ No newline at end of file
+        tasks = [*self.consumers, self._misc_task, self._connect_task]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in tasks if task is not None), return_exceptions=True)
+        self.consumers = []
+        if self._sock is not None:
+            self._unwatch_socket(self._sock)
+
+mqtt_service = MQTTService()
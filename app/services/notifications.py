@@ -0,0 +1,265 @@
+"""Background delivery of alert notifications (SMS and email)."""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.settings import NOTIFICATION_CONFIG
+from app.schemas.alerts import Alert as AlertSchema
+from app.services import auth_service
+from app.utils.email import SMTPConnectionPool
+from app.utils.termii import send_sms
+
+LOG = logging.getLogger(__name__)
+
+ALERT_EMAIL_SUBJECT = "New Obex Security Alert Received"
+DIGEST_EMAIL_SUBJECT = "Obex Security Alert Digest"
+
+
+@dataclass
+class AlertNotification:
+    """A notification waiting to be delivered to the owner of an alert."""
+
+    user_id: Optional[uuid.UUID]
+    device_id: str
+    alert_type: str
+    subject: str
+    body: str
+    timestamp: Optional[datetime] = None
+
+    @classmethod
+    def from_alert(cls, alert: AlertSchema) -> "AlertNotification":
+        body = (
+            f"Alert Type: {alert.alert_type}\n"
+            f"User ID: {alert.user_id}\n"
+            f"Device ID: {alert.device_id}\n"
+            f"Timestamp: {alert.timestamp}\n"
+            f"Location: ({alert.location_lat}, {alert.location_lon})\n"
+            f"Payload: {alert.payload}\n"
+        )
+        return cls(
+            user_id=alert.user_id,
+            device_id=alert.device_id,
+            alert_type=alert.alert_type,
+            subject=ALERT_EMAIL_SUBJECT,
+            body=body,
+            timestamp=alert.timestamp,
+        )
+
+
+CoalesceKey = Tuple[Optional[uuid.UUID], str, str]
+
+
+@dataclass
+class _CoalesceWindow:
+    """What a window held back: a count, the time span and the latest notification."""
+
+    handle: asyncio.TimerHandle
+    suppressed: int = 0
+    first: Optional[datetime] = None
+    last: Optional[datetime] = None
+    latest: Optional[AlertNotification] = None
+
+    def hold(self, notification: AlertNotification) -> None:
+        self.suppressed += 1
+        self.latest = notification
+        timestamp = notification.timestamp
+        if timestamp is not None:
+            self.first = timestamp if self.first is None else min(self.first, timestamp)
+            self.last = timestamp if self.last is None else max(self.last, timestamp)
+
+
+class NotificationCoalescer:
+    """
+    Folds bursts of identical alerts into digests.
+
+    Notifications are keyed by (user_id, device_id, alert_type). The first one
+    for a key is emitted straight away and opens a window; anything arriving
+    for the same key before the window closes is held back and emitted as a
+    single digest when it does. A window that produced a digest is reopened,
+    so a device that keeps firing yields at most one message per window.
+    """
+
+    def __init__(self, window_seconds: float, emit: Callable[[AlertNotification], None]) -> None:
+        self.window_seconds = window_seconds
+        self._emit = emit
+        self._windows: Dict[CoalesceKey, _CoalesceWindow] = {}
+
+    def offer(self, notification: AlertNotification) -> None:
+        if self.window_seconds <= 0:
+            self._emit(notification)
+            return
+
+        key = (notification.user_id, notification.device_id, notification.alert_type)
+        window = self._windows.get(key)
+        if window is not None:
+            window.hold(notification)
+            return
+
+        self._emit(notification)
+        self._open(key)
+
+    def _open(self, key: CoalesceKey) -> None:
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(self.window_seconds, self._close, key)
+        self._windows[key] = _CoalesceWindow(handle=handle)
+
+    def _close(self, key: CoalesceKey) -> None:
+        window = self._windows.pop(key, None)
+        if window is None or not window.suppressed:
+            return
+        self._emit(build_digest(window))
+        self._open(key)
+
+    def flush(self) -> None:
+        """Emit every pending digest now and forget all open windows."""
+        windows, self._windows = self._windows, {}
+        for window in windows.values():
+            window.handle.cancel()
+            if window.suppressed:
+                self._emit(build_digest(window))
+
+
+def build_digest(window: _CoalesceWindow) -> AlertNotification:
+    """Summarise the notifications a window held back in one message."""
+    latest = window.latest
+    body = (
+        f"{window.suppressed} more {latest.alert_type} alert(s) from device {latest.device_id}\n"
+        f"First: {window.first or 'unknown'}\n"
+        f"Last: {window.last or 'unknown'}\n"
+        f"\nMost recent alert:\n{latest.body}"
+    )
+    return AlertNotification(
+        user_id=latest.user_id,
+        device_id=latest.device_id,
+        alert_type=latest.alert_type,
+        subject=DIGEST_EMAIL_SUBJECT,
+        body=body,
+        timestamp=latest.timestamp,
+    )
+
+
+class NotificationDispatcher:
+    """
+    Bounded queue of notifications drained by a fixed pool of async workers.
+
+    ``enqueue`` never waits: when the queue is full the notification is dropped
+    and counted, so a slow SMS or SMTP provider can never hold up alert
+    persistence or WebSocket delivery. Workers share one pooled HTTP client and
+    one pool of logged-in SMTP connections. Bursts are folded into digests by a
+    ``NotificationCoalescer`` before they reach the queue.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        coalesce_window: Optional[float] = None,
+    ) -> None:
+        self.queue_size = queue_size or NOTIFICATION_CONFIG["QUEUE_SIZE"]
+        self.worker_count = max(1, workers or NOTIFICATION_CONFIG["WORKERS"])
+        self.timeout = timeout or NOTIFICATION_CONFIG["TIMEOUT_SECONDS"]
+        self.coalesce_window = (
+            NOTIFICATION_CONFIG["COALESCE_WINDOW_SECONDS"] if coalesce_window is None else coalesce_window
+        )
+        self.dropped = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._http: Optional[httpx.AsyncClient] = None
+        self._smtp: Optional[SMTPConnectionPool] = None
+        self._coalescer: Optional[NotificationCoalescer] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Spawn the worker tasks on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._http = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.worker_count),
+        )
+        self._smtp = SMTPConnectionPool(self.worker_count, timeout=self.timeout)
+        self._coalescer = NotificationCoalescer(self.coalesce_window, self._put)
+        self._workers = [
+            loop.create_task(self._worker(), name=f"notification-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    def enqueue(self, notification: AlertNotification) -> None:
+        """Queue a notification for delivery, coalescing bursts into digests."""
+        self.start()
+        self._coalescer.offer(notification)
+
+    def _put(self, notification: AlertNotification) -> bool:
+        try:
+            self._queue.put_nowait(notification)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            LOG.warning(
+                "Notification queue full (%d); dropped %s alert for user %s",
+                self.queue_size, notification.alert_type, notification.user_id,
+            )
+            return False
+
+    async def _worker(self) -> None:
+        while True:
+            notification = await self._queue.get()
+            try:
+                await self.deliver(notification)
+            except Exception as exc:
+                LOG.warning("Notification delivery failed: %s", exc)
+            finally:
+                self._queue.task_done()
+
+    async def deliver(self, notification: AlertNotification) -> None:
+        """Send one notification over SMS and email concurrently."""
+        if notification.user_id is None:
+            return
+        user = await auth_service.get_user_by_id(notification.user_id)
+        if user is None:
+            return
+
+        sends = []
+        if user.phone_number:
+            sends.append(send_sms(user.phone_number, notification.body, client=self._http))
+        if user.email:
+            sends.append(self._smtp.send(user.email, notification.subject, notification.body))
+        if sends:
+            await asyncio.gather(*sends)
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Give queued notifications a moment to go out, then shut the pool down."""
+        if self._loop is not asyncio.get_running_loop() or not self._workers:
+            return
+        self._coalescer.flush()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            LOG.warning("Dropping %d undelivered notifications on shutdown", self._queue.qsize())
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        await self._http.aclose()
+        await self._smtp.close()
+
+
+notification_dispatcher = NotificationDispatcher()
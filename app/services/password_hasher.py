@@ -0,0 +1,81 @@
+"""Argon2 password hashing off the event loop."""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.hash import argon2
+
+from app.core.settings import AUTH_CONFIG
+
+LOG = logging.getLogger(__name__)
+
+
+class HasherBusyError(RuntimeError):
+    """Raised when too many hash/verify calls are already waiting."""
+
+
+class PasswordHasher:
+    """
+    Runs argon2 hash/verify calls on a small dedicated thread pool.
+
+    argon2-cffi releases the GIL while hashing, so threads give real
+    parallelism without blocking the event loop. Calls beyond
+    ``max_pending`` (running plus queued) are rejected immediately with
+    ``HasherBusyError`` instead of piling up behind a login burst.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        time_cost: Optional[int] = None,
+        memory_cost: Optional[int] = None,
+        parallelism: Optional[int] = None,
+    ) -> None:
+        self.workers = max(1, workers or AUTH_CONFIG["PASSWORD_HASH_WORKERS"])
+        self.max_pending = max(1, max_pending or AUTH_CONFIG["PASSWORD_HASH_MAX_PENDING"])
+        # Only new hashes use these; verify reads the parameters from the hash.
+        self._argon2 = argon2.using(
+            time_cost=time_cost or AUTH_CONFIG["ARGON2_TIME_COST"],
+            memory_cost=memory_cost or AUTH_CONFIG["ARGON2_MEMORY_COST"],
+            parallelism=parallelism or AUTH_CONFIG["ARGON2_PARALLELISM"],
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a worker thread (excluding those running)."""
+        return max(0, self.pending - self.workers)
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            LOG.warning("Password hasher saturated (%d pending); rejecting request", self.pending)
+            raise HasherBusyError("Too many authentication requests in progress")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._argon2.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(self._argon2.verify, password, password_hash)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
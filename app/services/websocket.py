@@ -1,44 +1,326 @@
-from typing import Dict
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
+
 from fastapi import WebSocket
+from pydantic import BaseModel
+
+from app.core.settings import WEBSOCKET_CONFIG
+from app.services.websocket_bus import WebSocketBus
+from app.services.websocket_replay import ReplayBuffer, create_replay_buffer
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+# Close code sent to clients that cannot keep up ("try again later").
+SLOW_CLIENT_CLOSE_CODE = 1013
+# Close code sent when the session could not be set up.
+SERVER_ERROR_CLOSE_CODE = 1011
+
+# Clients that offer this subprotocol get every message as a msgpack binary frame.
+MSGPACK_SUBPROTOCOL = "obex.msgpack.v1"
+
+
+class BroadcastMessage:
+    """
+    A message serialized at most once per format, however many sockets
+    receive it. The JSON text is built eagerly (every text client and the
+    cross-worker bus need it); the msgpack frame only once a binary client
+    asks for it.
+    """
+    __slots__ = ("text", "seq", "_data", "_binary")
+
+    def __init__(self, text: str, data: Optional[Dict[str, Any]] = None, seq: Optional[int] = None):
+        self.text = text
+        # Position in the user's replay buffer; None for messages that are not replayed.
+        self.seq = seq
+        self._data = data
+        self._binary: Optional[bytes] = None
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any]) -> "BroadcastMessage":
+        return cls(json.dumps(data), data)
+
+    @classmethod
+    def for_alert(cls, alert: BaseModel) -> "BroadcastMessage":
+        """Wrap an alert schema as a ``new_alert`` event, encoded straight from the model."""
+        return cls('{"type":"new_alert","alert":' + alert.model_dump_json() + "}")
+
+    def sequenced(self, seq: int) -> "BroadcastMessage":
+        """A copy of this message with ``"seq"`` added as its first field."""
+        return BroadcastMessage(f'{{"seq":{seq},' + self.text[1:], seq=seq)
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = json.loads(self.text)
+        return self._data
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb(self.data, use_bin_type=True)
+        return self._binary
+
+
+OutboundMessage = Union[BroadcastMessage, str]
+
+
+def _as_broadcast(message: OutboundMessage, seq: Optional[int] = None) -> BroadcastMessage:
+    return message if isinstance(message, BroadcastMessage) else BroadcastMessage(message, seq=seq)
+
+
+class ClientConnection:
+    """
+    One WebSocket session with its own bounded outbound queue.
+
+    Messages are queued without awaiting the socket and written by a
+    dedicated writer task, so a slow client only ever delays itself. When
+    the queue is full the slow-client policy either drops the oldest
+    queued message or disconnects the client.
+    """
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        on_close: Callable[["ClientConnection"], None],
+        *,
+        binary: bool = False,
+        queue_size: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        policy: Optional[str] = None,
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.binary = binary
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or WEBSOCKET_CONFIG["SEND_QUEUE_SIZE"])
+        self.send_timeout = send_timeout or WEBSOCKET_CONFIG["SEND_TIMEOUT_SECONDS"]
+        self.policy = policy or WEBSOCKET_CONFIG["SLOW_CLIENT_POLICY"]
+        self.dropped = 0
+        self.closed = False
+        # The user's latest sequence number when this session connected.
+        self.seq: Optional[int] = None
+        # Live messages held back while a replay is being fetched.
+        self._held: Optional[List[BroadcastMessage]] = None
+        self._on_close = on_close
+        self._writer = asyncio.create_task(self._write())
+
+    def offer(self, message: BroadcastMessage) -> bool:
+        """Queue a message for this client. Returns False if it was not queued."""
+        if self.closed:
+            return False
+        if self._held is not None:
+            self._held.append(message)
+            return True
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.dropped += 1
+            return True
+
+        print(f"WebSocket client for user {self.user_id} is too slow; disconnecting")
+        self.close(SLOW_CLIENT_CLOSE_CODE)
+        return False
+
+    def hold(self):
+        """Hold live messages back until ``resume`` has queued the replayed ones."""
+        self._held = []
+
+    def resume(self, replayed: Iterable[BroadcastMessage]):
+        """Queue replayed messages, then the live ones held since ``hold``, without duplicates."""
+        held, self._held = self._held or [], None
+        last_seq = None
+        for message in replayed:
+            self.offer(message)
+            last_seq = message.seq if message.seq is not None else last_seq
+        for message in held:
+            if message.seq is None or last_seq is None or message.seq > last_seq:
+                self.offer(message)
+
+    async def _write(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if self.binary:
+                    send = self.websocket.send_bytes(message.binary)
+                else:
+                    send = self.websocket.send_text(message.text)
+                await asyncio.wait_for(send, self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending to {self.user_id}: {e}")
+            self.close(SLOW_CLIENT_CLOSE_CODE if isinstance(e, asyncio.TimeoutError) else None)
+
+    def close(self, code: Optional[int] = None):
+        """Stop writing to the client and forget the connection; safe to call twice."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code is not None:
+            asyncio.ensure_future(self._close_socket(code))
+        self._on_close(self)
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
 
 class ConnectionManager:
     """Manages active WebSocket connections for broadcasting."""
     def __init__(self):
-        # Store connections keyed by user_id
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Add a new WebSocket connection for a specific user."""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"WebSocket connected for user {user_id}. Total: {len(self.active_connections)}")
-
-    def disconnect(self, user_id: str):
-        """Remove a WebSocket connection for a user."""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        print(f"WebSocket disconnected for user {user_id}. Total: {len(self.active_connections)}")
-
-    async def send_to_user(self, message: str, user_id: str):
-        """Send a message only to the specified user."""
-        websocket = self.active_connections.get(user_id)
-        if websocket:
+        # Every open session, grouped by user_id (one per browser tab/device)
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+        # Set by start_bus() when WEBSOCKET_BUS_ENABLED; None means local-only delivery
+        self.bus: Optional[WebSocketBus] = None
+        # Recent replayable events per user; None when WEBSOCKET_REPLAY_SIZE is 0
+        self.replay: Optional[ReplayBuffer] = create_replay_buffer()
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    async def start_bus(self):
+        """Join the cross-worker message bus, if enabled."""
+        if not WEBSOCKET_CONFIG["BUS_ENABLED"] or self.bus is not None:
+            return
+        bus = WebSocketBus(self.send_local)
+        await bus.start()
+        for user_id in self.active_connections:
+            await bus.user_connected(user_id)
+        self.bus = bus
+
+    async def stop_bus(self):
+        if self.bus is not None:
+            await self.bus.stop()
+            self.bus = None
+
+    async def connect(self, websocket: WebSocket, user_id: str, last_seq: Optional[int] = None) -> ClientConnection:
+        """
+        Accept a WebSocket session for a user, alongside any they already have.
+
+        Clients that request the ``obex.msgpack.v1`` subprotocol (and servers
+        with msgpack installed) exchange binary msgpack frames instead of JSON.
+
+        A client reconnecting with ``last_seq`` is first sent the replayable
+        events it missed, or a ``resync`` message if they are no longer
+        buffered and it should refetch alerts over REST.
+        """
+        binary = msgpack is not None and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if binary else None)
+        connection = ClientConnection(websocket, user_id, self._forget, binary=binary)
+        if self.replay is not None:
+            # Registered before the replay is read so no event falls in between.
+            connection.hold()
+        connections = self.active_connections.setdefault(user_id, set())
+        connections.add(connection)
+        try:
+            if self.bus is not None and len(connections) == 1:
+                await self.bus.user_connected(user_id)
+            if self.replay is not None:
+                await self._replay_missed(connection, last_seq)
+        except BaseException:
+            # Unregisters the session and releases its bus shard.
+            connection.close(SERVER_ERROR_CLOSE_CODE)
+            raise
+        print(f"WebSocket connected for user {user_id}. Total: {self.connection_count}")
+        return connection
+
+    async def _replay_missed(self, connection: ClientConnection, last_seq: Optional[int]):
+        try:
+            replay = await self.replay.since(connection.user_id, last_seq)
+        except Exception as e:
+            print(f"WebSocket replay unavailable for user {connection.user_id}: {e}")
+            connection.resume([BroadcastMessage.from_data({"type": "resync"})] if last_seq is not None else [])
+            return
+        connection.seq = replay.head
+        messages = replay.messages
+        if not replay.complete:
+            messages = [BroadcastMessage.from_data({"type": "resync", "seq": replay.head}), *messages]
+        connection.resume(messages)
+
+    def disconnect(self, connection: ClientConnection):
+        """Close and remove one WebSocket session."""
+        connection.close()
+        print(f"WebSocket disconnected for user {connection.user_id}. Total: {self.connection_count}")
+
+    def _forget(self, connection: ClientConnection):
+        connections = self.active_connections.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.active_connections[connection.user_id]
+            if self.bus is not None:
+                self.bus.user_disconnected(connection.user_id)
+
+    async def send_to_user(self, message: OutboundMessage, user_id, *, replay: bool = False):
+        """
+        Send a message to every session of the specified user.
+
+        Pass a BroadcastMessage to reuse its encoding across recipients; plain
+        JSON strings are wrapped in one. With ``replay`` the message is given
+        the user's next sequence number and kept for clients that reconnect.
+
+        With the bus enabled the message is published once and delivered by
+        whichever workers hold the user's connections, including this one.
+        Never waits on socket I/O.
+        """
+        if user_id is None:
+            return
+        user_id = str(user_id)
+        message = _as_broadcast(message)
+        if replay and self.replay is not None:
             try:
-                await websocket.send_text(message)
+                message = await self.replay.append(user_id, message)
             except Exception as e:
-                print(f"Error sending to {user_id}: {e}")
-                self.disconnect(user_id)
+                print(f"WebSocket replay buffer unavailable: {e}")
+        if self.bus is not None:
+            try:
+                await self.bus.publish(user_id, message.text, seq=message.seq)
+                return
+            except Exception as e:
+                print(f"WebSocket bus unavailable, delivering locally: {e}")
+        await self.send_local(message, user_id)
+
+    async def send_local(self, message: OutboundMessage, user_id: str, seq: Optional[int] = None):
+        """
+        Queue a message for the user's sessions on this worker, if any.
 
-    async def send_connection_message(self, websocket: WebSocket):
+        ``seq`` is the replay sequence number of a JSON string received from
+        the bus; BroadcastMessages carry their own.
+        """
+        message = _as_broadcast(message, seq)
+        for connection in list(self.active_connections.get(user_id, ())):
+            connection.offer(message)
+
+    def send_connection_message(self, connection: ClientConnection):
         """Send initial connection confirmation message."""
-        await websocket.send_text(json.dumps({
+        data = {
             "type": "system",
             "message": "Connected to OBEX Alert System"
-        }))
+        }
+        if connection.seq is not None:
+            # Where to resume from with ?last_seq= if this connection drops.
+            data["seq"] = connection.seq
+        connection.offer(BroadcastMessage.from_data(data))
 
-    async def send_pong(self, websocket: WebSocket):
+    def send_pong(self, connection: ClientConnection):
         """Send pong response to keep-alive message."""
-        await websocket.send_text(json.dumps({
+        connection.offer(BroadcastMessage.from_data({
             "type": "pong",
             "message": "Connection active",
             "timestamp": datetime.utcnow().isoformat()
@@ -0,0 +1,152 @@
+"""Cross-process WebSocket fan-out over Redis pub/sub."""
+
+import asyncio
+import json
+import logging
+import zlib
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from redis import asyncio as redis_asyncio
+
+from app.core.settings import REDIS_CONFIG, WEBSOCKET_CONFIG
+
+LOG = logging.getLogger(__name__)
+
+# deliver(message, user_id, seq=...) hands a received message to the local sockets.
+Deliver = Callable[..., Awaitable[None]]
+
+
+class WebSocketBus:
+    """
+    Routes per-user WebSocket messages between workers.
+
+    Users are spread over ``shards`` channels by a stable hash of their id.
+    Every worker publishes to the recipient's shard and subscribes only to
+    the shards of users connected to it, so each message reaches just the
+    workers that might hold one of that user's sockets.
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        *,
+        shards: Optional[int] = None,
+        prefix: Optional[str] = None,
+        redis_client: Optional[redis_asyncio.Redis] = None,
+    ) -> None:
+        self._deliver = deliver
+        self.shards = max(1, shards or WEBSOCKET_CONFIG["BUS_SHARDS"])
+        self._prefix = f"{prefix or REDIS_CONFIG['PREFIX']}:ws"
+        self._redis = redis_client
+        self._pubsub = None
+        self._listener: Optional["asyncio.Task[None]"] = None
+        self._ready = asyncio.Event()
+        # shard -> number of local connections whose users hash to it
+        self._local_shards: Dict[int, int] = {}
+        # Shards the current pubsub connection is subscribed to; changed only under the lock
+        self._subscribed: Set[int] = set()
+        self._subscription_lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def shard_for(self, user_id: str) -> int:
+        # crc32 rather than hash(): it must agree across processes.
+        return zlib.crc32(user_id.encode()) % self.shards
+
+    def channel(self, shard: int) -> str:
+        return f"{self._prefix}:{shard}"
+
+    async def start(self) -> None:
+        if self._redis is None:
+            password = REDIS_CONFIG.get("PASSWORD")
+            auth = f":{password}@" if password else ""
+            self._redis = redis_asyncio.from_url(
+                f"redis://{auth}{REDIS_CONFIG['HOST']}:{REDIS_CONFIG['PORT']}/{REDIS_CONFIG['DB']}",
+                decode_responses=True,
+            )
+        self._listener = asyncio.create_task(self._listen())
+        await self._ready.wait()
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def publish(self, user_id: str, message: str, seq: Optional[int] = None) -> None:
+        """
+        Send ``message`` to every worker subscribed to ``user_id``'s shard.
+
+        ``seq`` is the message's replay sequence number, carried alongside it
+        so receivers can drop copies a reconnecting client is also replayed.
+        """
+        envelope = {"user_id": user_id, "message": message}
+        if seq is not None:
+            envelope["seq"] = seq
+        payload = json.dumps(envelope)
+        await self._redis.publish(self.channel(self.shard_for(user_id)), payload)
+
+    async def user_connected(self, user_id: str) -> None:
+        shard = self.shard_for(user_id)
+        self._local_shards[shard] = self._local_shards.get(shard, 0) + 1
+        await self._sync_subscription(shard)
+
+    def user_disconnected(self, user_id: str) -> None:
+        shard = self.shard_for(user_id)
+        remaining = self._local_shards.get(shard, 0) - 1
+        if remaining > 0:
+            self._local_shards[shard] = remaining
+            return
+        self._local_shards.pop(shard, None)
+        task = asyncio.ensure_future(self._sync_subscription(shard))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _sync_subscription(self, shard: int) -> None:
+        # Subscribes and unsubscribes run one at a time and act on the shard's
+        # state when they run, so a user reconnecting before a pending
+        # unsubscribe has gone out keeps the shard subscribed.
+        async with self._subscription_lock:
+            pubsub = self._pubsub
+            if pubsub is None:
+                return
+            wanted = shard in self._local_shards
+            if wanted and shard not in self._subscribed:
+                await pubsub.subscribe(self.channel(shard))
+                self._subscribed.add(shard)
+            elif not wanted and shard in self._subscribed:
+                await pubsub.unsubscribe(self.channel(shard))
+                self._subscribed.discard(shard)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # The control channel keeps the connection subscribed even
+                # while no users are connected to this worker.
+                async with self._subscription_lock:
+                    shards = set(self._local_shards)
+                    await pubsub.subscribe(f"{self._prefix}:control", *(self.channel(shard) for shard in shards))
+                    self._subscribed = shards
+                    self._pubsub = pubsub
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    try:
+                        await self._deliver(data["message"], data["user_id"], seq=data.get("seq"))
+                    except Exception as exc:
+                        LOG.warning("WebSocket bus delivery to %s failed: %s", data.get("user_id"), exc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                LOG.warning("WebSocket bus subscription failed (%s); resubscribing", exc)
+                self._ready.set()
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                self._subscribed = set()
+                await pubsub.aclose()
@@ -0,0 +1,148 @@
+"""Per-user replay buffers that let WebSocket clients resume after a reconnect.
+
+Every replayable event sent to a user is numbered with that user's next
+sequence number and kept in a bounded buffer. A client that reconnects with
+``last_seq`` is sent only the events it missed, or told to resync over REST
+when the buffer no longer reaches back that far.
+"""
+
+import logging
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Deque, List, NamedTuple, Optional, Tuple, Union
+
+from app.core.settings import REDIS_CONFIG, WEBSOCKET_CONFIG
+from app.services.redis_client import get_redis
+
+if TYPE_CHECKING:
+    from app.services.websocket import BroadcastMessage
+
+LOG = logging.getLogger(__name__)
+
+
+class Replay(NamedTuple):
+    """The events after a client's ``last_seq`` and the user's latest sequence number."""
+    messages: List["BroadcastMessage"]
+    head: int
+    complete: bool
+
+
+def _replay(messages: List["BroadcastMessage"], head: int, last_seq: Optional[int]) -> Replay:
+    if last_seq is None:
+        return Replay([], head, True)
+    # Complete only if nothing was missed or the buffer still holds the event right after last_seq.
+    complete = last_seq == head or bool(messages and messages[0].seq == last_seq + 1)
+    return Replay(messages, head, complete)
+
+
+class _UserLog:
+    __slots__ = ("seq", "messages")
+
+    def __init__(self, size: int) -> None:
+        self.seq = 0
+        self.messages: Deque["BroadcastMessage"] = deque(maxlen=size)
+
+
+class LocalReplayBuffer:
+    """
+    In-process buffers, for single-worker deployments.
+
+    Holds the last ``size`` events for at most ``max_users`` users, evicting
+    the least recently active. Sequence numbers restart with the process;
+    clients resuming from an older run are told to resync.
+    """
+
+    def __init__(self, size: int, max_users: int) -> None:
+        self.size = size
+        self.max_users = max_users
+        self._logs: "OrderedDict[str, _UserLog]" = OrderedDict()
+
+    async def append(self, user_id: str, message: "BroadcastMessage") -> "BroadcastMessage":
+        log = self._logs.get(user_id)
+        if log is None:
+            log = self._logs[user_id] = _UserLog(self.size)
+            while len(self._logs) > self.max_users:
+                self._logs.popitem(last=False)
+        self._logs.move_to_end(user_id)
+        log.seq += 1
+        message = message.sequenced(log.seq)
+        log.messages.append(message)
+        return message
+
+    async def since(self, user_id: str, last_seq: Optional[int]) -> Replay:
+        log = self._logs.get(user_id)
+        if log is None:
+            return _replay([], 0, last_seq)
+        if last_seq is None:
+            return Replay([], log.seq, True)
+        return _replay([message for message in log.messages if message.seq > last_seq], log.seq, last_seq)
+
+
+# INCR and XADD in one script so stream ids are added in sequence order even
+# when several workers append for the same user at once.
+_APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'm', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+
+class RedisReplayBuffer:
+    """
+    Buffers kept in one Redis stream per user, shared by every worker.
+
+    The stream id of each entry is ``{seq}-0``, so a resume is a single
+    XRANGE from ``last_seq + 1``. Both keys expire ``ttl`` seconds after the
+    user's last event.
+    """
+
+    def __init__(self, size: int, ttl: int, prefix: Optional[str] = None) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._prefix = f"{prefix or REDIS_CONFIG['PREFIX']}:ws"
+
+    def _keys(self, user_id: str) -> Tuple[str, str]:
+        return f"{self._prefix}:seq:{user_id}", f"{self._prefix}:replay:{user_id}"
+
+    async def append(self, user_id: str, message: "BroadcastMessage") -> "BroadcastMessage":
+        redis = await get_redis()
+        seq = await redis.eval(_APPEND_SCRIPT, 2, *self._keys(user_id), message.text, self.size, self.ttl)
+        return message.sequenced(int(seq))
+
+    async def since(self, user_id: str, last_seq: Optional[int]) -> Replay:
+        from app.services.websocket import BroadcastMessage
+
+        seq_key, stream_key = self._keys(user_id)
+        redis = await get_redis()
+        if last_seq is None:
+            return Replay([], int(await redis.get(seq_key) or 0), True)
+
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get(seq_key)
+            pipe.xrange(stream_key, min=f"{last_seq + 1}-0", max="+")
+            head, entries = await pipe.execute()
+        messages = [
+            BroadcastMessage(fields["m"]).sequenced(int(entry_id.split("-", 1)[0]))
+            for entry_id, fields in entries
+        ]
+        return _replay(messages, int(head or 0), last_seq)
+
+
+ReplayBuffer = Union[LocalReplayBuffer, RedisReplayBuffer]
+
+
+def create_replay_buffer() -> Optional[ReplayBuffer]:
+    """Build the configured replay buffer, or None when replay is disabled."""
+    size = WEBSOCKET_CONFIG["REPLAY_SIZE"]
+    if size <= 0:
+        return None
+    backend = WEBSOCKET_CONFIG["REPLAY_BACKEND"]
+    if backend == "auto":
+        # Reconnects may land on another worker once the bus is in use.
+        backend = "redis" if WEBSOCKET_CONFIG["BUS_ENABLED"] else "memory"
+    if backend == "redis":
+        return RedisReplayBuffer(size, WEBSOCKET_CONFIG["REPLAY_TTL_SECONDS"])
+    if backend != "memory":
+        LOG.warning("Unknown WebSocket replay backend %r; keeping replay in memory", backend)
+    return LocalReplayBuffer(size, WEBSOCKET_CONFIG["REPLAY_MAX_USERS"])
@@ -0,0 +1,27 @@
+"""Opaque keyset-pagination cursors."""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Tuple
+
+
+def encode_cursor(timestamp: datetime, row_id: Any) -> str:
+    """Encode the (timestamp, id) of the last row on a page as an opaque token."""
+    raw = json.dumps([timestamp.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decode a token produced by ``encode_cursor``.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid pagination cursor") from exc
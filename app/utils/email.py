@@ -1,28 +1,121 @@
+import asyncio
 import smtplib, ssl
 from email.message import EmailMessage
 from email.utils import formataddr
 import traceback
+from typing import List, Optional
+
+import aiosmtplib
+
 from app.core.settings import settings
 
 sender_name = settings.smtp_name
 sender_email = settings.smtp_email
 sender_password = settings.smtp_password
 
-def send_email(to: str, subject: str, body: str) -> bool:
+
+def _build_message(to: str, subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg.set_content(body)
 
     msg["From"] = formataddr((sender_name, sender_email))
     msg["To"] = to
     msg["Subject"] = subject
+    return msg
+
+
+def send_email(to: str, subject: str, body: str) -> bool:
+    msg = _build_message(to, subject, body)
 
     try:
         context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
+        with smtplib.SMTP_SSL(settings.smtp_host, settings.smtp_port, context=context) as server:
             server.login(sender_email, sender_password)
             server.send_message(msg)
         return True
     except Exception as e:
         print(f"Email error: {e}")
         traceback.print_exc()
-        return False
\ No newline at end of file
+        return False
+
+
+class SMTPConnectionPool:
+    """
+    A small pool of logged-in SMTP connections reused across messages.
+
+    Each connection carries one SMTP conversation at a time, so callers borrow
+    a connection for the duration of a send. Broken connections are dropped and
+    reopened on the next borrow instead of paying a TLS handshake and login for
+    every email.
+    """
+
+    def __init__(self, size: int = 2, *, timeout: float = 10.0) -> None:
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _slots(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._idle is None or self._loop is not loop:
+            self._loop = loop
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+        return self._idle
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port,
+            use_tls=True,
+            timeout=self.timeout,
+        )
+        await client.connect()
+        await client.login(sender_email, sender_password)
+        return client
+
+    async def send(self, to: str, subject: str, body: str) -> bool:
+        """Send an email on a pooled connection, reconnecting once if it went stale."""
+        msg = _build_message(to, subject, body)
+        slots = self._slots()
+        client: Optional[aiosmtplib.SMTP] = await slots.get()
+        try:
+            for attempt in range(2):
+                try:
+                    if client is None or not client.is_connected:
+                        client = await self._connect()
+                    await client.send_message(msg)
+                    return True
+                except (aiosmtplib.SMTPServerDisconnected, ConnectionError) as e:
+                    client = None
+                    if attempt:
+                        print(f"Email error: {e}")
+                except Exception as e:
+                    print(f"Email error: {e}")
+                    await self._discard(client)
+                    client = None
+                    return False
+            return False
+        finally:
+            slots.put_nowait(client)
+
+    @staticmethod
+    async def _discard(client: Optional[aiosmtplib.SMTP]) -> None:
+        if client is None or not client.is_connected:
+            return
+        try:
+            await client.quit()
+        except Exception:
+            client.close()
+
+    async def close(self) -> None:
+        """Close every idle connection in the pool."""
+        if self._idle is None or self._loop is not asyncio.get_running_loop():
+            return
+        clients: List[Optional[aiosmtplib.SMTP]] = []
+        while not self._idle.empty():
+            clients.append(self._idle.get_nowait())
+        for client in clients:
+            await self._discard(client)
+            self._idle.put_nowait(None)
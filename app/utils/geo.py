@@ -0,0 +1,93 @@
+"""Geohash encoding and distance helpers for location queries."""
+
+import math
+from typing import List
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells, the precision stored on alerts
+EARTH_RADIUS_KM = 6371.0088
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a coordinate as a geohash string of ``precision`` characters."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> tuple:
+    """Return the (lat_degrees, lon_degrees) extent of a cell at ``precision``."""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(lat: float, lon: float, radius_km: float, max_cells: int = 16) -> List[str]:
+    """
+    Return the geohash prefixes whose cells cover a circle's bounding box.
+
+    Picks the finest precision at which the box needs at most ``max_cells``
+    cells, so a radius query becomes a handful of indexed prefix ranges.
+    """
+    lat_range = radius_km / 111.0
+    cos_lat = math.cos(math.radians(lat)) or 1e-6
+    lon_range = min(radius_km / (111.0 * abs(cos_lat)), 180.0)
+    min_lat, max_lat = max(-90.0, lat - lat_range), min(90.0, lat + lat_range)
+    min_lon, max_lon = lon - lon_range, lon + lon_range
+
+    cells: List[str] = [""]
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        cell_lat, cell_lon = geohash_cell_size(precision)
+        rows = math.floor(min_lat / cell_lat), math.floor(max_lat / cell_lat)
+        cols = math.floor(min_lon / cell_lon), math.floor(max_lon / cell_lon)
+        if (rows[1] - rows[0] + 1) * (cols[1] - cols[0] + 1) > max_cells:
+            break
+
+        candidate = set()
+        for row in range(rows[0], rows[1] + 1):
+            cell_center_lat = min(90.0, (row + 0.5) * cell_lat)
+            for col in range(cols[0], cols[1] + 1):
+                cell_center_lon = ((col + 0.5) * cell_lon + 180.0) % 360.0 - 180.0
+                candidate.add(geohash_encode(cell_center_lat, cell_center_lon, precision))
+        cells = sorted(candidate)
+
+    return cells
@@ -1,10 +1,13 @@
+from typing import Optional
+
 from app.core.settings import settings
 import httpx
 
 
-async def send_sms(phone_number: str, message: str) -> bool:
+async def send_sms(phone_number: str, message: str, client: Optional[httpx.AsyncClient] = None) -> bool:
     """
     Sends an SMS using the Termii API.
+    Pass a long-lived ``client`` to reuse its connection pool across messages.
     """
 
     url = f"{settings.termii_base_url}/api/sms/send"
@@ -24,8 +27,11 @@ async def send_sms(phone_number: str, message: str) -> bool:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        if client is not None:
             response = await client.post(url, json=payload)
+        else:
+            async with httpx.AsyncClient(timeout=10.0) as own_client:
+                response = await own_client.post(url, json=payload)
 
         response_data = response.json()
 
@@ -0,0 +1,59 @@
+"""Populate alerts.geohash for rows stored before the column existed.
+
+Usage:
+    python scripts/backfill_alert_geohash.py [--batch-size 1000]
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import select, update, bindparam
+
+from app.config.database import AsyncSessionLocal, engine
+from app.models import Alert
+from app.utils.geo import geohash_encode
+
+
+async def main(batch_size: int) -> None:
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Alert.id, Alert.location_lat, Alert.location_lon)
+                .where(
+                    Alert.geohash.is_(None),
+                    Alert.location_lat.is_not(None),
+                    Alert.location_lon.is_not(None),
+                )
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            await session.execute(
+                update(Alert.__table__)
+                .where(Alert.__table__.c.id == bindparam("row_id"))
+                .values(geohash=bindparam("row_geohash")),
+                [
+                    {"row_id": row.id, "row_geohash": geohash_encode(row.location_lat, row.location_lon)}
+                    for row in rows
+                ],
+            )
+            await session.commit()
+
+        total += len(rows)
+        print(f"Backfilled geohash for {total} alerts...")
+
+    await engine.dispose()
+    print(f"Done. {total} alerts updated.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
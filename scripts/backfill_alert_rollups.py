@@ -0,0 +1,30 @@
+"""Rebuild the hourly/daily alert rollups from the raw alerts table.
+
+Usage:
+    python scripts/backfill_alert_rollups.py [--batch-size 5000]
+
+Pause alert ingestion while this runs; it replaces every rollup in one
+transaction.
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.config.database import engine
+from app.services.alert_rollups import AlertRollupService
+
+
+async def main(batch_size: int) -> None:
+    total = await AlertRollupService.rebuild(batch_size=batch_size)
+    await engine.dispose()
+    print(f"Rebuilt alert rollups from {total} alerts.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
@@ -0,0 +1,97 @@
+"""Run EXPLAIN on the alert and rollup queries and flag any that fall back to a sequential scan.
+
+Usage:
+    python scripts/explain_alert_queries.py [--analyze] [--no-seqscan]
+
+Uses DATABASE_URL like the app does. On small tables PostgreSQL legitimately
+prefers a sequential scan, so either run this against production-sized data or
+pass --no-seqscan to check that a usable index exists at all.
+"""
+import os
+import sys
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.config.database import engine
+from app.services.alert_query import AlertQueryService
+from app.services.alert_rollups import AlertRollupService
+
+
+def build_queries():
+    now = datetime.utcnow()
+    day_ago = now - timedelta(days=1)
+    device_id = "explain-device"
+
+    queries = {
+        "alerts page (GET /api/alerts/)": AlertQueryService.user_alerts_query(uuid4(), 50, (now, str(uuid4()))),
+        "timeframe": AlertQueryService.timeframe_query(day_ago, now),
+        "timeframe + alert_type": AlertQueryService.timeframe_query(day_ago, now, alert_type="weapon_detection"),
+        "timeframe + device_id": AlertQueryService.timeframe_query(day_ago, now, device_id=device_id),
+        "location": AlertQueryService.location_query(6.5244, 3.3792, 1.0),
+        "counts by type (rollups)": AlertRollupService.counts_query("hour", day_ago, now),
+        "counts by type (raw edge)": AlertRollupService.raw_counts_query(now - timedelta(minutes=30), now, True),
+        "trends (rollups)": AlertRollupService.trends_query("day", now - timedelta(days=7)),
+    }
+    for name, query in AlertQueryService.device_statistics_queries(device_id).items():
+        queries[f"device statistics ({name})"] = query
+    return queries
+
+
+def uses_sequential_scan(dialect_name: str, plan_lines) -> bool:
+    for line in plan_lines:
+        if dialect_name == "postgresql" and "Seq Scan on alert" in line:
+            return True
+        if dialect_name == "sqlite" and line.startswith("SCAN alert") and "INDEX" not in line:
+            return True
+    return False
+
+
+async def main(analyze: bool, no_seqscan: bool) -> int:
+    dialect = engine.dialect
+    dialect_name = dialect.name
+    if dialect_name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+
+    flagged = []
+    async with engine.connect() as conn:
+        if no_seqscan and dialect_name == "postgresql":
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+
+        for name, query in build_queries().items():
+            sql = str(query.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            result = await conn.exec_driver_sql(prefix + sql)
+            rows = result.fetchall()
+            # SQLite returns (id, parent, notused, detail); PostgreSQL one text column.
+            plan_lines = [str(row[-1]) for row in rows]
+
+            seq_scan = uses_sequential_scan(dialect_name, plan_lines)
+            if seq_scan:
+                flagged.append(name)
+            print(f"=== {name}: {'SEQUENTIAL SCAN' if seq_scan else 'index used'}")
+            for line in plan_lines:
+                print(f"    {line}")
+            print()
+
+    await engine.dispose()
+
+    if flagged:
+        print(f"{len(flagged)} quer{'y' if len(flagged) == 1 else 'ies'} scan a whole table:")
+        for name in flagged:
+            print(f"  - {name}")
+        return 1
+    print("All alert queries are served by an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--analyze", action="store_true", help="PostgreSQL only: run EXPLAIN ANALYZE")
+    parser.add_argument("--no-seqscan", action="store_true", help="PostgreSQL only: disable seq scans for the check")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.analyze, args.no_seqscan)))
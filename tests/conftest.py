@@ -3,7 +3,7 @@
 import asyncio
 import os
 import sys
-from typing import Any, AsyncGenerator, Callable, Dict, Generator, Optional
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Iterable, List, Optional
 
 import pytest
 import pytest_asyncio
@@ -55,6 +55,7 @@ class InMemoryAsyncCache:
 	def __init__(self, prefix: str = "test") -> None:
 		self._prefix = prefix
 		self._store: Dict[str, Any] = {}
+		self._tags: Dict[str, int] = {}
 
 	def get_key(self, *parts: Any) -> str:
 		return ":".join([self._prefix, *[str(part) for part in parts if part is not None]])
@@ -68,32 +69,44 @@ class InMemoryAsyncCache:
 	async def delete(self, key: str) -> None:
 		self._store.pop(key, None)
 
-	async def invalidate_pattern(self, pattern: str) -> None:
+	async def invalidate_pattern(self, pattern: str, *, batch_size: Optional[int] = None) -> cache_module.InvalidationResult:  # noqa: ARG002
 		from fnmatch import fnmatch
 
+		result = cache_module.InvalidationResult()
 		for stored_key in list(self._store.keys()):
 			if fnmatch(stored_key, pattern):
 				del self._store[stored_key]
+				result.deleted += 1
+		return result
 
 	async def clear_all(self) -> None:
 		self._store.clear()
 
+	async def bump_tags(self, tags: Iterable[str]) -> None:
+		for tag in set(tags):
+			self._tags[tag] = self._tags.get(tag, 0) + 1
+
 	async def get_or_set(
 		self,
 		key: str,
 		getter: Callable[[], Any],
 		*,
 		expire: Optional[int] = None,  # noqa: ARG002
+		tags: Optional[List[str]] = None,
 	) -> Any:
+		generations = {tag: self._tags.get(tag, 0) for tag in tags or []}
 		cached = await self.get(key)
 		if cached is not None:
-			return cached
+			if not tags:
+				return cached
+			if cached[1] == generations:
+				return cached[0]
 
 		value = getter()
 		if asyncio.iscoroutine(value):
 			value = await value
 
-		await self.set(key, value)
+		await self.set(key, (value, generations) if tags else value)
 		return value
 
 	async def close(self) -> None:  # pragma: no cover - compatibility helper
@@ -146,9 +159,12 @@ def api_client(monkeypatch: pytest.MonkeyPatch) -> Generator[TestClient, None, N
 	async def noop_broadcast(message: str) -> None:  # noqa: ARG001
 		return None
 
+	async def noop() -> None:
+		return None
+
 	monkeypatch.setattr(manager, "broadcast", noop_broadcast)
-	monkeypatch.setattr(mqtt_service, "start", lambda: None)
-	monkeypatch.setattr(mqtt_service, "stop", lambda: None)
+	monkeypatch.setattr(mqtt_service, "start", noop)
+	monkeypatch.setattr(mqtt_service, "stop", noop)
 
 	asyncio.get_event_loop().run_until_complete(_recreate_schema())
 
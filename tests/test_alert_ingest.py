@@ -0,0 +1,83 @@
+"""Tests for the batched alert ingestion queue."""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import Alert
+from app.schemas.alerts import AlertCreate
+from app.services.alert_ingest import AlertIngestQueue
+
+
+def _alert(device_id: str = "ingest-device") -> AlertCreate:
+    return AlertCreate(
+        device_id=device_id,
+        timestamp=datetime.utcnow(),
+        alert_type="driver_fatigue",
+        location_lat=6.5,
+        location_lon=3.3,
+        payload={"confidence": 0.8},
+    )
+
+
+def _count_inserts(monkeypatch: pytest.MonkeyPatch, queue: AlertIngestQueue, fail_when=None) -> list:
+    batches = []
+    original = queue._insert
+
+    async def counting_insert(rows):
+        batches.append(len(rows))
+        if fail_when and fail_when(rows):
+            raise RuntimeError("insert rejected")
+        await original(rows)
+
+    monkeypatch.setattr(queue, "_insert", counting_insert)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_concurrent_alerts_share_one_insert(monkeypatch, db_session) -> None:
+    queue = AlertIngestQueue(max_batch=10, max_delay_ms=5)
+    batches = _count_inserts(monkeypatch, queue)
+
+    rows = await asyncio.gather(*(queue.submit(_alert()) for _ in range(5)))
+
+    assert batches == [5]
+    assert len({row["id"] for row in rows}) == 5
+    total = await db_session.scalar(select(func.count(Alert.id)))
+    assert total == 5
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting_for_deadline(monkeypatch) -> None:
+    queue = AlertIngestQueue(max_batch=2, max_delay_ms=60_000)
+    batches = _count_inserts(monkeypatch, queue)
+
+    await asyncio.wait_for(
+        asyncio.gather(*(queue.submit(_alert()) for _ in range(4))),
+        timeout=5,
+    )
+
+    assert batches == [2, 2]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_row_by_row(monkeypatch) -> None:
+    queue = AlertIngestQueue(max_batch=3, max_delay_ms=5)
+    _count_inserts(
+        monkeypatch,
+        queue,
+        fail_when=lambda rows: any(row["device_id"] == "bad-device" for row in rows),
+    )
+
+    results = await asyncio.gather(
+        queue.submit(_alert("good-1")),
+        queue.submit(_alert("bad-device")),
+        queue.submit(_alert("good-2")),
+        return_exceptions=True,
+    )
+
+    assert results[0]["device_id"] == "good-1"
+    assert isinstance(results[1], RuntimeError)
+    assert results[2]["device_id"] == "good-2"
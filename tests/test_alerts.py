@@ -1,12 +1,20 @@
 """Tests for alert ingestion and retrieval flows."""
 
+import json
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
 
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+from app.api.endpoints.alerts import get_all_alerts
+from app.models import Alert
 from app.schemas.alerts import AlertCreate
-from app.services.alert_processor import process_and_save_alert
+from app.services.alert_decoding import decode_alert_batch
+from app.services.alert_ingest import alert_ingest
+from app.services.alert_processor import process_and_save_alert, process_and_save_alerts
 from app.services.alert_query import AlertQueryService
 from app.services.websocket import manager
 
@@ -69,4 +77,110 @@ def test_invalid_alert_payload_returns_422(api_client: TestClient) -> None:
 
     invalid_payload = {"device_id": "test", "timestamp": "nope", "alert_type": "unknown"}
     response = api_client.post("/api/alerts", json=invalid_payload)
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_process_and_save_alerts_stores_batch_envelope(db_session) -> None:
+    """A batched upload is stored in one go with the header applied to every alert."""
+
+    user_id = uuid4()
+    base_time = datetime.utcnow()
+    envelope = {
+        "device_id": "batch-device",
+        "user_id": str(user_id),
+        "alerts": [
+            {"timestamp": (base_time - timedelta(seconds=index)).isoformat(), "alert_type": "driver_fatigue"}
+            for index in range(3)
+        ],
+    }
+    alerts = decode_alert_batch(json.dumps(envelope).encode())
+
+    results = await process_and_save_alerts(alerts, source="MQTT")
+
+    assert [result.device_id for result in results] == ["batch-device"] * 3
+    assert {result.user_id for result in results} == {user_id}
+    stored = await AlertQueryService.get_alerts_by_timeframe(
+        start_time=base_time - timedelta(minutes=1),
+        end_time=base_time + timedelta(minutes=1),
+        device_id="batch-device",
+    )
+    assert len(stored) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("located_first", [True, False])
+async def test_batch_insert_mixes_located_and_unlocated_alerts(db_session, located_first) -> None:
+    """Rows with and without a location share one INSERT and each keeps its own geohash."""
+
+    base_time = datetime.utcnow()
+    located = AlertCreate(**_example_alert_payload(base_time))
+    unlocated = AlertCreate(**{
+        **_example_alert_payload(base_time),
+        "location_lat": None,
+        "location_lon": None,
+    })
+    batch = [located, unlocated, located] if located_first else [unlocated, located, unlocated]
+
+    rows = await alert_ingest.submit_batch(batch)
+
+    stored = {
+        str(alert.id): alert.geohash
+        for alert in await AlertQueryService.get_alerts_by_timeframe(
+            start_time=base_time - timedelta(minutes=1),
+            end_time=base_time + timedelta(minutes=1),
+        )
+    }
+    for row, alert_data in zip(rows, batch):
+        if alert_data.location_lat is None:
+            assert stored[str(row["id"])] is None
+        else:
+            assert stored[str(row["id"])].startswith("s14")
+
+
+@pytest.mark.asyncio
+async def test_get_all_alerts_walks_pages_with_cursor(db_session) -> None:
+    """Keyset pagination returns every alert exactly once, newest first."""
+
+    user_id = uuid4()
+    base_time = datetime.utcnow()
+    for index in range(5):
+        # Two alerts share a timestamp to exercise the id tie-breaker.
+        timestamp = base_time - timedelta(minutes=min(index, 3))
+        db_session.add(Alert(
+            id=str(uuid4()),
+            user_id=user_id,
+            device_id="paged-device",
+            timestamp=timestamp,
+            alert_type="route_deviation",
+        ))
+    db_session.add(Alert(
+        id=str(uuid4()),
+        user_id=uuid4(),
+        device_id="someone-else",
+        timestamp=base_time,
+        alert_type="route_deviation",
+    ))
+    await db_session.commit()
+
+    current_user = SimpleNamespace(id=user_id)
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = await get_all_alerts(limit=2, cursor=cursor, db=db_session, current_user=current_user)
+        pages += 1
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert len({alert.id for alert in seen}) == 5
+    assert {alert.device_id for alert in seen} == {"paged-device"}
+    assert [alert.timestamp for alert in seen] == sorted((a.timestamp for a in seen), reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_get_all_alerts_rejects_bad_cursor(db_session) -> None:
+    with pytest.raises(HTTPException) as exc_info:
+        await get_all_alerts(limit=10, cursor="not-a-cursor", db=db_session, current_user=SimpleNamespace(id=uuid4()))
+    assert exc_info.value.status_code == 400
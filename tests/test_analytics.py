@@ -1,9 +1,20 @@
 """Analytics endpoint tests."""
 
+import csv
+import io
+import json
 from datetime import datetime, timedelta
+from uuid import uuid4
 
+import pytest
 from fastapi.testclient import TestClient
 
+from app.api.endpoints.analytics import export_alerts, get_device_statistics
+from app.models import Alert
+from app.schemas.alerts import AlertCreate
+from app.services import cache_tags
+from app.services.alert_ingest import AlertIngestQueue
+
 
 def _create_sample_alert(client: TestClient, **overrides) -> None:
     payload = {
@@ -88,4 +99,79 @@ def test_error_responses(api_client: TestClient) -> None:
         "/api/analytics/alerts/timeframe",
         params={"start_time": "bad", "end_time": "also-bad"},
     )
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+
+async def _read_stream(response) -> str:
+    chunks = [chunk async for chunk in response.body_iterator]
+    return b"".join(chunks).decode()
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_and_csv(db_session) -> None:
+    now = datetime.utcnow()
+    for index in range(3):
+        db_session.add(Alert(
+            id=str(uuid4()),
+            device_id="export-device",
+            timestamp=now - timedelta(minutes=index),
+            alert_type="robbery_pattern",
+            payload={"index": index},
+        ))
+    db_session.add(Alert(
+        id=str(uuid4()),
+        device_id="other-device",
+        timestamp=now,
+        alert_type="robbery_pattern",
+    ))
+    await db_session.commit()
+
+    window = dict(start_time=now - timedelta(hours=1), end_time=now + timedelta(minutes=1))
+
+    ndjson = await _read_stream(await export_alerts(**window, alert_type=None, device_id="export-device", format="ndjson"))
+    records = [json.loads(line) for line in ndjson.splitlines()]
+    assert [record["payload"]["index"] for record in records] == [2, 1, 0]
+
+    csv_text = await _read_stream(await export_alerts(**window, alert_type=None, device_id=None, format="csv"))
+    rows = list(csv.DictReader(io.StringIO(csv_text)))
+    assert len(rows) == 4
+    assert {row["device_id"] for row in rows} == {"export-device", "other-device"}
+
+
+@pytest.mark.asyncio
+async def test_ingested_alert_invalidates_only_affected_cache_entries(mock_cache) -> None:
+    queue = AlertIngestQueue(max_batch=1)
+
+    def alert(device_id: str) -> AlertCreate:
+        return AlertCreate(device_id=device_id, timestamp=datetime.utcnow(), alert_type="robbery_pattern")
+
+    await queue.submit(alert("cached-device"))
+    assert (await get_device_statistics("cached-device"))["total_alerts"] == 1
+    assert (await get_device_statistics("quiet-device"))["total_alerts"] == 0
+
+    await queue.submit(alert("cached-device"))
+    await queue.submit(alert("quiet-device"))
+    assert (await get_device_statistics("cached-device"))["total_alerts"] == 2
+    assert mock_cache._tags["device:quiet-device"] == 1
+    assert "device:other-device" not in mock_cache._tags
+
+
+def test_cache_tags_match_only_overlapping_queries() -> None:
+    timestamp = datetime(2024, 3, 10, 12, 0)
+    tags = cache_tags.alert_tags({
+        "timestamp": timestamp,
+        "alert_type": "weapon_detection",
+        "device_id": "tagged-device",
+        "geohash": "s14kgp6cp",
+    })
+
+    def overlaps(query_tags) -> bool:
+        return bool(tags.intersection(query_tags))
+
+    assert overlaps(cache_tags.range_tags(timestamp - timedelta(days=2), timestamp))
+    assert overlaps(cache_tags.range_tags(timestamp, timestamp, "weapon_detection", "tagged-device"))
+    assert not overlaps(cache_tags.range_tags(timestamp - timedelta(days=3), timestamp - timedelta(days=1)))
+    assert not overlaps(cache_tags.range_tags(timestamp, timestamp, device_id="other-device"))
+    assert overlaps(cache_tags.range_tags(None, None))
+    assert overlaps(cache_tags.location_tags(6.5, 3.3, 1.0))
+    assert not overlaps(cache_tags.location_tags(51.5, -0.12, 1.0))
@@ -1,3 +1,4 @@
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -40,3 +41,128 @@ def test_lockout_after_failed_attempts(api_client: TestClient):
     # correct password should now be rejected due to lockout
     r3 = api_client.post("/api/auth/login", json={"username": username, "password": "LockPass1"})
     assert r3.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_user_lookups_are_cached_until_login_state_changes(monkeypatch):
+    from app.services import auth_service
+
+    user = await auth_service.create_user("cached-user", "cached@example.com", "08000000000", "CachePass1")
+
+    assert (await auth_service.get_user_by_id(str(user.id))).email == "cached@example.com"
+
+    class NoDatabase:
+        def __call__(self):
+            raise AssertionError("cached lookups must not open a session")
+
+    real_session = auth_service.AsyncSessionLocal
+    monkeypatch.setattr(auth_service, "AsyncSessionLocal", NoDatabase())
+    cached = await auth_service.get_user_by_id(user.id)
+    assert cached.id == user.id and cached.phone_number == "08000000000"
+    assert cached.password_hash is None
+
+    monkeypatch.setattr(auth_service, "AsyncSessionLocal", real_session)
+    assert await auth_service.authenticate("cached@example.com", "wrong-password") is None
+    assert (await auth_service.get_user_by_id(user.id)).failed_attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_verified_tokens_skip_crypto_and_honour_revocation(monkeypatch):
+    from types import SimpleNamespace
+    from uuid import uuid4
+
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from app.api import deps
+    from app.core.settings import AUTH_CONFIG
+    from app.services import jwt_service
+
+    class FakeRedis:
+        def __init__(self):
+            self.values = {}
+
+        async def set(self, key, value, ex=None):
+            self.values[key] = value
+
+        async def exists(self, key):
+            return int(key in self.values)
+
+    redis = FakeRedis()
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr(jwt_service, "get_redis", fake_get_redis)
+    monkeypatch.setitem(AUTH_CONFIG, "EMBED_USER_CLAIMS", True)
+
+    user = SimpleNamespace(id=uuid4(), username="claims-user", email="claims@example.com", phone_number=None)
+    token = jwt_service.create_access_token(subject=str(user.id), user=user)
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    assert (await deps.get_current_user(credentials)).email == "claims@example.com"
+
+    def no_crypto(*args, **kwargs):
+        raise AssertionError("verified tokens must come from the LRU")
+
+    monkeypatch.setattr(jwt_service.jwt, "decode", no_crypto)
+    current = await deps.get_current_user(credentials)
+    assert current.id == user.id and current.username == "claims-user"
+
+    await jwt_service.revoke_token(jwt_service.decode_token(token))
+    with pytest.raises(HTTPException) as excinfo:
+        await deps.get_current_user(credentials)
+    assert excinfo.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_revocation_check_fails_closed_and_cached_claims_are_copied(monkeypatch):
+    from uuid import uuid4
+
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from app.api import deps
+    from app.core.settings import AUTH_CONFIG
+    from app.services import jwt_service
+
+    async def redis_down():
+        raise ConnectionError("redis unavailable")
+
+    monkeypatch.setattr(jwt_service, "get_redis", redis_down)
+    token = jwt_service.create_access_token(subject=str(uuid4()))
+
+    payload = jwt_service.decode_token(token)
+    payload["sub"] = "tampered"
+    assert jwt_service.decode_token(token)["sub"] != "tampered"
+
+    with pytest.raises(jwt_service.RevocationCheckUnavailable):
+        await jwt_service.is_token_revoked(payload)
+    with pytest.raises(HTTPException) as excinfo:
+        await deps.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"]
+
+    monkeypatch.setitem(AUTH_CONFIG, "REVOCATION_FAIL_OPEN", True)
+    assert not await jwt_service.is_token_revoked(payload)
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_work_beyond_its_queue():
+    import asyncio
+
+    from app.services.password_hasher import HasherBusyError, PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_pending=2, time_cost=1, memory_cost=1024, parallelism=1)
+    password_hash = await hasher.hash("Secret123")
+    assert await hasher.verify("Secret123", password_hash)
+    assert not await hasher.verify("wrong", password_hash)
+
+    results = await asyncio.gather(
+        *(hasher.verify("Secret123", password_hash) for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert results[:2] == [True, True]
+    assert isinstance(results[2], HasherBusyError)
+    assert hasher.rejected == 1 and hasher.pending == 0
+    hasher.shutdown()
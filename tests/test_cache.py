@@ -1,9 +1,12 @@
 """Cache helper tests using the in-memory stub."""
 
+import asyncio
+import time
 from datetime import datetime
 
 import pytest
 
+from app.services.cache import RedisCache
 from tests.conftest import InMemoryAsyncCache
 
 
@@ -61,4 +64,255 @@ async def test_complex_payload_serialisation(cache_instance: InMemoryAsyncCache)
     }
 
     await cache_instance.set(key, value)
-    assert await cache_instance.get(key) == value
\ No newline at end of file
+    assert await cache_instance.get(key) == value
+
+class _ScanOnlyRedis:
+    """Just enough of redis.asyncio.Redis to exercise SCAN-based invalidation."""
+
+    def __init__(self, keys) -> None:
+        self.keys_present = set(keys)
+        self.unlink_calls = []
+
+    async def keys(self, pattern):  # pragma: no cover - must not be used
+        raise AssertionError("KEYS blocks the server")
+
+    async def scan_iter(self, match=None, count=None):
+        from fnmatch import fnmatch
+
+        for key in sorted(self.keys_present):
+            if fnmatch(key, match):
+                yield key
+
+    async def unlink(self, *keys):
+        self.unlink_calls.append(len(keys))
+        removed = self.keys_present.intersection(keys)
+        self.keys_present -= removed
+        return len(removed)
+
+
+@pytest.mark.asyncio
+async def test_redis_invalidate_pattern_scans_and_unlinks_in_batches() -> None:
+    fake = _ScanOnlyRedis([f"obex:users:{index}" for index in range(5)] + ["obex:devices:1"])
+    redis_cache = RedisCache(prefix="obex", redis_client=fake)
+
+    result = await redis_cache.invalidate_pattern("obex:users:*", batch_size=2)
+
+    assert result.deleted == 5
+    assert result.elapsed_ms >= 0
+    assert fake.unlink_calls == [2, 2, 1]
+    assert fake.keys_present == {"obex:devices:1"}
+
+
+class _FakePipeline:
+    def __init__(self, redis) -> None:
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class _FakePubSub:
+    def __init__(self, redis) -> None:
+        self.redis = redis
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel) -> None:
+        self.redis.subscribers.setdefault(channel, []).append(self.messages)
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self) -> None:
+        return None
+
+
+class _KeyValueRedis:
+    """In-memory stand-in for the Redis commands used by get_or_set."""
+
+    def __init__(self) -> None:
+        self.values = {}
+        self.subscribers = {}
+        self.reads = 0
+
+    def pipeline(self, transaction=True):  # noqa: ARG002
+        return _FakePipeline(self)
+
+    def pubsub(self):
+        return _FakePubSub(self)
+
+    async def publish(self, channel, data):
+        for messages in self.subscribers.get(channel, []):
+            messages.put_nowait({"type": "message", "data": data})
+        return len(self.subscribers.get(channel, []))
+
+    async def get(self, key):
+        self.reads += 1
+        return self.values.get(key)
+
+    async def pttl(self, key):
+        return 60_000 if key in self.values else -2
+
+    async def mget(self, keys):
+        self.reads += 1
+        return [self.values.get(key) for key in keys]
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key) or 0) + 1)
+        return int(self.values[key])
+
+    async def expire(self, key, ttl):  # noqa: ARG002
+        return True
+
+    async def set(self, key, value, ex=None, px=None, nx=False):  # noqa: ARG002
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):  # noqa: ARG002
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+    async def close(self) -> None:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once() -> None:
+    redis_cache = RedisCache(prefix="obex", redis_client=_KeyValueRedis())
+    calls = []
+
+    async def slow_query() -> dict:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"trend": [1, 2, 3]}
+
+    key = redis_cache.get_key("trends", "7", "24")
+    results = await asyncio.gather(*(redis_cache.get_or_set(key, slow_query) for _ in range(10)))
+
+    assert len(calls) == 1
+    assert all(result == {"trend": [1, 2, 3]} for result in results)
+    assert await redis_cache.get_or_set(key, slow_query) == {"trend": [1, 2, 3]}
+    assert len(calls) == 1
+    assert f"{key}:lock" not in redis_cache.redis.values
+
+
+@pytest.mark.asyncio
+async def test_locked_key_serves_stale_value_while_another_worker_refreshes() -> None:
+    fake = _KeyValueRedis()
+    redis_cache = RedisCache(prefix="obex", redis_client=fake)
+    key = redis_cache.get_key("counts", "all", "all")
+    # Expired for early-refresh purposes, and another worker holds the lock.
+    await redis_cache.set(key, {"value": {"old": 1}, "tags": {}, "delta": 60.0, "expiry": time.time()})
+    fake.values[f"{key}:lock"] = "other-worker"
+
+    async def must_not_run() -> dict:
+        raise AssertionError("the lock holder is already recomputing")
+
+    assert await redis_cache.get_or_set(key, must_not_run) == {"old": 1}
+
+
+@pytest.mark.asyncio
+async def test_local_tier_serves_hits_and_follows_other_workers_invalidations() -> None:
+    shared = _KeyValueRedis()
+    worker_a = RedisCache(prefix="obex", redis_client=shared, local_cache=True)
+    worker_b = RedisCache(prefix="obex", redis_client=shared, local_cache=True)
+    key = worker_a.get_key("device", "tier-device", "stats")
+    tags = ["device:tier-device"]
+    results = iter([{"total_alerts": 1}, {"total_alerts": 2}])
+
+    async def compute() -> dict:
+        return next(results)
+
+    assert await worker_a.get_or_set(key, compute, tags=tags) == {"total_alerts": 1}
+    reads = shared.reads
+    assert await worker_a.get_or_set(key, compute, tags=tags) == {"total_alerts": 1}
+    assert shared.reads == reads, "local hits must not touch Redis"
+
+    await worker_b.bump_tags(tags)
+    await asyncio.sleep(0)  # deliver the invalidation to worker A's listener
+    assert await worker_a.get_or_set(key, compute, tags=tags) == {"total_alerts": 2}
+
+    await worker_a.close()
+    await worker_b.close()
+
+
+def test_local_cache_evicts_least_recently_used_within_byte_budget() -> None:
+    from app.services.local_cache import MISSING, LocalCache
+
+    local = LocalCache(max_entries=10, max_bytes=100, ttl=60)
+    local.put("a", "A", 40)
+    local.put("b", "B", 40)
+    assert local.get("a") == "A"
+    local.put("c", "C", 40)
+
+    assert local.get("b") is MISSING
+    assert local.get("a") == "A" and local.get("c") == "C"
+    assert local.size_bytes == 80
+
+    local.put("huge", "H", 101)
+    assert local.get("huge") is MISSING
+
+    local.put("tagged", "T", 10, tags=["device:x"])
+    local.discard_tags(["device:x"])
+    assert local.get("tagged", ["device:x"]) is MISSING
+
+
+def test_codec_round_trips_alert_rows_compactly() -> None:
+    from uuid import uuid4
+
+    from app.models import Alert
+    from app.services.alert_query import EXPORT_COLUMNS
+    from app.services.cache_codec import CacheCodec, CodecError, ROWS_MARKER, to_cacheable
+
+    alerts = [
+        Alert(
+            id=str(uuid4()),
+            device_id=f"codec-device-{index}",
+            timestamp=datetime(2024, 5, 1, 12, index),
+            alert_type="weapon_detection",
+            payload={"confidence": 0.9},
+        )
+        for index in range(50)
+    ]
+    compact = to_cacheable(alerts)
+    assert compact[ROWS_MARKER] == list(EXPORT_COLUMNS)
+
+    codec = CacheCodec(serializer="json", compression="zlib", compress_min_bytes=256)
+    encoded = codec.encode({"value": alerts})
+    assert encoded[:3] == bytes((1, 1, 1))
+
+    rows = CacheCodec.decode(encoded)["value"]
+    assert len(rows) == 50
+    assert rows[3]["device_id"] == "codec-device-3"
+    assert rows[3]["timestamp"] == "2024-05-01T12:03:00"
+    assert rows[3]["payload"] == {"confidence": 0.9}
+
+    with pytest.raises(CodecError):
+        CacheCodec.decode(b'{"legacy": "json"}')
+
+
+def test_codec_warns_when_the_configured_codec_is_not_installed(monkeypatch, caplog) -> None:
+    from app.services import cache_codec
+
+    monkeypatch.setattr(cache_codec, "msgpack", None)
+    monkeypatch.setattr(cache_codec, "lz4_frame", None)
+    with caplog.at_level("WARNING", logger=cache_codec.__name__):
+        codec = cache_codec.CacheCodec(serializer="msgpack", compression="lz4")
+
+    assert (codec.serializer, codec.compression) == ("json", "zlib")
+    assert "'msgpack' is not installed" in caplog.text
+    assert "'lz4' is not installed" in caplog.text
@@ -0,0 +1,336 @@
+"""Tests for the asyncio-driven MQTT consumer."""
+
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.core.settings import MQTT_CONFIG
+from app.services import mqtt_client
+from app.services.alert_decoding import AlertDecodeError, decode_alert_batch, decode_alerts
+from app.services.mqtt_client import MQTTService, subscription_topics
+
+
+def _message(payload, mid: int = 1) -> SimpleNamespace:
+    return SimpleNamespace(topic="obex/alerts", payload=payload, mid=mid, qos=1)
+
+
+def _save_error(error: Exception) -> HTTPException:
+    """What process_and_save_alert raises when the database fails."""
+    try:
+        raise HTTPException(status_code=500, detail=str(error)) from error
+    except HTTPException as exc:
+        return exc
+
+
+@pytest.mark.asyncio
+async def test_full_queue_pauses_reading_until_consumers_catch_up(monkeypatch) -> None:
+    service = MQTTService()
+    service.running = True
+    service.queue_size = 2
+    release = asyncio.Event()
+    handled = []
+
+    async def slow_handle(msg) -> None:
+        await release.wait()
+        handled.append(msg.payload)
+
+    monkeypatch.setattr(service, "_handle_message", slow_handle)
+    service.loop = asyncio.get_running_loop()
+    service.queue = asyncio.Queue()
+    service.consumers = [asyncio.create_task(service._consume())]
+
+    local, remote = socket.socketpair()
+    try:
+        service._watch_socket(local)
+        for index in range(3):
+            service._on_message(service.client, None, _message(index, mid=index + 1))
+        assert service.paused
+        assert not service.loop.remove_reader(local)
+
+        release.set()
+        await asyncio.wait_for(service.queue.join(), timeout=1)
+        assert handled == [0, 1, 2]
+        assert not service.paused
+        assert service.loop.remove_reader(local)
+    finally:
+        for task in service.consumers:
+            task.cancel()
+        local.close()
+        remote.close()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_with_a_full_queue_stays_paused_and_drops_stale_copies(monkeypatch) -> None:
+    service = MQTTService()
+    service.running = True
+    service.queue_size = 2
+    service.loop = asyncio.get_running_loop()
+    service.queue = asyncio.Queue()
+    acked = []
+    monkeypatch.setattr(service.client, "ack", lambda mid, qos: acked.append(mid))
+
+    local, remote = socket.socketpair()
+    try:
+        service._begin_connection(session_present=False)
+        for mid in (1, 2, 3):
+            service._on_message(service.client, None, _message(mid, mid=mid))
+        in_progress = await service.queue.get()
+        service.queue.task_done()
+
+        # The connection drops and comes back while the consumers are still stuck.
+        service._watch_socket(local)
+        assert service.paused
+        assert not service.loop.remove_reader(local)
+
+        # The session survived: queued copies go, and reading resumes for the redeliveries.
+        service._begin_connection(session_present=True)
+        assert service.queue.empty()
+        assert not service.paused
+        for mid in (1, 2, 3):
+            redelivered = _message(mid, mid=mid)
+            redelivered.dup = True
+            service._on_message(service.client, None, redelivered)
+        assert [service.queue.get_nowait()[1].mid for _ in range(service.queue.qsize())] == [2, 3]
+        assert in_progress[1].mid == 1
+    finally:
+        service.loop.remove_reader(local)
+        local.close()
+        remote.close()
+
+
+async def _fake_broker(received, publishes):
+    """A minimal MQTT 3.1.1 broker that sends ``publishes`` once subscribed."""
+
+    async def handle(reader, writer):
+        while True:
+            try:
+                header = (await reader.readexactly(1))[0]
+            except asyncio.IncompleteReadError:
+                received.append("closed")
+                return
+            length, shift = 0, 0
+            while True:
+                byte = (await reader.readexactly(1))[0]
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            body = await reader.readexactly(length)
+            kind = header >> 4
+            if kind == 1:
+                received.append("connect")
+                writer.write(bytes((0x20, 2, 0, 0)))
+            elif kind == 8:
+                writer.write(bytes((0x90, 3)) + body[:2] + b"\x01")
+                for mid, payload in enumerate(publishes, start=1):
+                    topic = b"obex/alerts"
+                    variable = len(topic).to_bytes(2, "big") + topic + mid.to_bytes(2, "big") + payload
+                    writer.write(bytes((0x32, len(variable))) + variable)
+            elif kind == 12:
+                received.append("ping")
+                writer.write(bytes((0xD0, 0)))
+            elif kind == 4:
+                received.append(int.from_bytes(body[:2], "big"))
+            elif kind == 14:
+                received.append("disconnect")
+            await writer.drain()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+@pytest.mark.asyncio
+async def test_paused_reading_outlasts_the_keepalive(monkeypatch) -> None:
+    received = []
+    server = await _fake_broker(received, [b"a", b"b", b"c", b"d"])
+    monkeypatch.setitem(MQTT_CONFIG, "BROKER_HOST", "127.0.0.1")
+    monkeypatch.setitem(MQTT_CONFIG, "BROKER_PORT", server.sockets[0].getsockname()[1])
+    monkeypatch.setitem(MQTT_CONFIG, "KEEPALIVE", 1)
+    monkeypatch.setitem(MQTT_CONFIG, "QUEUE_SIZE", 2)
+    monkeypatch.setitem(MQTT_CONFIG, "CONSUMERS", 1)
+    monkeypatch.setitem(MQTT_CONFIG, "PROTOCOL", 4)
+    monkeypatch.setitem(MQTT_CONFIG, "SHARE_GROUP", "")
+    monkeypatch.setitem(MQTT_CONFIG, "TOPIC_SHARDS", [])
+    monkeypatch.setattr(mqtt_client, "MISC_INTERVAL_SECONDS", 0.05)
+
+    service = MQTTService()
+    release = asyncio.Event()
+    handled = []
+
+    async def stalled_handle(msg) -> None:
+        await release.wait()
+        handled.append(msg.payload)
+
+    monkeypatch.setattr(service, "_handle_message", stalled_handle)
+    try:
+        await service.start()
+        while not service.paused:
+            await asyncio.sleep(0.01)
+
+        # Stalled for well over twice the keepalive.
+        await asyncio.sleep(2.5)
+        assert "ping" in received
+        assert received.count("connect") == 1 and "closed" not in received
+
+        release.set()
+        await asyncio.wait_for(service.queue.join(), timeout=2)
+        while len([item for item in received if isinstance(item, int)]) < 4:
+            await asyncio.sleep(0.01)
+        assert handled == [b"a", b"b", b"c", b"d"]
+    finally:
+        await service.stop(timeout=1)
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_messages_are_acknowledged_only_after_the_alert_is_saved(monkeypatch) -> None:
+    service = MQTTService()
+    service.running = True
+    acked = []
+    monkeypatch.setattr(service.client, "ack", lambda mid, qos: acked.append(mid))
+    monkeypatch.setattr(mqtt_client, "RETRY_BASE_DELAY_SECONDS", 0)
+
+    saves = []
+    database_up = asyncio.Event()
+
+    async def flaky_save(alert_data, source) -> None:
+        saves.append(alert_data.device_id)
+        if alert_data.device_id == "down" and not database_up.is_set():
+            raise _save_error(OperationalError("INSERT", {}, ConnectionError("database unavailable")))
+
+    monkeypatch.setattr(mqtt_client, "process_and_save_alert", flaky_save)
+    service.queue = asyncio.Queue()
+    consumer = asyncio.create_task(service._consume())
+    try:
+        alert = '{"device_id": "%s", "timestamp": "2024-01-01T00:00:00", "alert_type": "weapon_detection"}'
+        service._on_message(service.client, None, _message((alert % "up").encode(), mid=1))
+        service._on_message(service.client, None, _message(b'{"device_id": "no-type"}', mid=2))
+        service._on_message(service.client, None, _message((alert % "down").encode(), mid=3))
+        while saves.count("down") < 5:
+            await asyncio.sleep(0)
+        # The invalid alert is dropped; the failing save is retried but not acknowledged.
+        assert acked == [1, 2]
+
+        database_up.set()
+        await asyncio.wait_for(service.queue.join(), timeout=1)
+    finally:
+        consumer.cancel()
+
+    assert acked == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_failed_save_is_left_unacknowledged_when_stopping(monkeypatch) -> None:
+    service = MQTTService()
+    acked = []
+    monkeypatch.setattr(service.client, "ack", lambda mid, qos: acked.append(mid))
+
+    async def failing_save(alert_data, source) -> None:
+        raise _save_error(OperationalError("INSERT", {}, ConnectionError("database unavailable")))
+
+    monkeypatch.setattr(mqtt_client, "process_and_save_alert", failing_save)
+    alert = b'{"device_id": "d", "timestamp": "2024-01-01T00:00:00", "alert_type": "weapon_detection"}'
+    assert await service._process(_message(alert)) is False
+    assert acked == []
+
+
+@pytest.mark.asyncio
+async def test_rejected_alerts_are_dead_lettered_and_acknowledged(monkeypatch) -> None:
+    service = MQTTService()
+    service.running = True
+    acked, published = [], []
+    monkeypatch.setattr(service.client, "ack", lambda mid, qos: acked.append(mid))
+    monkeypatch.setattr(service.client, "publish", lambda topic, payload, qos: published.append((topic, payload)))
+    attempts = []
+
+    async def rejecting_save(alert_data, source) -> None:
+        attempts.append(alert_data.device_id)
+        raise _save_error(IntegrityError("INSERT", {}, ValueError("duplicate key")))
+
+    monkeypatch.setattr(mqtt_client, "process_and_save_alert", rejecting_save)
+    alert = b'{"device_id": "d", "timestamp": "2024-01-01T00:00:00", "alert_type": "weapon_detection"}'
+    service.queue = asyncio.Queue()
+    consumer = asyncio.create_task(service._consume())
+    try:
+        service._on_message(service.client, None, _message(alert, mid=7))
+        await asyncio.wait_for(service.queue.join(), timeout=1)
+    finally:
+        consumer.cancel()
+
+    assert attempts == ["d"]
+    assert acked == [7]
+    assert published == [(f"{MQTT_CONFIG['ALERTS_TOPIC']}/dead-letter", alert)]
+
+
+def test_share_group_and_shards_shape_the_subscriptions(monkeypatch) -> None:
+    base = MQTT_CONFIG["ALERTS_TOPIC"]
+    assert subscription_topics() == [base, f"{base}/batch"]
+
+    monkeypatch.setitem(MQTT_CONFIG, "ALERTS_TOPIC", "obex/alerts")
+    monkeypatch.setitem(MQTT_CONFIG, "SHARE_GROUP", "ingest")
+    assert subscription_topics() == ["$share/ingest/obex/alerts", "$share/ingest/obex/alerts/batch"]
+    assert MQTTService().protocol == 5
+
+    monkeypatch.setitem(MQTT_CONFIG, "TOPIC_SHARDS", ["a", "b"])
+    assert subscription_topics() == [
+        "$share/ingest/obex/alerts/a/+",
+        "$share/ingest/obex/alerts/b/+",
+        "$share/ingest/obex/alerts/batch/a/+",
+        "$share/ingest/obex/alerts/batch/b/+",
+    ]
+
+
+def test_shards_without_a_share_group_split_batches_too(monkeypatch) -> None:
+    monkeypatch.setitem(MQTT_CONFIG, "ALERTS_TOPIC", "obex/alerts")
+    monkeypatch.setitem(MQTT_CONFIG, "BATCH_TOPIC", "")
+    monkeypatch.setitem(MQTT_CONFIG, "SHARE_GROUP", "")
+    monkeypatch.setitem(MQTT_CONFIG, "TOPIC_SHARDS", ["a"])
+
+    # Another replica owns shard "b"; neither may receive the other's batches.
+    assert subscription_topics() == ["obex/alerts/a/+", "obex/alerts/batch/a/+"]
+    assert mqtt_client.is_batch_topic("obex/alerts/batch/a/cam-1")
+    assert not mqtt_client.is_batch_topic("obex/alerts/a/cam-1")
+
+
+ALERT_JSON = '{"device_id": "%s", "timestamp": "2024-01-01T00:00:00Z", "alert_type": "weapon_detection"}'
+
+
+def test_decode_alerts_validates_single_alerts_and_arrays_from_bytes() -> None:
+    [alert] = decode_alerts((ALERT_JSON % "cam-1").encode())
+    assert alert.device_id == "cam-1"
+
+    batch = decode_alerts(f" [{ALERT_JSON % 'cam-1'}, {ALERT_JSON % 'cam-2'}]".encode())
+    assert [alert.device_id for alert in batch] == ["cam-1", "cam-2"]
+
+    for bad in (b"not json", b'{"device_id": "cam-1"}', f"[{ALERT_JSON % 'cam-1'}, {{}}]".encode()):
+        with pytest.raises(AlertDecodeError):
+            decode_alerts(bad)
+
+
+def test_decode_alert_batch_applies_header_to_every_alert() -> None:
+    envelope = (
+        b'{"device_id": "cam-9", "alerts": ['
+        b'{"timestamp": "2024-01-01T00:00:00Z", "alert_type": "weapon_detection"},'
+        b'{"timestamp": "2024-01-01T00:00:01Z", "alert_type": "route_deviation", "device_id": "cam-10"}]}'
+    )
+    alerts = decode_alert_batch(envelope)
+    assert [(alert.device_id, alert.alert_type) for alert in alerts] == [
+        ("cam-9", "weapon_detection"),
+        ("cam-10", "route_deviation"),
+    ]
+
+    with pytest.raises(AlertDecodeError):
+        decode_alert_batch(b'{"device_id": "cam-9", "alerts": [{"alert_type": "weapon_detection"}]}')
+
+
+def test_decode_alerts_accepts_msgpack() -> None:
+    msgpack = pytest.importorskip("msgpack")
+    alert = {"device_id": "cam-3", "timestamp": "2024-01-01T00:00:00Z", "alert_type": "route_deviation"}
+
+    [decoded] = decode_alerts(msgpack.packb(alert))
+    assert decoded.alert_type == "route_deviation"
+    assert len(decode_alerts(msgpack.packb([alert, alert]), "application/msgpack")) == 2
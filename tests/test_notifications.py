@@ -0,0 +1,120 @@
+"""Tests for the background notification dispatcher."""
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import notifications as notifications_module
+from app.services.notifications import AlertNotification, NotificationCoalescer, NotificationDispatcher
+
+
+def _notification(user_id=None) -> AlertNotification:
+    return AlertNotification(
+        user_id=user_id or uuid.uuid4(),
+        device_id="notify-device",
+        alert_type="weapon_detection",
+        subject="subject",
+        body="body",
+    )
+
+
+@pytest.mark.asyncio
+async def test_enqueue_drops_when_queue_is_full(monkeypatch) -> None:
+    dispatcher = NotificationDispatcher(queue_size=1, workers=1, coalesce_window=0)
+    release = asyncio.Event()
+
+    async def blocked_deliver(notification):
+        await release.wait()
+
+    monkeypatch.setattr(dispatcher, "deliver", blocked_deliver)
+
+    dispatcher.enqueue(_notification())
+    await asyncio.sleep(0)  # let the worker pick up the first notification
+    dispatcher.enqueue(_notification())
+    assert dispatcher.dropped == 0
+    dispatcher.enqueue(_notification())
+    assert dispatcher.dropped == 1
+
+    release.set()
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_workers_deliver_sms_and_email(monkeypatch) -> None:
+    dispatcher = NotificationDispatcher(queue_size=10, workers=2)
+    user = SimpleNamespace(phone_number="08012345678", email="owner@example.com")
+    sent = []
+
+    async def fake_get_user_by_id(user_id):
+        return user
+
+    async def fake_send_sms(phone_number, message, client=None):
+        sent.append(("sms", phone_number, client))
+        return True
+
+    async def fake_send_email(to, subject, body):
+        sent.append(("email", to))
+        return True
+
+    monkeypatch.setattr(notifications_module.auth_service, "get_user_by_id", fake_get_user_by_id)
+    monkeypatch.setattr(notifications_module, "send_sms", fake_send_sms)
+
+    dispatcher.start()
+    monkeypatch.setattr(dispatcher._smtp, "send", fake_send_email)
+    dispatcher.enqueue(_notification())
+    await dispatcher.stop()
+
+    assert ("email", "owner@example.com") in sent
+    sms = [entry for entry in sent if entry[0] == "sms"]
+    assert sms and sms[0][2] is not None, "SMS should reuse the shared HTTP client"
+
+
+@pytest.mark.asyncio
+async def test_coalescer_sends_first_alert_then_one_digest() -> None:
+    emitted = []
+    coalescer = NotificationCoalescer(0.05, emitted.append)
+    user_id = uuid.uuid4()
+
+    for _ in range(5):
+        coalescer.offer(_notification(user_id))
+    coalescer.offer(AlertNotification(user_id, "other-device", "weapon_detection", "subject", "body"))
+
+    assert len(emitted) == 2
+    assert emitted[0].subject == "subject"
+
+    await asyncio.sleep(0.1)
+
+    assert len(emitted) == 3
+    assert emitted[2].body.startswith("4 more weapon_detection alert(s) from device notify-device")
+
+    coalescer.flush()
+    assert len(emitted) == 3
+
+
+@pytest.mark.asyncio
+async def test_coalescer_keeps_a_summary_rather_than_every_suppressed_alert() -> None:
+    from datetime import datetime, timedelta
+
+    emitted = []
+    coalescer = NotificationCoalescer(60, emitted.append)
+    user_id = uuid.uuid4()
+    start = datetime(2024, 1, 1, 12, 0)
+
+    for minute in (0, 3, 1, 2):
+        notification = _notification(user_id)
+        notification.timestamp = start + timedelta(minutes=minute)
+        notification.body = f"alert at minute {minute}"
+        coalescer.offer(notification)
+
+    [window] = coalescer._windows.values()
+    assert window.suppressed == 3
+    assert window.latest.body == "alert at minute 2"
+
+    coalescer.flush()
+    digest = emitted[-1]
+    assert digest.body.startswith("3 more weapon_detection alert(s)")
+    assert f"First: {start + timedelta(minutes=1)}" in digest.body
+    assert f"Last: {start + timedelta(minutes=3)}" in digest.body
+    assert digest.body.endswith("alert at minute 2")
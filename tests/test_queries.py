@@ -138,4 +138,69 @@ async def test_get_device_statistics(seeded_alerts) -> None:
     stats = await AlertQueryService.get_device_statistics("device-0")
     assert stats["total_alerts"] == 1
     assert stats["alerts_by_type"] == {"weapon_detection": 1}
-    assert stats["last_seen"] is not None
\ No newline at end of file
+    assert stats["last_seen"] is not None
+
+@pytest.mark.asyncio
+async def test_get_alerts_by_location_excludes_bounding_box_corners(db_session) -> None:
+    """Only alerts inside the true radius are returned, not the whole box."""
+
+    inside = Alert(id=str(uuid4()), device_id="geo-in", timestamp=datetime.utcnow(),
+                   alert_type="route_deviation", location_lat=6.5040, location_lon=3.3040)
+    corner = Alert(id=str(uuid4()), device_id="geo-corner", timestamp=datetime.utcnow(),
+                   alert_type="route_deviation", location_lat=6.5085, location_lon=3.3085)
+    db_session.add_all([inside, corner])
+    await db_session.commit()
+
+    assert inside.geohash and inside.geohash.startswith("s14")
+
+    alerts = await AlertQueryService.get_alerts_by_location(6.5, 3.3, radius_km=1.0)
+    assert [alert.device_id for alert in alerts] == ["geo-in"]
+
+
+def test_rollup_segments_cover_range_without_overlap() -> None:
+    from app.services.alert_rollups import _plan_segments
+
+    start = datetime(2024, 1, 1, 22, 15)
+    end = datetime(2024, 1, 4, 3, 30)
+    segments = _plan_segments(start, end)
+
+    assert [source for source, _, _ in segments] == ["raw", "hour", "day", "hour", "raw"]
+    assert segments[0][1] == start and segments[-1][2] == end
+    for (_, _, upper), (_, lower, _) in zip(segments, segments[1:]):
+        assert upper == lower
+
+
+def test_rollup_flush_hook_is_scoped_to_app_sessions() -> None:
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    from app.db.base import AppSession
+    from app.services.alert_rollups import _record_flushed_alerts
+
+    assert event.contains(AppSession, "after_flush", _record_flushed_alerts)
+    assert not event.contains(Session, "after_flush", _record_flushed_alerts)
+
+
+@pytest.mark.asyncio
+async def test_counts_by_type_combines_rollups_and_raw_edges(db_session) -> None:
+    base = datetime.utcnow().replace(minute=30, second=0, microsecond=0) - timedelta(days=2)
+    for offset in (timedelta(0), timedelta(hours=3), timedelta(days=1)):
+        db_session.add(Alert(
+            id=str(uuid4()),
+            device_id="rollup-device",
+            timestamp=base + offset,
+            alert_type="rollup_test",
+        ))
+    await db_session.commit()
+
+    counts = await AlertQueryService.get_alert_counts_by_type(
+        start_time=base - timedelta(minutes=5),
+        end_time=base + timedelta(days=1),
+    )
+    assert counts.get("rollup_test") == 3
+
+    counts = await AlertQueryService.get_alert_counts_by_type(
+        start_time=base + timedelta(minutes=1),
+        end_time=base + timedelta(days=1, seconds=-1),
+    )
+    assert counts.get("rollup_test") == 1
@@ -0,0 +1,311 @@
+"""Tests for WebSocket delivery across workers."""
+
+import asyncio
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from app.schemas.alerts import Alert
+from app.services import websocket as websocket_module
+from app.services.websocket import MSGPACK_SUBPROTOCOL, BroadcastMessage, ConnectionManager
+from app.services.websocket_bus import WebSocketBus
+from app.services.websocket_replay import LocalReplayBuffer
+
+
+class FakePubSub:
+    def __init__(self, broker: "FakeBroker") -> None:
+        self.broker = broker
+        self.channels = set()
+        self.messages: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels) -> None:
+        self.channels.update(channels)
+        self.broker.pubsubs.add(self)
+
+    async def unsubscribe(self, *channels) -> None:
+        self.channels.difference_update(channels)
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self) -> None:
+        self.broker.pubsubs.discard(self)
+
+
+class FakeBroker:
+    """Stands in for one Redis server shared by several workers."""
+
+    def __init__(self) -> None:
+        self.pubsubs = set()
+        self.published = []
+
+    def pubsub(self, ignore_subscribe_messages=False):  # noqa: ARG002
+        return FakePubSub(self)
+
+    async def publish(self, channel, data) -> int:
+        self.published.append(channel)
+        receivers = [pubsub for pubsub in self.pubsubs if channel in pubsub.channels]
+        for pubsub in receivers:
+            pubsub.messages.put_nowait({"type": "message", "channel": channel, "data": data})
+        return len(receivers)
+
+
+class FakeWebSocket:
+    def __init__(self, blocked: bool = False, subprotocols=()) -> None:
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.sent = []
+        self.accepted_subprotocol = None
+        self.closed_with = None
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def accept(self, subprotocol=None) -> None:
+        self.accepted_subprotocol = subprotocol
+
+    async def send_text(self, message: str) -> None:
+        await self.unblocked.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes) -> None:
+        await self.unblocked.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+async def _worker(broker: FakeBroker) -> ConnectionManager:
+    worker = ConnectionManager()
+    worker.bus = WebSocketBus(worker.send_local, shards=8, prefix="test", redis_client=broker)
+    await worker.bus.start()
+    return worker
+
+
+@pytest.mark.asyncio
+async def test_message_published_on_one_worker_reaches_socket_on_another() -> None:
+    broker = FakeBroker()
+    ingest_worker, socket_worker = await _worker(broker), await _worker(broker)
+    websocket = FakeWebSocket()
+    connection = await socket_worker.connect(websocket, "user-1")
+
+    await ingest_worker.send_to_user('{"type": "new_alert"}', "user-1")
+    await asyncio.sleep(0.01)
+
+    assert websocket.sent == ['{"type": "new_alert"}']
+
+    # Only workers with a user on the recipient's shard are subscribed to it.
+    shard_channel = socket_worker.bus.channel(socket_worker.bus.shard_for("user-1"))
+    subscribed = [pubsub for pubsub in broker.pubsubs if shard_channel in pubsub.channels]
+    assert len(subscribed) == 1
+
+    socket_worker.disconnect(connection)
+    await asyncio.sleep(0.01)
+    assert not [pubsub for pubsub in broker.pubsubs if shard_channel in pubsub.channels]
+
+    await ingest_worker.stop_bus()
+    await socket_worker.stop_bus()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_on_the_same_shard_before_unsubscribe_keeps_the_channel() -> None:
+    broker = FakeBroker()
+    ingest_worker, socket_worker = await _worker(broker), await _worker(broker)
+    bus = socket_worker.bus
+    first = "user-a"
+    second = next(
+        candidate for candidate in (f"user-{index}" for index in range(100))
+        if candidate != first and bus.shard_for(candidate) == bus.shard_for(first)
+    )
+
+    socket_worker.disconnect(await socket_worker.connect(FakeWebSocket(), first))
+    # Connects before the unsubscribe scheduled by the disconnect has run.
+    websocket = FakeWebSocket()
+    await socket_worker.connect(websocket, second)
+    await asyncio.sleep(0.01)
+
+    await ingest_worker.send_to_user('{"type": "new_alert"}', second)
+    await asyncio.sleep(0.01)
+    assert websocket.sent == ['{"type": "new_alert"}']
+
+    await ingest_worker.stop_bus()
+    await socket_worker.stop_bus()
+
+
+@pytest.mark.asyncio
+async def test_failed_subscribe_unregisters_the_session() -> None:
+    broker = FakeBroker()
+    worker = await _worker(broker)
+    await asyncio.sleep(0.01)
+
+    async def broken_subscribe(*channels) -> None:
+        raise ConnectionError("redis unavailable")
+
+    worker.bus._pubsub.subscribe = broken_subscribe
+    websocket = FakeWebSocket()
+    with pytest.raises(ConnectionError):
+        await worker.connect(websocket, "user-1")
+    await asyncio.sleep(0.01)
+
+    assert worker.connection_count == 0
+    assert not worker.bus._local_shards
+    assert websocket.closed_with == websocket_module.SERVER_ERROR_CLOSE_CODE
+
+    await worker.stop_bus()
+
+
+@pytest.mark.asyncio
+async def test_every_session_of_a_user_receives_messages() -> None:
+    manager = ConnectionManager()
+    first_tab, second_tab = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(first_tab, "user-2")
+    second = await manager.connect(second_tab, "user-2")
+
+    await manager.send_to_user("hello", "user-2")
+    await asyncio.sleep(0.01)
+    assert first_tab.sent == ["hello"] and second_tab.sent == ["hello"]
+
+    manager.disconnect(second)
+    await manager.send_to_user("again", "user-2")
+    await asyncio.sleep(0.01)
+    assert first_tab.sent == ["hello", "again"] and second_tab.sent == ["hello"]
+    assert manager.connection_count == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_client_is_disconnected_without_blocking_the_sender(monkeypatch) -> None:
+    from app.core.settings import WEBSOCKET_CONFIG
+
+    monkeypatch.setitem(WEBSOCKET_CONFIG, "SEND_QUEUE_SIZE", 2)
+    manager = ConnectionManager()
+    stuck, healthy = FakeWebSocket(blocked=True), FakeWebSocket()
+    await manager.connect(stuck, "user-3")
+    await manager.connect(healthy, "user-3")
+
+    for index in range(4):
+        await asyncio.wait_for(manager.send_to_user(f"alert-{index}", "user-3"), timeout=0.1)
+    await asyncio.sleep(0.01)
+
+    assert healthy.sent == [f"alert-{index}" for index in range(4)]
+    assert stuck.closed_with == 1013
+    assert manager.connection_count == 1
+
+
+def _alert() -> Alert:
+    return Alert(
+        id=uuid4(),
+        user_id=uuid4(),
+        device_id="device-1",
+        timestamp=datetime(2024, 1, 2, 3, 4, 5),
+        alert_type="weapon_detection",
+        location_lat=6.5,
+        location_lon=3.3,
+        payload={"note": "help"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_encoded_once_for_every_session(monkeypatch) -> None:
+    monkeypatch.setattr(websocket_module, "msgpack", None)
+    manager = ConnectionManager()
+    json_tab, msgpack_tab = FakeWebSocket(), FakeWebSocket(subprotocols=[MSGPACK_SUBPROTOCOL])
+    await manager.connect(json_tab, "user-4")
+    await manager.connect(msgpack_tab, "user-4")
+
+    alert = _alert()
+    message = BroadcastMessage.for_alert(alert)
+    await manager.send_to_user(message, "user-4")
+    await asyncio.sleep(0.01)
+
+    # Without msgpack installed the subprotocol is declined and both get JSON text.
+    assert msgpack_tab.accepted_subprotocol is None
+    assert json_tab.sent[0] is message.text and msgpack_tab.sent[0] is message.text
+    assert json.loads(message.text) == {"type": "new_alert", "alert": alert.model_dump(mode="json")}
+
+
+@pytest.mark.asyncio
+async def test_msgpack_subprotocol_receives_binary_frames() -> None:
+    msgpack = pytest.importorskip("msgpack")
+    manager = ConnectionManager()
+    websocket = FakeWebSocket(subprotocols=["other", MSGPACK_SUBPROTOCOL])
+    await manager.connect(websocket, "user-5")
+
+    message = BroadcastMessage.for_alert(_alert())
+    await manager.send_to_user(message, "user-5")
+    await asyncio.sleep(0.01)
+
+    assert websocket.accepted_subprotocol == MSGPACK_SUBPROTOCOL
+    assert websocket.sent == [message.binary]
+    assert msgpack.unpackb(websocket.sent[0], raw=False) == json.loads(message.text)
+
+
+@pytest.mark.asyncio
+async def test_reconnect_with_last_seq_replays_only_missed_alerts() -> None:
+    manager = ConnectionManager()
+    manager.replay = LocalReplayBuffer(size=3, max_users=10)
+    first = FakeWebSocket()
+    connection = await manager.connect(first, "user-6")
+    for index in range(2):
+        await manager.send_to_user(json.dumps({"type": "new_alert", "n": index}), "user-6", replay=True)
+    await asyncio.sleep(0.01)
+    assert [json.loads(text)["seq"] for text in first.sent] == [1, 2]
+
+    manager.disconnect(connection)
+    for index in range(2, 4):
+        await manager.send_to_user(json.dumps({"type": "new_alert", "n": index}), "user-6", replay=True)
+
+    resumed = FakeWebSocket()
+    await manager.connect(resumed, "user-6", last_seq=2)
+    await asyncio.sleep(0.01)
+    assert [json.loads(text) for text in resumed.sent] == [
+        {"seq": 3, "type": "new_alert", "n": 2},
+        {"seq": 4, "type": "new_alert", "n": 3},
+    ]
+
+    # The buffer only reaches back to seq 2, so seq 1 cannot be replayed.
+    stale = FakeWebSocket()
+    await manager.connect(stale, "user-6", last_seq=0)
+    await asyncio.sleep(0.01)
+    assert json.loads(stale.sent[0]) == {"type": "resync", "seq": 4}
+    assert [json.loads(text)["seq"] for text in stale.sent[1:]] == [2, 3, 4]
+
+
+class _GatedReplayBuffer(LocalReplayBuffer):
+    """A shared buffer (as Redis would be) whose reads wait until released."""
+
+    def __init__(self) -> None:
+        super().__init__(size=10, max_users=10)
+        self.reading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def since(self, user_id, last_seq):
+        self.reading.set()
+        await self.release.wait()
+        return await super().since(user_id, last_seq)
+
+
+@pytest.mark.asyncio
+async def test_bus_copy_of_a_replayed_alert_is_sent_once() -> None:
+    broker = FakeBroker()
+    ingest_worker, socket_worker = await _worker(broker), await _worker(broker)
+    ingest_worker.replay = socket_worker.replay = replay = _GatedReplayBuffer()
+    await ingest_worker.send_to_user('{"type": "new_alert", "n": 1}', "user-7", replay=True)
+
+    websocket = FakeWebSocket()
+    connecting = asyncio.create_task(socket_worker.connect(websocket, "user-7", last_seq=1))
+    await asyncio.wait_for(replay.reading.wait(), timeout=1)
+
+    # Published while the reconnecting session is held: it arrives over the bus and is also replayed.
+    await ingest_worker.send_to_user('{"type": "new_alert", "n": 2}', "user-7", replay=True)
+    await asyncio.sleep(0.01)
+    replay.release.set()
+    await connecting
+    await asyncio.sleep(0.01)
+
+    assert [json.loads(text) for text in websocket.sent] == [{"seq": 2, "type": "new_alert", "n": 2}]
+
+    await ingest_worker.stop_bus()
+    await socket_worker.stop_bus()